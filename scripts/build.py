@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Инкрементальная сборка русского образа игры
+
+Сборка описывается графом узлов: шрифты (TTF + таблица соответствия →
+NFTR), графика (translated_assets/*.png → NCGR/NSCR) и итоговый образ (исходный ROM + результаты узлов →
+0558-rus.nds). Ключ узла — хэш его параметров, содержимого входных файлов
+и результатов зависимостей. Узел пересобирается, только если ключ
+изменился; готовые результаты хранятся в кэше артефактов
+.cache/build/artifacts и при совпадении ключа берутся оттуда.
+
+Хэши входных файлов запоминаются вместе с mtime и размером в
+.cache/build/state.json, поэтому неизменённые файлы (включая сам ROM)
+не перечитываются.
+
+Запуск из корня репозитория:
+
+    python scripts/build.py [--rom data/0558.nds] [--out data/0558-rus.nds]
+                            [--manifest fonts.json] [--force] [--dry-run]
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'font_tools'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, 'nds_tools'))
+
+from batch_build_fonts import apply_job, job_mapping, load_manifest  # noqa: E402
+from batch_insert_cyrillic import (  # noqa: E402
+    CYRILLIC_MAPPING, FONT_PATH, FONT_SIZE_LOWER, FONT_SIZE_UPPER, GLYPH_LEFT_OFFSET, GLYPH_TRACKING,
+)
+from glyph_render import RENDER_VERSION, RenderCache  # noqa: E402
+from nds_rom import NDSError, load_rom  # noqa: E402
+from nitro_gfx import NitroError, asset_sources, encode_asset, list_assets  # noqa: E402
+from nftr import NFTRError, load_font  # noqa: E402
+
+# Меняется при изменении правил сборки — все узлы пересобираются
+BUILD_VERSION = 1
+
+CACHE_DIR = os.path.join(".cache", "build")
+STATE_PATH = os.path.join(CACHE_DIR, "state.json")
+ARTIFACTS_DIR = os.path.join(CACHE_DIR, "artifacts")
+
+BASE_ROM = os.path.join("data", "0558.nds")
+OUTPUT_ROM = os.path.join("data", "0558-rus.nds")
+BUILD_DIR = "build"
+ASSETS_ROOT = os.path.join("data", "translated_assets")
+PALETTES_ROOT = os.path.join("data", "source_images")
+EXTRACTED_ROOT = os.path.join("data", "full_extracted")
+
+DEFAULT_FONT_JOB = {
+    'nftr': os.path.join("data", "tumefont.orig.nftr"),
+    'output': os.path.join(BUILD_DIR, "tumefont.nftr"),
+    'rom': "tumefont.nftr",
+}
+
+
+class BuildError(Exception):
+    """Ошибка сборки узла"""
+
+
+class Node:
+    """
+    Узел графа сборки.
+
+    inputs — файлы, от содержимого которых зависит результат
+    deps   — имена узлов, результаты которых нужны для сборки
+    params — параметры (JSON), входящие в ключ узла
+    build  — функция build(node, graph), записывающая все выходы узла
+    rom    — путь файла внутри образа, если результат туда вставляется
+    extra  — дополнительные выходы [(путь, путь внутри образа или None), ...]
+    cache  — хранить ли результат в кэше артефактов
+    """
+
+    def __init__(self, name, build, output, inputs=(), deps=(), params=None, rom=None, extra=(), cache=True):
+        self.name = name
+        self.build = build
+        self.output = output
+        self.inputs = list(inputs)
+        self.deps = list(deps)
+        self.params = params
+        self.rom = rom
+        self.extra = list(extra)
+        self.cache = cache
+
+    @property
+    def outputs(self):
+        """Все выходы узла: [(путь, путь внутри образа или None), ...]"""
+        return [(self.output, self.rom)] + self.extra
+
+
+class BuildGraph:
+    """Граф узлов с ключами по содержимому и кэшем артефактов"""
+
+    def __init__(self, state_path=STATE_PATH, artifacts_dir=ARTIFACTS_DIR):
+        self.nodes = {}
+        self.state_path = state_path
+        self.artifacts_dir = artifacts_dir
+        self.state = {'files': {}, 'nodes': {}}
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def add(self, node):
+        if node.name in self.nodes:
+            raise BuildError(f"Узел '{node.name}' уже есть в графе")
+        self.nodes[node.name] = node
+        return node
+
+    def digest(self, path):
+        """SHA-1 файла; пересчитывается только при изменении mtime/размера"""
+        stat = os.stat(path)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        cached = self.state['files'].get(path)
+        if cached is not None and cached[:2] == stamp:
+            return cached[2]
+        sha = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        self.state['files'][path] = stamp + [sha.hexdigest()]
+        return sha.hexdigest()
+
+    def order(self):
+        """Узлы в порядке зависимостей"""
+        ordered = []
+        visiting = set()
+        done = set()
+
+        def visit(name, chain):
+            if name in done:
+                return
+            if name in visiting:
+                raise BuildError(f"Цикл в графе сборки: {' → '.join(chain + [name])}")
+            if name not in self.nodes:
+                raise BuildError(f"Узел '{chain[-1]}' зависит от неизвестного узла '{name}'")
+            visiting.add(name)
+            for dep in self.nodes[name].deps:
+                visit(dep, chain + [name])
+            visiting.discard(name)
+            done.add(name)
+            ordered.append(self.nodes[name])
+
+        for name in self.nodes:
+            visit(name, [])
+        return ordered
+
+    def key(self, node):
+        """Ключ узла: параметры, содержимое входов и результаты зависимостей"""
+        missing = [path for path in node.inputs if not os.path.exists(path)]
+        if missing:
+            raise BuildError(f"Узел '{node.name}': нет входного файла {missing[0]}")
+        payload = [
+            BUILD_VERSION, node.name, node.params,
+            [(path, self.digest(path)) for path in node.inputs],
+            [(dep, self.state['nodes'][dep]['digest']) for dep in node.deps],
+        ]
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _artifact_paths(self, node, key):
+        directory = os.path.join(self.artifacts_dir, key[:2], key)
+        return [os.path.join(directory, str(i)) for i in range(len(node.outputs))]
+
+    def outputs_digest(self, node):
+        """Хэш всех выходов узла или None, если какого-то выхода нет"""
+        paths = [path for path, _ in node.outputs]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        if len(paths) == 1:
+            return self.digest(paths[0])
+        return hashlib.sha1(''.join(self.digest(path) for path in paths).encode('ascii')).hexdigest()
+
+    def run(self, force=False, dry_run=False):
+        """
+        Собирает устаревшие узлы. Возвращает список (имя, статус), где статус —
+        'актуален', 'из кэша' или 'собран' ('устарел' при dry_run)
+        """
+        report = []
+        for node in self.order():
+            key = self.key(node)
+            previous = self.state['nodes'].get(node.name, {})
+            up_to_date = (not force and previous.get('key') == key
+                          and self.outputs_digest(node) == previous.get('digest'))
+            if up_to_date:
+                report.append((node.name, 'актуален'))
+                continue
+            if dry_run:
+                # Результат неизвестен — зависимые узлы считаются устаревшими
+                self.state['nodes'][node.name] = {'key': key, 'digest': key}
+                report.append((node.name, 'устарел'))
+                continue
+
+            for path, _ in node.outputs:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            artifacts = self._artifact_paths(node, key)
+            if node.cache and not force and all(os.path.exists(path) for path in artifacts):
+                for artifact, (path, _) in zip(artifacts, node.outputs):
+                    _copy_file(artifact, path)
+                status = 'из кэша'
+            else:
+                node.build(node, self)
+                for path, _ in node.outputs:
+                    if not os.path.exists(path):
+                        raise BuildError(f"Узел '{node.name}' не создал {path}")
+                if node.cache:
+                    os.makedirs(os.path.dirname(artifacts[0]), exist_ok=True)
+                    for artifact, (path, _) in zip(artifacts, node.outputs):
+                        _copy_file(path, artifact)
+                status = 'собран'
+            self.state['nodes'][node.name] = {'key': key, 'digest': self.outputs_digest(node)}
+            report.append((node.name, status))
+
+        if not dry_run:
+            self.save()
+        return report
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+
+def _copy_file(source, target):
+    tmp_path = f"{target}.tmp{os.getpid()}"
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+# --- Шрифты ---
+
+def build_font(node, graph):
+    """
+    Вставляет символы всех заданий узла в исходный NFTR (в порядке манифеста);
+    отрисовка — через кэш рендера
+    """
+    jobs = node.params['jobs']
+    try:
+        font = load_font(jobs[0]['nftr'])
+    except NFTRError as e:
+        raise BuildError(f"{jobs[0]['nftr']}: {e}")
+    cache = RenderCache()
+    for job in jobs:
+        apply_job(font, job, lambda char, size, job=job: cache.render(char, job['ttf'], size,
+                                                                       font.cell_width, font.cell_height))
+    cache.save()
+    font.save(node.output)
+
+
+def add_font_nodes(graph, jobs):
+    """Узел на каждый выходной шрифт; задания с общим выходом собираются в нём по порядку"""
+    by_output = {}
+    for job in jobs:
+        by_output.setdefault(job['output'], []).append(job)
+    for output, output_jobs in by_output.items():
+        rom_paths = {job['rom'] for job in output_jobs if job.get('rom')}
+        if len(rom_paths) > 1:
+            raise BuildError(f"Для {output} указано несколько путей в образе: {', '.join(sorted(rom_paths))}")
+        inputs = [output_jobs[0]['nftr']]
+        inputs += [ttf for ttf in dict.fromkeys(job['ttf'] for job in output_jobs) if ttf not in inputs]
+        graph.add(Node(
+            f"font:{output}", build_font, output,
+            inputs=inputs,
+            params={'jobs': output_jobs, 'mappings': [job_mapping(job) for job in output_jobs],
+                    'render': RENDER_VERSION},
+            rom=next(iter(rom_paths), None),
+        ))
+
+
+def default_font_jobs():
+    job = dict(DEFAULT_FONT_JOB, id=0, ttf=FONT_PATH, size_upper=FONT_SIZE_UPPER, size_lower=FONT_SIZE_LOWER,
+               start=CYRILLIC_MAPPING[0][0], end=CYRILLIC_MAPPING[-1][0], left=GLYPH_LEFT_OFFSET,
+               tracking=GLYPH_TRACKING, widths=True)
+    return [job]
+
+
+# --- Графика ---
+
+def build_graphics(node, graph):
+    """Кодирует PNG в NCGR (и NSCR, если он есть у оригинала)"""
+    sources = node.params['sources']
+    try:
+        ncgr, nscr = encode_asset(node.inputs[0], sources)
+    except NitroError as e:
+        raise BuildError(f"{node.inputs[0]}: {e}")
+    with open(node.output, 'wb') as f:
+        f.write(ncgr)
+    if node.extra:
+        with open(node.extra[0][0], 'wb') as f:
+            f.write(nscr)
+
+
+def add_graphics_nodes(graph, assets_root=ASSETS_ROOT):
+    """Узел на каждый *.NCGR.png; путь внутри образа совпадает с путём ресурса"""
+    for png_path in list_assets(assets_root):
+        sources = asset_sources(png_path, assets_root, EXTRACTED_ROOT, PALETTES_ROOT)
+        output = os.path.join(BUILD_DIR, "graphics", *sources['rel'].split('/'))
+        extra = []
+        if sources['nscr']:
+            extra.append((output[:-len('.NCGR')] + '.NSCR', sources['rel'][:-len('.NCGR')] + '.NSCR'))
+        inputs = [png_path] + [sources[key] for key in ('palette', 'ncgr', 'nscr') if sources[key]]
+        graph.add(Node(f"gfx:{sources['rel']}", build_graphics, output, inputs=inputs,
+                       params={'sources': sources}, rom=sources['rel'], extra=extra))
+
+
+# --- Образ ---
+
+def build_rom(node, graph):
+    """Пишет образ, заменяя в исходном файлы-результаты зависимостей"""
+    base_rom = node.inputs[0]
+    with load_rom(base_rom) as rom:
+        replacements = {}
+        for dep in node.deps:
+            for path, rom_path in graph.nodes[dep].outputs:
+                if rom_path:
+                    with open(path, 'rb') as f:
+                        replacements[rom.file_id(rom_path)] = f.read()
+        rom.write(node.output, replacements)
+
+
+def add_rom_node(graph, base_rom, output_rom):
+    deps = [name for name, node in graph.nodes.items() if any(rom_path for _, rom_path in node.outputs)]
+    files = [rom_path for dep in deps for _, rom_path in graph.nodes[dep].outputs if rom_path]
+    graph.add(Node("rom", build_rom, output_rom, inputs=[base_rom], deps=deps,
+                   params={'files': files}, cache=False))
+
+
+def main():
+    base_rom = BASE_ROM
+    output_rom = OUTPUT_ROM
+    manifest = None
+    force = False
+    dry_run = False
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg == '--rom':
+            base_rom = next(args, base_rom)
+        elif arg == '--out':
+            output_rom = next(args, output_rom)
+        elif arg == '--manifest':
+            manifest = next(args, None)
+        elif arg == '--force':
+            force = True
+        elif arg == '--dry-run':
+            dry_run = True
+        else:
+            print(f"Использование: python {sys.argv[0]} [--rom <образ.nds>] [--out <новый.nds>] "
+                  f"[--manifest <манифест.json>] [--force] [--dry-run]")
+            sys.exit(1)
+
+    started = time.perf_counter()
+    graph = BuildGraph()
+    try:
+        jobs = load_manifest(manifest) if manifest else default_font_jobs()
+        add_font_nodes(graph, jobs)
+        add_graphics_nodes(graph)
+        if os.path.exists(base_rom):
+            add_rom_node(graph, base_rom, output_rom)
+        else:
+            print(f"⚠️  Исходный образ '{base_rom}' не найден — собираются только ресурсы")
+        report = graph.run(force, dry_run)
+    except (OSError, ValueError, BuildError, NDSError, NFTRError, NitroError) as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+    for name, status in report:
+        print(f"  {'✓' if status == 'актуален' else '↻'} {name}: {status}")
+    rebuilt = sum(1 for _, status in report if status != 'актуален')
+    print(f"✅ Узлов: {len(report)}, пересобрано: {rebuilt}, за {time.perf_counter() - started:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Пакетная сборка нескольких NFTR шрифтов по манифесту с рендером в пуле процессов
+
+Манифест — JSON со списком заданий:
+
+{
+  "jobs": [
+    {"nftr": "data/tumefont.orig.nftr", "output": "build/tumefont-12.nftr",
+     "ttf": "fonts/PressStart2P-Regular.ttf", "size_upper": 12, "size_lower": 10,
+     "start": 32, "end": 97, "tracking": 1, "left": 0}
+  ]
+}
+
+Обязательно только поле "nftr"; остальные по умолчанию берутся из
+batch_insert_cyrillic.py, "output" по умолчанию совпадает с "nftr".
+Поле "rom" (путь файла внутри образа) использует scripts/build.py.
+Символы рендерятся параллельно, а результаты применяются к шрифтам
+в порядке заданий манифеста и индексов глифов, поэтому итоговые файлы
+не зависят от порядка завершения процессов.
+"""
+
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_insert_cyrillic import (
+    CYRILLIC_MAPPING, FONT_PATH, FONT_SIZE_LOWER, FONT_SIZE_UPPER,
+    GLYPH_LEFT_OFFSET, GLYPH_TRACKING, check_width_params, compute_widths,
+)
+from glyph_render import RenderCache, render_char
+from nftr import NFTRError, load_font
+from nftr.codec import write_glyphs
+
+MIN_CHUNK = 4          # Меньше символов в задании пула не даём: передача задания дороже рендера
+CHUNKS_PER_WORKER = 2  # Частей на процесс — чтобы быстрые процессы забирали остаток
+
+
+def load_manifest(path):
+    """Читает манифест и дополняет задания значениями по умолчанию"""
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    jobs = []
+    sources = {}
+    for job_id, job in enumerate(manifest.get('jobs', [])):
+        if 'nftr' not in job:
+            raise ValueError(f"Задание {job_id}: не указан файл 'nftr'")
+        # Задания с общим выходным файлом дописывают один шрифт — исходник у них должен совпадать
+        output = job.get('output', job['nftr'])
+        source_id, source = sources.setdefault(output, (job_id, job['nftr']))
+        if source != job['nftr']:
+            raise ValueError(f"Задание {job_id}: выход '{output}' уже собирается из '{source}' "
+                             f"(задание {source_id}), а здесь указан '{job['nftr']}'")
+        jobs.append({
+            'id': job_id,
+            'nftr': job['nftr'],
+            'output': output,
+            'ttf': job.get('ttf', FONT_PATH),
+            'size_upper': job.get('size_upper', FONT_SIZE_UPPER),
+            'size_lower': job.get('size_lower', FONT_SIZE_LOWER),
+            'start': job.get('start', CYRILLIC_MAPPING[0][0]),
+            'end': job.get('end', CYRILLIC_MAPPING[-1][0]),
+            'left': job.get('left', GLYPH_LEFT_OFFSET),
+            'tracking': job.get('tracking', GLYPH_TRACKING),
+            'widths': job.get('widths', True),
+            'rom': job.get('rom'),
+        })
+        error = check_width_params(jobs[-1]['left'], jobs[-1]['tracking'])
+        if error:
+            raise ValueError(f"Задание {job_id}: {error}")
+    return jobs
+
+
+def job_mapping(job):
+    """Пары (индекс глифа, символ) задания"""
+    return [(idx, char) for idx, char in CYRILLIC_MAPPING if job['start'] <= idx <= job['end']]
+
+
+def render_chunk(task):
+    """
+    Рендерит часть группы символов одного TTF и размера (выполняется в процессе пула).
+    TTF загружается один раз на процесс благодаря LRU в glyph_render
+    """
+    ttf, font_size, width, height, chars = task
+    results = []
+    for char in chars:
+        pixels, actual_width = render_char(char, ttf, font_size, width, height)
+        results.append((char, np.packbits(pixels).tobytes(), actual_width))
+    return results
+
+
+def job_size(job, char):
+    return job['size_upper'] if char.isupper() else job['size_lower']
+
+
+def apply_job(font, job, render):
+    """
+    Записывает в шрифт битмапы (и ширины) символов задания.
+    render(char, size) возвращает (пиксели, фактическая ширина).
+    Возвращает обработанные пары (индекс, символ)
+    """
+    mapping = sorted(job_mapping(job))
+    if not mapping:
+        return mapping
+    indices = [idx for idx, _ in mapping]
+    pixels = np.stack([render(char, job_size(job, char))[0] for _, char in mapping])
+    write_glyphs(font, indices, pixels)
+    if job['widths']:
+        widths = compute_widths(pixels, job['left'], job['tracking'], font.default_width[2])
+        for glyph_index, entry in zip(indices, widths):
+            if font.width_offset(glyph_index) is not None:
+                font.set_width(glyph_index, *entry)
+    return mapping
+
+
+def build_fonts(jobs, workers=None, use_cache=True):
+    """
+    Выполняет задания манифеста. Возвращает список записанных файлов
+    """
+    # Шрифт-приёмник открывается один раз на каждый выходной файл
+    fonts = {}
+    for job in jobs:
+        if job['output'] not in fonts:
+            fonts[job['output']] = load_font(job['nftr'])
+
+    cache = RenderCache() if use_cache else None
+
+    # Группы уникальных символов по (TTF, размер, ячейка); кэшированные не рендерятся
+    rendered = {}
+    pending = {}
+    for job in jobs:
+        font = fonts[job['output']]
+        for _, char in job_mapping(job):
+            size = job_size(job, char)
+            key = (job['ttf'], size, font.cell_width, font.cell_height, char)
+            if key in rendered or char in pending.get(key[:4], ()):
+                continue
+            if cache is not None:
+                cached = cache.lookup(char, job['ttf'], size, font.cell_width, font.cell_height)
+                if cached is not None:
+                    rendered[key] = cached
+                    continue
+            pending.setdefault(key[:4], []).append(char)
+
+    # Группы делятся на части, чтобы загрузить все процессы даже при одном-двух TTF и размерах
+    total = sum(len(chars) for chars in pending.values())
+    chunk_size = max(MIN_CHUNK, -(-total // ((workers or os.cpu_count() or 1) * CHUNKS_PER_WORKER)))
+    groups, tasks = [], []
+    for group, chars in sorted(pending.items()):
+        for pos in range(0, len(chars), chunk_size):
+            groups.append(group)
+            tasks.append(group + (chars[pos:pos + chunk_size],))
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for group, results in zip(groups, pool.map(render_chunk, tasks)):
+                ttf, size, width, height = group
+                for char, bits, actual_width in results:
+                    pixels = np.unpackbits(np.frombuffer(bits, dtype=np.uint8),
+                                           count=width * height).reshape(height, width)
+                    rendered[group + (char,)] = (pixels, actual_width)
+                    if cache is not None:
+                        cache.store(char, ttf, size, width, height, pixels, actual_width)
+    if cache is not None:
+        cache.save()
+        print(f"Кэш рендера: {cache.hits} из кэша, {cache.misses} отрисовано заново")
+
+    # Применение результатов строго в порядке заданий и индексов
+    for job in jobs:
+        font = fonts[job['output']]
+        mapping = apply_job(font, job, lambda char, size: rendered[(job['ttf'], size, font.cell_width,
+                                                                    font.cell_height, char)])
+        if not mapping:
+            continue
+        print(f"✓ Задание {job['id']}: {job['nftr']} → {job['output']} ({len(mapping)} символов, "
+              f"{os.path.basename(job['ttf'])} {job['size_upper']}/{job['size_lower']}px)")
+
+    written = []
+    for output, font in fonts.items():
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        font.save(output)
+        written.append(output)
+    return written
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(f"Использование: python {sys.argv[0]} <манифест.json> [--jobs N] [--no-cache]")
+        print(f"Пример: python {sys.argv[0]} fonts_manifest.json --jobs 8")
+        sys.exit(1)
+
+    manifest_path = sys.argv[1]
+    workers = None
+    use_cache = True
+    args = iter(sys.argv[2:])
+    for arg in args:
+        if arg == '--jobs':
+            try:
+                workers = int(next(args, ''))
+            except ValueError:
+                print("ОШИБКА: Параметр --jobs требует целое число.")
+                sys.exit(1)
+            if workers < 1:
+                print("ОШИБКА: Параметр --jobs должен быть не меньше 1.")
+                sys.exit(1)
+        elif arg == '--no-cache':
+            use_cache = False
+
+    try:
+        jobs = load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        print(f"ОШИБКА: Не удалось прочитать манифест: {e}")
+        sys.exit(1)
+
+    print(f"📝 Сборка шрифтов по манифесту {manifest_path}: {len(jobs)} заданий")
+    try:
+        written = build_fonts(jobs, workers, use_cache)
+    except (OSError, NFTRError) as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+    print("-" * 60)
+    for output in written:
+        print(f"✅ Записан {output}")
+
+
+if __name__ == "__main__":
+    main()
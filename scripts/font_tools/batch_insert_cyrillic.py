@@ -5,16 +5,13 @@
 
 import sys
 import os
-from PIL import Image, ImageDraw, ImageFont
+import json
+import numpy as np
 
-# --- Параметры NFTR файла ---
-CMAP_OFFSET = 15664
-WIDTH_TABLE_OFFSET = 16746
-CGLP_OFFSET = 59
-NUM_GLYPHS = 541
-BYTES_PER_GLYPH_BITMAP = 25
-CELL_WIDTH = 13
-CELL_HEIGHT = 15
+from glyph_render import RenderCache, load_truetype, render_char
+from nftr import NFTRError, load_font
+from nftr.codec import glyph_extents, write_glyphs
+from profiling import NULL_PROFILER, Profiler, run_traced
 
 # --- Параметры генерации шрифта ---
 FONT_PATH = "fonts/PressStart2P-Regular.ttf"
@@ -23,6 +20,10 @@ FONT_SIZE_LOWER = 10  # Размер для строчных букв (чуть
 BITMAP_WIDTH = 13
 BITMAP_HEIGHT = 15
 
+# --- Параметры таблицы ширин (CWDH) ---
+GLYPH_LEFT_OFFSET = 0  # Отступ битмапа от текущей позиции пера
+GLYPH_TRACKING = 1     # Пустые пиксели между символами
+
 # --- Таблица соответствия ---
 CYRILLIC_MAPPING = [
     # Заглавные буквы
@@ -40,210 +41,192 @@ CYRILLIC_MAPPING = [
     (93, "ы"), (94, "ь"), (95, "э"), (96, "ю"), (97, "я")
 ]
 
-def generate_char_bitmap(char, font_path, font_size, width, height):
+def load_mapping(path):
     """
-    Генерирует битмап символа и возвращает его как список пикселей (0 или 1)
+    Читает таблицу соответствия из JSON: список пар [индекс, символ] или
+    объект с ключом "mapping" (формат отчёта glyph_usage.py)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('mapping', [])
+    mapping = []
+    for entry in data:
+        if len(entry) != 2 or not isinstance(entry[0], int) or not isinstance(entry[1], str) or len(entry[1]) != 1:
+            raise ValueError(f"Некорректная запись таблицы соответствия: {entry!r}")
+        mapping.append((entry[0], entry[1]))
+    return sorted(mapping)
+
+def generate_char_bitmap(char, font_path, font_size, width, height, cache=None):
+    """
+    Генерирует битмап символа и возвращает его как массив пикселей (height, width) из 0 и 1
     """
-    # Создание холста и загрузка шрифта
-    image = Image.new('L', (width, height), color='white')
-    draw = ImageDraw.Draw(image)
-    
     try:
-        font = ImageFont.truetype(font_path, font_size)
+        if cache is not None:
+            return cache.render(char, font_path, font_size, width, height)
+        return render_char(char, font_path, font_size, width, height)
     except IOError:
         print(f"ОШИБКА: Шрифт не найден по пути: {font_path}")
         return None, 0
 
-    # Позиционирование: вплотную к левой границе, опущено по вертикали
-    try:
-        bbox = draw.textbbox((0, 0), char, font=font)
-        text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
-    except AttributeError:
-        text_width, text_height = draw.textsize(char, font=font)
-        
-    # Вплотную к левой границе (x = 0), опущено по вертикали
-    x_pos_draw = 0  # Левая граница
-    y_pos_draw = (height - text_height) / 2 + 2  # Опущено на 2 пикселя от центра
-    draw.text((x_pos_draw, y_pos_draw), char, font=font, fill='black')
-
-    # Преобразование в битмап (обычный порядок - слева направо, сверху вниз)
-    pixels = []
-    for y in range(height):
-        for x in range(width):
-            pixel_value = 1 if image.getpixel((x, y)) < 128 else 0
-            pixels.append(pixel_value)
-
-    # Расчет фактической ширины
-    min_x, max_x = width, -1
-    for y in range(height):
-        for x in range(width):
-            if image.getpixel((x, y)) < 128:
-                if x < min_x: min_x = x
-                if x > max_x: max_x = x
-    actual_width = (max_x - min_x + 1) if max_x != -1 else 0
-
-    return pixels, actual_width
-
-def pixels_to_nftr_bytes(pixels):
-    """
-    Преобразует обычный битмап в формат NFTR
-    """
-    if len(pixels) != CELL_WIDTH * CELL_HEIGHT:
-        print(f"ОШИБКА: Ожидается {CELL_WIDTH * CELL_HEIGHT} пикселей, получено {len(pixels)}")
-        return None
-
-    # Создаем массив данных 13x15
-    data_pixels = [0] * (CELL_WIDTH * CELL_HEIGHT)
-    
-    # Заполняем массив данных на основе схемы отображения
-    for display_y in range(CELL_HEIGHT):
-        # Первые 5 пикселей строки отображения берутся из столбцов 8-12 строки данных display_y
-        for i in range(5):
-            display_x = i
-            data_x = 8 + i
-            data_y = display_y
-            
-            if display_x < CELL_WIDTH and display_y < CELL_HEIGHT:
-                display_pixel = pixels[display_y * CELL_WIDTH + display_x]
-                data_idx = data_y * CELL_WIDTH + data_x
-                if 0 <= data_idx < len(data_pixels):
-                    data_pixels[data_idx] = display_pixel
-        
-        # Следующие 8 пикселей строки отображения берутся из столбцов 0-7 строки данных display_y+1
-        if display_y < CELL_HEIGHT - 1:
-            for i in range(8):
-                display_x = 5 + i
-                data_x = i
-                data_y = display_y + 1
-                
-                if display_x < CELL_WIDTH and display_y < CELL_HEIGHT:
-                    display_pixel = pixels[display_y * CELL_WIDTH + display_x]
-                    data_idx = data_y * CELL_WIDTH + data_x
-                    if 0 <= data_idx < len(data_pixels):
-                        data_pixels[data_idx] = display_pixel
-
-    # Упаковываем data_pixels в байты
-    bytes_data = []
-    for i in range(0, len(data_pixels), 8):
-        byte_val = 0
-        for j in range(8):
-            if i + j < len(data_pixels) and data_pixels[i + j]:
-                byte_val |= (1 << (7 - j))
-        bytes_data.append(byte_val)
-    
-    # Дополняем до нужного размера
-    while len(bytes_data) < BYTES_PER_GLYPH_BITMAP:
-        bytes_data.append(0)
-    
-    return bytes_data[:BYTES_PER_GLYPH_BITMAP]
-
-def preview_bitmap(pixels, char):
+def preview_bitmap(pixels, char, width=BITMAP_WIDTH, height=BITMAP_HEIGHT):
     """
     Показывает превью битмапа в консоли
     """
     print(f"Превью битмапа для '{char}':")
-    print("+" + "-" * (CELL_WIDTH * 2) + "+")
+    print("+" + "-" * (width * 2) + "+")
     
-    for y in range(CELL_HEIGHT):
-        print("|", end="")
-        for x in range(CELL_WIDTH):
-            idx = y * CELL_WIDTH + x
-            if idx < len(pixels):
-                print("██" if pixels[idx] else "  ", end="")
-        print("|")
+    for row in np.reshape(pixels, (height, width)):
+        print("|" + "".join("██" if p else "  " for p in row) + "|")
     
-    print("+" + "-" * (CELL_WIDTH * 2) + "+")
+    print("+" + "-" * (width * 2) + "+")
 
-def insert_single_glyph(data, glyph_index, char, font_path=FONT_PATH, show_preview=False):
+def render_single_glyph(font, glyph_index, char, font_path=FONT_PATH, show_preview=False, cache=None):
     """
-    Вставляет ТОЛЬКО битмап одного символа в данные NFTR
+    Генерирует битмап одного символа под ячейку шрифта NFTR.
+    Возвращает массив пикселей (cell_height, cell_width) или None
     """
-    if not (0 <= glyph_index < NUM_GLYPHS):
+    if not (0 <= glyph_index < font.num_glyphs):
         print(f"ОШИБКА: Индекс {glyph_index} выходит за границы.")
-        return False
+        return None
 
     # Выбираем размер шрифта в зависимости от регистра
     font_size = FONT_SIZE_UPPER if char.isupper() else FONT_SIZE_LOWER
 
-    # Генерируем битмап
-    pixels, actual_width = generate_char_bitmap(char, font_path, font_size, BITMAP_WIDTH, BITMAP_HEIGHT)
+    # Генерируем битмап под размер ячейки шрифта
+    pixels, actual_width = generate_char_bitmap(char, font_path, font_size, font.cell_width, font.cell_height, cache)
     if pixels is None:
-        return False
+        return None
 
     if show_preview:
-        preview_bitmap(pixels, char)
+        preview_bitmap(pixels, char, font.cell_width, font.cell_height)
 
-    # Преобразуем в байты
-    bitmap_bytes = pixels_to_nftr_bytes(pixels)
-    if bitmap_bytes is None:
-        return False
-
-    # Вычисляем адрес битмапа
-    bitmap_addr = CGLP_OFFSET + (glyph_index * BYTES_PER_GLYPH_BITMAP)
-
-    # Проверяем границы
-    if bitmap_addr + BYTES_PER_GLYPH_BITMAP > len(data):
-        print(f"ОШИБКА: Адрес битмапа ({bitmap_addr}) выходит за границы файла ({len(data)})")
-        return False
+    print(f"✓ Символ '{char}' → индекс {glyph_index} (фактическая ширина: {actual_width}px)")
+    return pixels
 
-    # Записываем ТОЛЬКО битмап
-    for i, byte_val in enumerate(bitmap_bytes):
-        data[bitmap_addr + i] = byte_val
+def compute_widths(pixels, left=GLYPH_LEFT_OFFSET, tracking=GLYPH_TRACKING, empty_advance=None):
+    """
+    Вычисляет записи CWDH (левый отступ, ширина битмапа, шаг) для массива битмапов (N, height, width).
 
-    print(f"✓ Символ '{char}' → индекс {glyph_index} (фактическая ширина: {actual_width}px)")
-    return True
+    Битмап рисуется с нулевого столбца, поэтому ширина битмапа — это столбец
+    за последним закрашенным пикселем, а шаг — отступ + ширина + трекинг.
+    Для пустых глифов шаг равен empty_advance (или трекингу, если он не задан)
+    """
+    _, end = glyph_extents(pixels)
+    advance = np.clip(left + end + tracking, 0, 255)
+    if empty_advance is not None:
+        advance = np.where(end > 0, advance, empty_advance)
+    return [(left, int(w), int(a)) for w, a in zip(end, advance)]
 
-def batch_insert_cyrillic(nftr_file, font_path=FONT_PATH, start_index=None, end_index=None, preview_mode=False):
+def check_width_params(left, tracking, cell_width=BITMAP_WIDTH):
+    """
+    Проверяет, что отступ и трекинг помещаются в запись CWDH: отступ — байт со знаком,
+    шаг (отступ + ширина битмапа + трекинг) — не больше 255. Возвращает текст ошибки или None
+    """
+    if not -128 <= left <= 127:
+        return f"Левый отступ {left} вне диапазона -128..127."
+    if left + cell_width + tracking > 255:
+        return f"Шаг символа (отступ {left} + ширина до {cell_width} + трекинг {tracking}) больше 255."
+    return None
+
+def batch_insert_cyrillic(nftr_file, font_path=FONT_PATH, start_index=None, end_index=None, preview_mode=False,
+                          use_cache=True, write_widths=True, left=GLYPH_LEFT_OFFSET, tracking=GLYPH_TRACKING,
+                          profiler=NULL_PROFILER, mapping=CYRILLIC_MAPPING):
     """
-    Массовая вставка всех русских букв в файл NFTR
+    Массовая вставка всех русских букв в файл NFTR.
+    profiler — Profiler для замера этапов (по умолчанию замеры не ведутся),
+    mapping — таблица соответствия (индекс глифа, символ)
     """
     if not os.path.exists(nftr_file):
         print(f"ОШИБКА: Файл '{nftr_file}' не найден.")
         return False
 
-    # Читаем файл
-    with open(nftr_file, 'rb') as f:
-        data = bytearray(f.read())
-
-    # Создаем резервную копию
-    backup_file = nftr_file + '.backup'
-    if not os.path.exists(backup_file):
-        with open(backup_file, 'wb') as f:
-            with open(nftr_file, 'rb') as orig:
-                f.write(orig.read())
-        print(f"Создана резервная копия: {backup_file}")
+    # Читаем файл и разбираем секции
+    try:
+        with profiler.stage('load_font'):
+            font = load_font(nftr_file)
+    except NFTRError as e:
+        print(f"ОШИБКА: {e}")
+        return False
 
     # Определяем диапазон для обработки
-    mapping_to_process = CYRILLIC_MAPPING
-    if start_index is not None or end_index is not None:
-        start_idx = start_index if start_index is not None else CYRILLIC_MAPPING[0][0]
-        end_idx = end_index if end_index is not None else CYRILLIC_MAPPING[-1][0]
-        mapping_to_process = [(idx, char) for idx, char in CYRILLIC_MAPPING if start_idx <= idx <= end_idx]
+    mapping_to_process = mapping
+    if mapping and (start_index is not None or end_index is not None):
+        start_idx = start_index if start_index is not None else mapping[0][0]
+        end_idx = end_index if end_index is not None else mapping[-1][0]
+        mapping_to_process = [(idx, char) for idx, char in mapping if start_idx <= idx <= end_idx]
 
     print(f"\n🚀 Начинаем вставку {len(mapping_to_process)} символов...")
     print(f"Шрифт: {font_path}")
     print(f"Размер для заглавных: {FONT_SIZE_UPPER}px, для строчных: {FONT_SIZE_LOWER}px")
     print("-" * 60)
 
-    success_count = 0
+    # Кэш отрендеренных глифов: перерисовываются только символы с изменёнными параметрами
+    with profiler.stage('load_cache'):
+        cache = RenderCache() if use_cache else None
+
+    # TTF загружаются заранее, чтобы время загрузки не попадало в рендер
+    if profiler.enabled:
+        with profiler.stage('load_ttf'):
+            try:
+                load_truetype(font_path, FONT_SIZE_UPPER)
+                load_truetype(font_path, FONT_SIZE_LOWER)
+            except IOError:
+                pass
+
+    rendered_indices = []
+    rendered_pixels = []
     for glyph_index, char in mapping_to_process:
         try:
-            if insert_single_glyph(data, glyph_index, char, font_path, preview_mode):
-                success_count += 1
+            with profiler.stage('render'):
+                pixels = render_single_glyph(font, glyph_index, char, font_path, preview_mode, cache)
+            if pixels is not None:
+                rendered_indices.append(glyph_index)
+                rendered_pixels.append(pixels)
             else:
+                profiler.count('glyphs_failed')
                 print(f"✗ Ошибка при вставке '{char}' в индекс {glyph_index}")
         except Exception as e:
+            profiler.count('glyphs_failed')
             print(f"✗ Исключение при обработке '{char}' (индекс {glyph_index}): {e}")
-
-    # Записываем изменения
+    success_count = len(rendered_indices)
+    profiler.count('glyphs_rendered', success_count)
+    if cache is not None:
+        with profiler.stage('save_cache'):
+            cache.save()
+        profiler.count('cache_hits', cache.hits)
+        profiler.count('cache_misses', cache.misses)
+        print(f"Кэш рендера: {cache.hits} из кэша, {cache.misses} отрисовано заново")
+
+    # Кодируем все битмапы одним вызовом и записываем изменения
     if success_count > 0:
-        with open(nftr_file, 'wb') as f:
-            f.write(data)
+        with profiler.stage('encode'):
+            pixels = np.stack(rendered_pixels)
+            write_glyphs(font, rendered_indices, pixels)
+
+        # Ширины считаются по тем же битмапам и пишутся в CWDH в том же проходе
+        widths_written = 0
+        if write_widths:
+            with profiler.stage('widths'):
+                widths = compute_widths(pixels, left, tracking, font.default_width[2])
+                for glyph_index, (glyph_left, glyph_width, advance) in zip(rendered_indices, widths):
+                    if font.width_offset(glyph_index) is None:
+                        print(f"⚠️  Глиф {glyph_index} не описан в таблице ширин, ширина не записана")
+                        continue
+                    font.set_width(glyph_index, glyph_left, glyph_width, advance)
+                    widths_written += 1
+        profiler.count('widths_written', widths_written)
+
+        with profiler.stage('save'):
+            bytes_written = font.save()
+        profiler.count('bytes_written', bytes_written)
         
         print("-" * 60)
         print(f"✅ Успешно обработано: {success_count}/{len(mapping_to_process)} символов")
-        print(f"Файл {nftr_file} обновлен!")
-        print(f"⚠️  Не забудьте настроить ширины глифов в NFTRedit.exe")
+        if write_widths:
+            print(f"Записано ширин глифов: {widths_written} (отступ {left}px, трекинг {tracking}px)")
+        print(f"Файл {nftr_file} обновлен! Изменено байт: {bytes_written}")
+        print(f"Откатить изменения: python nftr_undo.py {nftr_file}")
         return True
     else:
         print("❌ Ни одного символа не было вставлено.")
@@ -252,7 +235,7 @@ def batch_insert_cyrillic(nftr_file, font_path=FONT_PATH, start_index=None, end_
 def main():
     if len(sys.argv) < 2:
         print(f"Использование:")
-        print(f"  python {sys.argv[0]} <файл.nftr> [шрифт] [начальный_индекс] [конечный_индекс] [--preview]")
+        print(f"  python {sys.argv[0]} <файл.nftr> [шрифт] [начальный_индекс] [конечный_индекс] [--preview] [--no-cache] [--tracking N] [--left N] [--no-widths] [--mapping F.json] [--profile F.json] [--trace F.prof]")
         print(f"")
         print(f"Примеры:")
         print(f"  python {sys.argv[0]} tumefont-rus.nftr")
@@ -262,6 +245,13 @@ def main():
         print(f"")
         print(f"Параметры:")
         print(f"  --preview    Показывать превью каждого битмапа")
+        print(f"  --no-cache   Не использовать кэш отрендеренных глифов (.cache/font_tools)")
+        print(f"  --tracking N Пустые пиксели между символами (по умолчанию {GLYPH_TRACKING})")
+        print(f"  --left N     Левый отступ глифа (по умолчанию {GLYPH_LEFT_OFFSET})")
+        print(f"  --no-widths  Не записывать ширины в таблицу CWDH")
+        print(f"  --mapping F  Таблица соответствия из JSON (например, отчёт glyph_usage.py) вместо CYRILLIC_MAPPING")
+        print(f"  --profile F  Время этапов и счётчики в JSON-отчёт F")
+        print(f"  --trace F    Статистика cProfile по функциям в файл F (pstats/snakeviz)")
         print(f"")
         print(f"Диапазоны:")
         print(f"  Заглавные: индексы 32-64 (А-Я)")
@@ -275,25 +265,84 @@ def main():
     start_index = None
     end_index = None
     preview_mode = False
+    use_cache = True
+    write_widths = True
+    left = GLYPH_LEFT_OFFSET
+    tracking = GLYPH_TRACKING
+    profile_path = None
+    trace_path = None
+    mapping = CYRILLIC_MAPPING
+    mapping_file = None
     
-    for i, arg in enumerate(sys.argv[2:], 2):
+    args = iter(sys.argv[2:])
+    for arg in args:
         if arg == '--preview':
             preview_mode = True
+        elif arg == '--no-cache':
+            use_cache = False
+        elif arg == '--no-widths':
+            write_widths = False
+        elif arg == '--mapping':
+            value = next(args, None)
+            try:
+                mapping = load_mapping(value)
+            except (TypeError, OSError, ValueError) as e:
+                print(f"ОШИБКА: Не удалось прочитать таблицу соответствия '{value}': {e}")
+                sys.exit(1)
+            mapping_file = value
+        elif arg in ('--profile', '--trace'):
+            value = next(args, None)
+            if not value:
+                print(f"ОШИБКА: Параметр {arg} требует имя файла.")
+                sys.exit(1)
+            if arg == '--profile':
+                profile_path = value
+            else:
+                trace_path = value
+        elif arg in ('--tracking', '--left'):
+            value = next(args, None)
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                print(f"ОШИБКА: Параметр {arg} требует целое число.")
+                sys.exit(1)
+            if arg == '--tracking':
+                tracking = value
+            else:
+                left = value
         elif arg.isdigit():
             if start_index is None:
                 start_index = int(arg)
             elif end_index is None:
                 end_index = int(arg)
 
+    error = check_width_params(left, tracking)
+    if error:
+        print(f"ОШИБКА: {error}")
+        sys.exit(1)
+
     print(f"📝 Массовая вставка русских букв в NFTR")
     print(f"Файл: {nftr_file}")
     print(f"Шрифт: {font_path}")
     if start_index is not None:
         print(f"Диапазон: {start_index}-{end_index if end_index else 'конец'}")
+    if mapping_file:
+        print(f"Таблица соответствия: {mapping_file} ({len(mapping)} символов)")
     if preview_mode:
         print("Режим: показ превью")
 
-    success = batch_insert_cyrillic(nftr_file, font_path, start_index, end_index, preview_mode)
+    profiler = Profiler() if profile_path else NULL_PROFILER
+    run_args = (nftr_file, font_path, start_index, end_index, preview_mode, use_cache,
+                write_widths, left, tracking, profiler, mapping)
+    if trace_path:
+        success = run_traced(trace_path, batch_insert_cyrillic, *run_args)
+        print(f"Статистика cProfile записана в {trace_path}")
+    else:
+        success = batch_insert_cyrillic(*run_args)
+    if profile_path:
+        profiler.save(profile_path)
+        profiler.print_summary()
+        print(f"Отчёт профилирования записан в {profile_path}")
     
     if success:
         print(f"\n🎉 Готово! Проверить результат можно командами:")
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Замеры скорости инструментов для шрифтов с проверкой на регрессии
+
+Каждый замер запускается несколько раз, в зачёт идёт лучшее время одного
+вызова. Результаты сравниваются с базовыми значениями из JSON; если
+замер медленнее базового больше чем в THRESHOLD раз, скрипт завершается
+с кодом 1. Базовые значения зависят от машины, поэтому по умолчанию
+хранятся в .cache/font_tools и записываются параметром --save.
+
+Запуск из корня репозитория:
+
+    python scripts/font_tools/benchmark.py [--save] [--baseline FILE] [--threshold 1.3]
+                                           [--json результаты.json] [--only имя]
+"""
+
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from batch_build_fonts import apply_job
+from batch_insert_cyrillic import (
+    CYRILLIC_MAPPING, FONT_PATH, FONT_SIZE_LOWER, FONT_SIZE_UPPER, GLYPH_LEFT_OFFSET, GLYPH_TRACKING,
+)
+from glyph_render import load_truetype, render_char
+from insert_cyrillic_glyph import pixels_to_nftr_bytes
+from nftr import Font
+from nftr.codec import decode_cells, decode_glyphs, encode_glyphs
+
+NFTR_PATH = os.path.join("data", "tumefont.orig.nftr")
+DEFAULT_BASELINE = os.path.join(".cache", "font_tools", "bench_baseline.json")
+THRESHOLD = 1.3      # Допустимое замедление относительно базового значения
+MIN_TIME = 0.05      # Минимальная длительность одного повтора, с
+REPEAT = 5
+
+
+def measure(func, repeat=REPEAT, min_time=MIN_TIME):
+    """Лучшее время одного вызова func() в секундах (число вызовов подбирается под min_time)"""
+    func()  # Прогрев: загрузка шрифтов, LRU, ленивые таблицы
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def rebuild_job():
+    return {
+        'ttf': FONT_PATH, 'size_upper': FONT_SIZE_UPPER, 'size_lower': FONT_SIZE_LOWER,
+        'start': CYRILLIC_MAPPING[0][0], 'end': CYRILLIC_MAPPING[-1][0],
+        'left': GLYPH_LEFT_OFFSET, 'tracking': GLYPH_TRACKING, 'widths': True,
+    }
+
+
+def make_benchmarks(nftr_data, tmp_dir):
+    """Замеры: имя → функция без аргументов"""
+    font = Font(bytearray(nftr_data))
+    w, h = font.cell_width, font.cell_height
+    pixels, _ = render_char("Ж", FONT_PATH, FONT_SIZE_UPPER, w, h)
+    all_pixels = decode_glyphs(font)
+    job = rebuild_job()
+    load_truetype(FONT_PATH, FONT_SIZE_UPPER)
+    load_truetype(FONT_PATH, FONT_SIZE_LOWER)
+    rebuild_path = os.path.join(tmp_dir, "rebuild.nftr")
+
+    def rebuild():
+        target = Font(bytearray(nftr_data))
+        apply_job(target, job, lambda char, size: render_char(char, FONT_PATH, size, w, h))
+        target.save(rebuild_path)
+
+    return {
+        'render_glyph': lambda: render_char("Ж", FONT_PATH, FONT_SIZE_UPPER, w, h),
+        'encode_glyph': lambda: pixels_to_nftr_bytes(pixels, w, h, font.cell_size),
+        'decode_glyph': lambda: decode_cells(font.glyph(38), w, h, font.bpp),
+        'encode_all': lambda: encode_glyphs(font, all_pixels),
+        'decode_all': lambda: decode_glyphs(font),
+        'viewer_decode_all': lambda: [decode_cells(font.glyph(i), w, h, font.bpp) for i in range(font.num_glyphs)],
+        'parse_font': lambda: Font(bytearray(nftr_data)),
+        'full_rebuild': rebuild,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Список (имя, время, базовое время, отношение, регрессия?)"""
+    rows = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        ratio = seconds / base if base else None
+        rows.append((name, seconds, base, ratio, ratio is not None and ratio > threshold))
+    return rows
+
+
+def format_time(seconds):
+    if seconds is None:
+        return "—"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} мкс"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} мс"
+    return f"{seconds:.2f} с"
+
+
+def main():
+    baseline_path = DEFAULT_BASELINE
+    threshold = THRESHOLD
+    save = False
+    json_path = None
+    only = None
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg == '--save':
+            save = True
+        elif arg == '--baseline':
+            baseline_path = next(args, baseline_path)
+        elif arg == '--json':
+            json_path = next(args, None)
+        elif arg == '--only':
+            only = next(args, None)
+        elif arg == '--threshold':
+            try:
+                threshold = float(next(args, ''))
+            except ValueError:
+                print("ОШИБКА: Параметр --threshold требует число, например 1.3.")
+                sys.exit(1)
+        else:
+            print(f"Использование: python {sys.argv[0]} [--save] [--baseline FILE] [--threshold {THRESHOLD}] "
+                  f"[--json FILE] [--only имя]")
+            sys.exit(1)
+
+    for path in (NFTR_PATH, FONT_PATH):
+        if not os.path.exists(path):
+            print(f"ОШИБКА: Файл '{path}' не найден (запускайте из корня репозитория).")
+            sys.exit(1)
+    with open(NFTR_PATH, 'rb') as f:
+        nftr_data = f.read()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        benchmarks = make_benchmarks(nftr_data, tmp_dir)
+        for name, func in benchmarks.items():
+            if only and only not in name:
+                continue
+            results[name] = measure(func)
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+
+    rows = compare(results, baseline, threshold)
+    print(f"{'Замер':<20} {'Время':>12} {'Базовое':>12} {'Отношение':>10}")
+    print("-" * 58)
+    for name, seconds, base, ratio, regressed in rows:
+        mark = "  ⚠️  регрессия" if regressed else ""
+        ratio_text = f"{ratio:.2f}x" if ratio is not None else "—"
+        print(f"{name:<20} {format_time(seconds):>12} {format_time(base):>12} {ratio_text:>10}{mark}")
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'threshold': threshold,
+        'results': results,
+    }
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if save:
+        os.makedirs(os.path.dirname(baseline_path) or '.', exist_ok=True)
+        if baseline:
+            # Замеры, которые не запускались (--only), сохраняются из прежнего базового файла
+            report['results'] = dict(baseline, **results)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Базовые значения сохранены в {baseline_path}")
+        return
+
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"❌ Медленнее базовых значений более чем в {threshold}x: {', '.join(regressions)}")
+        sys.exit(1)
+    if not baseline:
+        print(f"Базовых значений нет — сохраните их командой: python {sys.argv[0]} --save")
+    else:
+        print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Рендер символов из TTF в битмапы ячейки NFTR с кэшированием
+
+Загруженные FreeTypeFont хранятся в LRU внутри процесса, а готовые
+битмапы и вычисленные ширины — в кэше на диске. Ключ кэша включает
+хэш содержимого TTF, размер, символ, размеры ячейки и параметры
+размещения, поэтому при изменении любого из них глиф перерисовывается,
+а остальные берутся из кэша.
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# --- Параметры размещения по умолчанию ---
+X_POS = 0        # Вплотную к левой границе
+Y_OFFSET = 2     # Опущено на 2 пикселя от центра
+THRESHOLD = 128  # Пиксели темнее порога считаются закрашенными
+
+# Меняется при изменении алгоритма рендера — старые записи кэша перестают совпадать
+RENDER_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join(".cache", "font_tools", "glyph_render.json")
+
+_digests = {}
+
+
+def file_digest(path):
+    """SHA-1 содержимого файла; пересчитывается только при изменении mtime/размера"""
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _digests.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    _digests[path] = (stamp, digest)
+    return digest
+
+
+@lru_cache(maxsize=32)
+def _load_truetype(font_path, font_size, digest):
+    return ImageFont.truetype(font_path, font_size)
+
+
+def load_truetype(font_path, font_size):
+    """Загружает TTF шрифт; повторные вызовы с теми же параметрами берутся из LRU"""
+    return _load_truetype(font_path, font_size, file_digest(font_path))
+
+
+def draw_char(char, font_path, font_size, width, height, x_pos=X_POS, y_offset=Y_OFFSET):
+    """
+    Рисует символ в полутоновую ячейку width x height (0 — чёрный, 255 — белый).
+    По вертикали символ центрируется по своей высоте и сдвигается на y_offset
+    """
+    font = load_truetype(font_path, font_size)
+    image = Image.new('L', (width, height), color='white')
+    draw = ImageDraw.Draw(image)
+
+    try:
+        bbox = draw.textbbox((0, 0), char, font=font)
+        text_height = bbox[3] - bbox[1]
+    except AttributeError:
+        text_height = draw.textsize(char, font=font)[1]
+
+    y_pos_draw = (height - text_height) / 2 + y_offset
+    draw.text((x_pos, y_pos_draw), char, font=font, fill='black')
+    return np.asarray(image)
+
+
+def render_char(char, font_path, font_size, width, height,
+                x_pos=X_POS, y_offset=Y_OFFSET, threshold=THRESHOLD):
+    """
+    Рендерит символ в ячейку width x height.
+    Возвращает массив пикселей (height, width) из 0/1 и фактическую ширину
+    """
+    pixels = (draw_char(char, font_path, font_size, width, height, x_pos, y_offset) < threshold).astype(np.uint8)
+
+    # Фактическая ширина — от первого до последнего закрашенного столбца
+    columns = np.flatnonzero(pixels.any(axis=0))
+    actual_width = int(columns[-1] - columns[0] + 1) if columns.size else 0
+    return pixels, actual_width
+
+
+# Символ из области частного использования, которого нет в TTF: его рендер — глиф .notdef («тофу»)
+NOTDEF_PROBE = '\U0010FFFD'
+
+
+@lru_cache(maxsize=32)
+def _notdef_pixels(font_path, font_size, digest):
+    return draw_char(NOTDEF_PROBE, font_path, font_size, font_size * 2, font_size * 2)
+
+
+def ttf_has_glyph(char, font_path, font_size):
+    """Рисует ли TTF символ сам, а не глифом .notdef (пустой рендер непробельного символа тоже не считается)"""
+    cell = font_size * 2
+    image = draw_char(char, font_path, font_size, cell, cell)
+    if np.array_equal(image, _notdef_pixels(font_path, font_size, file_digest(font_path))):
+        return False
+    return char.isspace() or bool((image < THRESHOLD).any())
+
+
+class RenderCache:
+    """
+    Дисковый кэш отрендеренных битмапов.
+
+    Записи хранятся в JSON: ключ — хэш входных параметров рендера,
+    значение — упакованные биты ячейки и фактическая ширина.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @staticmethod
+    def key(char, font_digest, font_size, width, height, x_pos, y_offset, threshold):
+        params = [RENDER_VERSION, char, font_digest, font_size, width, height, x_pos, y_offset, threshold]
+        return hashlib.sha1(json.dumps(params, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def lookup(self, char, font_path, font_size, width, height,
+               x_pos=X_POS, y_offset=Y_OFFSET, threshold=THRESHOLD):
+        """Битмап и ширина из кэша или None"""
+        key = self.key(char, file_digest(font_path), font_size, width, height, x_pos, y_offset, threshold)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.hits += 1
+        bits = np.unpackbits(np.frombuffer(bytes.fromhex(entry['bits']), dtype=np.uint8),
+                             count=width * height)
+        return bits.reshape(height, width), entry['width']
+
+    def store(self, char, font_path, font_size, width, height, pixels, actual_width,
+              x_pos=X_POS, y_offset=Y_OFFSET, threshold=THRESHOLD):
+        """Добавляет отрендеренный битмап в кэш"""
+        key = self.key(char, file_digest(font_path), font_size, width, height, x_pos, y_offset, threshold)
+        self.misses += 1
+        self.entries[key] = {'bits': np.packbits(pixels).tobytes().hex(), 'width': int(actual_width)}
+        self._dirty = True
+
+    def render(self, char, font_path, font_size, width, height,
+               x_pos=X_POS, y_offset=Y_OFFSET, threshold=THRESHOLD):
+        """То же, что render_char, но с обращением к кэшу"""
+        cached = self.lookup(char, font_path, font_size, width, height, x_pos, y_offset, threshold)
+        if cached is not None:
+            return cached
+        pixels, actual_width = render_char(char, font_path, font_size, width, height,
+                                           x_pos, y_offset, threshold)
+        self.store(char, font_path, font_size, width, height, pixels, actual_width,
+                   x_pos, y_offset, threshold)
+        return pixels, actual_width
+
+    def save(self):
+        """Сохраняет кэш на диск, если в нём появились новые записи"""
+        if not self._dirty or not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
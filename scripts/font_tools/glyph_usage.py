@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Анализ использования глифов и подбор слотов шрифта под символы перевода
+
+Строит частотный индекс символов по двум источникам:
+  * ресурсы распакованного образа (--rom) — текст, который остаётся в игре
+    на японском: байты читаются блоками и разбираются как Shift-JIS
+    векторно на NumPy, учитываются только коды, для которых в шрифте есть
+    глиф, в цепочках не короче MIN_RUN символов (одиночные совпадения в
+    двоичных данных — шум);
+  * файлы перевода (UTF-8) — символы, которые нужно нарисовать.
+
+По индексу подбирается раскладка слотов: глифы, нужные оставшемуся тексту,
+знакам из PUNCTUATION_CODES и символам перевода с собственным глифом, не
+трогаются. Собственный глиф защищается, даже если его слот был в прежней
+таблице: TTF японских символов не рисует, а букве, которой нужен этот
+слот, достаётся конфликт. Символам перевода без глифа (кириллица,
+латиница, недостающие знаки) назначаются свободные слоты в порядке
+убывания частоты, причём прежний слот из CYRILLIC_MAPPING сохраняется,
+если он свободен, а новые берутся сначала из освободившихся слотов
+прежней таблицы. Символы, которых нет в TTF (--ttf, его рисует
+batch_insert_cyrillic.py), слотов не получают и перечисляются в отчёте
+как undrawable — иначе в слот попал бы глиф .notdef.
+Результат — JSON с новой таблицей соответствия, списком свободных слотов
+и конфликтов; его принимают batch_insert_cyrillic.py, text_encoder.py и
+text_fit.py через --mapping.
+"""
+
+import json
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+
+from batch_insert_cyrillic import CYRILLIC_MAPPING, FONT_PATH, FONT_SIZE_LOWER, FONT_SIZE_UPPER, load_mapping
+from glyph_render import ttf_has_glyph
+from nftr import NO_GLYPH, NFTRError, load_font
+from text_encoder import NEWLINE_ESCAPE, PUNCTUATION_CODES, build_substitution_table, native_bytes
+
+MIN_RUN = 3                # Минимальная длина цепочки двухбайтовых символов в ресурсах
+CHUNK_SIZE = 1 << 20       # Размер блока чтения ресурсов
+DEFAULT_OUTPUT = "glyph_slots.json"
+
+# Ресурсы без текста: графика, звук, анимации, шрифты
+SKIP_EXTENSIONS = {
+    '.ncgr', '.nclr', '.nscr', '.ncer', '.nanr', '.nmcr', '.nmar', '.nftr',
+    '.sdat', '.sseq', '.sbnk', '.swar', '.sadl', '.mods', '.pal', '.png',
+}
+
+
+# --- Частоты в ресурсах образа ---
+
+def scan_sjis(data, has_glyph, min_run=MIN_RUN):
+    """
+    Коды двухбайтовых символов Shift-JIS в блоке байт (массив uint16).
+
+    has_glyph — булев массив на 65536 кодов. Кандидаты — все позиции, где
+    пара байт образует код с глифом; в сплошных сериях перекрывающихся
+    кандидатов берутся позиции с чётным смещением от начала серии, затем
+    отбрасываются цепочки короче min_run символов
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if len(raw) < 2:
+        return np.zeros(0, dtype=np.uint16)
+    lead = raw[:-1]
+    trail = raw[1:]
+    codes = lead.astype(np.uint16) << 8 | trail
+    valid = (((lead >= 0x81) & (lead <= 0x9F)) | ((lead >= 0xE0) & (lead <= 0xFC))) & has_glyph[codes]
+    positions = np.flatnonzero(valid)
+    if not len(positions):
+        return np.zeros(0, dtype=np.uint16)
+
+    # Перекрывающиеся кандидаты: «ведущий» байт может оказаться вторым байтом предыдущего символа
+    breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+    run_starts = np.zeros(len(positions), dtype=np.intp)
+    run_starts[breaks] = breaks
+    run_starts = positions[np.maximum.accumulate(run_starts)]
+    positions = positions[(positions - run_starts) % 2 == 0]
+
+    # Цепочки символов, идущих подряд
+    chain_breaks = np.concatenate(([True], np.diff(positions) != 2))
+    chain_ids = np.cumsum(chain_breaks) - 1
+    lengths = np.bincount(chain_ids)
+    return codes[positions[lengths[chain_ids] >= min_run]]
+
+
+def _text_boundary(chunk):
+    """Конец последнего байта < 0x40 в блоке: такой байт не может быть частью двухбайтового символа"""
+    tail = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) < 0x40)
+    return int(tail[-1]) + 1 if len(tail) else len(chunk)
+
+
+def scan_file(path, has_glyph, counts, min_run=MIN_RUN, chunk_size=CHUNK_SIZE):
+    """
+    Добавляет частоты кодов файла в counts (массив на 65536 элементов).
+    Файл читается блоками; хвост блока после последнего однобайтового
+    символа переносится в следующий, так что символы на границе не теряются
+    """
+    carry = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk_size)
+            data = carry + block
+            if not block:
+                end = len(data)
+            else:
+                end = _text_boundary(data)
+            if end:
+                found = scan_sjis(data[:end], has_glyph, min_run)
+                counts += np.bincount(found, minlength=len(counts))[:len(counts)]
+            carry = data[end:]
+            if not block:
+                return
+
+
+def iter_resources(paths):
+    """Файлы ресурсов: каталоги обходятся рекурсивно, файлы с SKIP_EXTENSIONS пропускаются"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for directory, _, names in os.walk(path):
+            for name in sorted(names):
+                if os.path.splitext(name)[1].lower() not in SKIP_EXTENSIONS:
+                    yield os.path.join(directory, name)
+
+
+def scan_resources(font, paths, min_run=MIN_RUN):
+    """Частоты кодов символов шрифта в ресурсах образа: (counts, число файлов)"""
+    has_glyph = np.frombuffer(font.charmap.code_to_index, dtype=np.uint16) != NO_GLYPH
+    counts = np.zeros(len(has_glyph), dtype=np.int64)
+    files = 0
+    for path in iter_resources(paths):
+        scan_file(path, has_glyph, counts, min_run)
+        files += 1
+    return counts, files
+
+
+# --- Частоты в переводе ---
+
+def count_translation(paths):
+    """Частоты символов в файлах перевода (построчно, '\\n' внутри строки не считается)"""
+    counts = Counter()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for line in f:
+                counts.update(line.rstrip('\r\n').replace(NEWLINE_ESCAPE, ''))
+    return counts
+
+
+# --- Раскладка слотов ---
+
+def native_index(font, table, char):
+    """
+    Индекс собственного глифа символа в исходном шрифте или None. Слоты прежней
+    таблицы не исключаются: свободный слот защищается, занятый даёт конфликт
+    """
+    raw = table.get(char) or native_bytes(font, char)
+    if raw is None:
+        return None
+    return font.index_of(int.from_bytes(raw, 'big'))
+
+
+def allocate_slots(font, rom_counts, text_counts, mapping=CYRILLIC_MAPPING, punctuation=PUNCTUATION_CODES,
+                   font_path=FONT_PATH):
+    """
+    Подбирает слоты для символов перевода без собственного глифа.
+
+    Возвращает словарь отчёта: mapping (новая таблица соответствия),
+    free_slots, conflicts (прежний слот символа занят нужным глифом),
+    unplaced (символы, которым не хватило слотов) и undrawable (символы,
+    которых нет ни в шрифте, ни в TTF font_path)
+    """
+    table = build_substitution_table(font, [], punctuation)
+
+    protected = {}
+    for code in np.flatnonzero(rom_counts):
+        index = font.index_of(int(code))
+        if index is not None:
+            protected.setdefault(index, 'rom')
+    for code in punctuation.values():
+        index = font.index_of(code)
+        if index is not None:
+            protected.setdefault(index, 'punctuation')
+    needed = []
+    undrawable = []
+    for char, _ in text_counts.most_common():
+        if char.isspace():
+            continue
+        index = native_index(font, table, char)
+        if index is not None:
+            protected.setdefault(index, 'text')
+        elif ttf_has_glyph(char, font_path, FONT_SIZE_UPPER if char.isupper() else FONT_SIZE_LOWER):
+            needed.append(char)
+        else:
+            undrawable.append(char)
+    if 0 <= font.default_index < font.num_glyphs:
+        protected.setdefault(font.default_index, 'default')
+
+    def describe(index):
+        code = font.code_of(index)
+        return {
+            'index': index, 'code': None if code is None else f"0x{code:04x}",
+            'glyph': font.char_of(code), 'reason': protected[index],
+            'uses': int(rom_counts[code]) if code is not None else 0,
+        }
+
+    assigned = {}
+    conflicts = []
+    current = {char: index for index, char in mapping}
+    for char in needed:
+        index = current.get(char)
+        if index is None or not (0 <= index < font.num_glyphs):
+            continue
+        if index in protected:
+            conflicts.append(dict(describe(index), char=char))
+        else:
+            assigned[char] = index
+
+    # Сначала слоты прежней таблицы, освободившиеся от ненужных символов, затем остальные по порядку
+    taken = set(assigned.values())
+    order = sorted(current.values()) + list(range(font.num_glyphs))
+    pool = (index for index in dict.fromkeys(order)
+            if 0 <= index < font.num_glyphs and index not in protected and index not in taken)
+    unplaced = []
+    for char in needed:
+        if char in assigned:
+            continue
+        index = next(pool, None)
+        if index is None:
+            unplaced.append(char)
+        else:
+            assigned[char] = index
+    taken = set(assigned.values())
+
+    return {
+        'mapping': sorted([index, char] for char, index in assigned.items()),
+        'free_slots': [index for index in range(font.num_glyphs) if index not in protected and index not in taken],
+        'conflicts': conflicts,
+        'unplaced': unplaced,
+        'undrawable': undrawable,
+        'protected': len(protected),
+    }
+
+
+def build_report(font, rom_counts, text_counts, mapping=CYRILLIC_MAPPING, font_path=FONT_PATH):
+    """Полный отчёт: раскладка слотов и частотный индекс"""
+    report = allocate_slots(font, rom_counts, text_counts, mapping, font_path=font_path)
+    report['frequencies'] = {
+        'translation': dict(text_counts.most_common()),
+        'rom': {f"0x{int(code):04x}": int(rom_counts[code])
+                for code in np.argsort(-rom_counts, kind='stable') if rom_counts[code]},
+    }
+    return report
+
+
+def print_summary(report, files, text_counts):
+    rom = report['frequencies']['rom']
+    print(f"Ресурсов просмотрено: {files}, различных символов в тексте игры: {len(rom)}")
+    print(f"Символов в переводе: {sum(text_counts.values())}, различных: {len(text_counts)}")
+    print(f"Защищённых глифов: {report['protected']}, назначено слотов: {len(report['mapping'])}, "
+          f"свободно: {len(report['free_slots'])}")
+    if report['conflicts']:
+        print(f"⚠️  Конфликтов: {len(report['conflicts'])} (прежний слот нужен оставшемуся тексту)")
+        for conflict in report['conflicts']:
+            print(f"  '{conflict['char']}': слот {conflict['index']} ({conflict['glyph'] or conflict['code']}, "
+                  f"{conflict['reason']}, {conflict['uses']} вхождений)")
+    if report['unplaced']:
+        print(f"❌ Не хватило слотов для: {''.join(report['unplaced'])}")
+    if report['undrawable']:
+        print(f"❌ Нет ни в шрифте, ни в TTF (слот не назначен): {''.join(report['undrawable'])}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(f"Использование: python {sys.argv[0]} <шрифт.nftr> [перевод.txt ...] [--rom каталог]... "
+              f"[--mapping F.json] [--ttf F.ttf] [--min-run N] [--output {DEFAULT_OUTPUT}]")
+        print(f"")
+        print(f"Пример: python {sys.argv[0]} data/tumefont.orig.nftr translation/*.txt --rom data/full_extracted/data")
+        print(f"")
+        print(f"Параметры:")
+        print(f"  --rom PATH      Каталог или файл ресурсов с оставшимся японским текстом (можно несколько)")
+        print(f"  --mapping F     Текущая таблица соответствия (по умолчанию CYRILLIC_MAPPING)")
+        print(f"  --ttf F         TTF, которым batch_insert_cyrillic.py рисует символы (по умолчанию {FONT_PATH})")
+        print(f"  --min-run N     Минимальная длина цепочки символов в ресурсах (по умолчанию {MIN_RUN})")
+        print(f"  --output F      Файл отчёта (по умолчанию {DEFAULT_OUTPUT})")
+        print(f"")
+        print(f"Отчёт передаётся в batch_insert_cyrillic.py, text_encoder.py и text_fit.py параметром --mapping.")
+        sys.exit(1)
+
+    font_file = sys.argv[1]
+    translations = []
+    rom_paths = []
+    mapping_file = None
+    font_path = FONT_PATH
+    min_run = MIN_RUN
+    output = DEFAULT_OUTPUT
+    args = iter(sys.argv[2:])
+    for arg in args:
+        if arg == '--rom':
+            rom_paths.append(next(args, ''))
+        elif arg == '--mapping':
+            mapping_file = next(args, None)
+        elif arg == '--ttf':
+            font_path = next(args, FONT_PATH)
+        elif arg == '--output':
+            output = next(args, DEFAULT_OUTPUT)
+        elif arg == '--min-run':
+            try:
+                min_run = int(next(args, ''))
+            except ValueError:
+                print("ОШИБКА: Параметр --min-run требует целое число.")
+                sys.exit(1)
+        else:
+            translations.append(arg)
+
+    for path in [font_file, mapping_file, font_path] + translations + rom_paths:
+        if path is not None and not os.path.exists(path):
+            print(f"ОШИБКА: '{path}' не найден.")
+            sys.exit(1)
+
+    try:
+        font = load_font(font_file, cache_dir=os.path.join(".cache", "nftr"))
+        mapping = load_mapping(mapping_file) if mapping_file else CYRILLIC_MAPPING
+    except (NFTRError, ValueError) as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+    rom_counts, files = scan_resources(font, rom_paths, min_run)
+    text_counts = count_translation(translations)
+    report = build_report(font, rom_counts, text_counts, mapping, font_path)
+    report['font'] = font_file
+    report['sources'] = {'translation': translations, 'rom': rom_paths}
+
+    print_summary(report, files, text_counts)
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"✓ Раскладка слотов сохранена в {output}")
+    print(f"  Вставка: python batch_insert_cyrillic.py <шрифт.nftr> --mapping {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Скрипт для импорта битмапов глифов из отредактированного PNG-атласа в файл NFTR
+
+Атлас создаётся командой nftr_glyph_viewer.py <файл.nftr> --atlas <атлас.png>,
+правится в любом графическом редакторе и применяется обратно этим скриптом.
+Записываются только ячейки, пиксели которых изменились.
+"""
+
+import sys
+import os
+import numpy as np
+
+from batch_insert_cyrillic import GLYPH_LEFT_OFFSET, GLYPH_TRACKING, compute_widths
+from nftr import NFTRError, load_font
+from nftr.atlas import read_atlas
+from nftr.codec import decode_glyphs, write_glyphs
+
+def import_atlas(nftr_file, atlas_file, output=None, update_widths=False, columns=None, scale=None,
+                 dry_run=False):
+    """
+    Применяет атлас к шрифту. Возвращает список индексов изменённых глифов или None при ошибке
+    """
+    for path in (nftr_file, atlas_file):
+        if not os.path.exists(path):
+            print(f"ОШИБКА: Файл '{path}' не найден.")
+            return None
+
+    try:
+        font = load_font(nftr_file)
+        pixels, layout = read_atlas(atlas_file, font, columns, scale)
+    except (NFTRError, ValueError, OSError) as e:
+        print(f"ОШИБКА: {e}")
+        return None
+
+    if layout.count != font.num_glyphs:
+        print(f"ОШИБКА: В атласе {layout.count} ячеек, а в шрифте {font.num_glyphs} глифов.")
+        return None
+
+    # Сравнение всех ячеек за одну операцию
+    changed = np.flatnonzero((decode_glyphs(font) != pixels).any(axis=(1, 2)))
+    print(f"Атлас: {layout.columns}x{layout.rows} ячеек, масштаб {layout.scale}")
+    print(f"Изменённых глифов: {len(changed)}")
+    if len(changed):
+        print("Индексы: " + ", ".join(str(i) for i in changed))
+
+    if dry_run or len(changed) == 0:
+        return [int(i) for i in changed]
+
+    write_glyphs(font, changed, pixels[changed])
+    if update_widths:
+        widths = compute_widths(pixels[changed], GLYPH_LEFT_OFFSET, GLYPH_TRACKING, font.default_width[2])
+        for glyph_index, entry in zip(changed, widths):
+            if font.width_offset(int(glyph_index)) is not None:
+                font.set_width(int(glyph_index), *entry)
+
+    bytes_written = font.save(output)
+    print(f"Файл {output or nftr_file} обновлен! Изменено байт: {bytes_written}")
+    return [int(i) for i in changed]
+
+def main():
+    if len(sys.argv) < 3:
+        print(f"Использование: python {sys.argv[0]} <файл.nftr> <атлас.png> [--output <новый.nftr>] [--widths]")
+        print(f"                      [--columns N] [--scale N] [--dry-run]")
+        print(f"")
+        print(f"Параметры:")
+        print(f"  --output F   Записать результат в новый файл вместо исходного")
+        print(f"  --widths     Пересчитать ширины изменённых глифов в таблице CWDH")
+        print(f"  --columns N  Число столбцов сетки, если PNG потерял описание атласа")
+        print(f"  --scale N    Масштаб сетки, если PNG потерял описание атласа")
+        print(f"  --dry-run    Только показать, какие глифы изменились")
+        sys.exit(1)
+
+    nftr_file, atlas_file = sys.argv[1], sys.argv[2]
+    output = None
+    update_widths = False
+    dry_run = False
+    columns = scale = None
+    args = iter(sys.argv[3:])
+    for arg in args:
+        if arg == '--output':
+            output = next(args, None)
+        elif arg == '--widths':
+            update_widths = True
+        elif arg == '--dry-run':
+            dry_run = True
+        elif arg in ('--columns', '--scale'):
+            value = next(args, '')
+            if not value.isdigit() or int(value) == 0:
+                print(f"ОШИБКА: Параметр {arg} требует положительное целое число.")
+                sys.exit(1)
+            if arg == '--columns':
+                columns = int(value)
+            else:
+                scale = int(value)
+
+    changed = import_atlas(nftr_file, atlas_file, output, update_widths, columns, scale, dry_run)
+    if changed is None:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
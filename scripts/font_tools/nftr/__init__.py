@@ -0,0 +1,12 @@
+"""
+Общий пакет для работы со шрифтами Nintendo DS (NFTR)
+"""
+
+from .cmap import CMAP_DIRECT, CMAP_SCAN, CMAP_TABLE, NO_GLYPH, CharMap, load_charmap
+from .font import Font, NFTRError, load_font
+from .model import FontModel, Glyph, load_model
+
+__all__ = [
+    'CMAP_DIRECT', 'CMAP_SCAN', 'CMAP_TABLE', 'NO_GLYPH',
+    'CharMap', 'Font', 'FontModel', 'Glyph', 'NFTRError', 'load_charmap', 'load_font', 'load_model',
+]
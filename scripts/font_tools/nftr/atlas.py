@@ -0,0 +1,238 @@
+"""
+Атлас глифов NFTR: все глифы шрифта в одной PNG-сетке
+
+Глифы декодируются одним вызовом codec.decode_glyphs и раскладываются
+в сетку средствами NumPy. Под каждой ячейкой может быть полоса с кодом
+символа и шкалой ширины из CWDH; в режиме сравнения изменившиеся ячейки
+подсвечиваются. Геометрия сетки сохраняется в PNG (текстовый блок
+"nftr-atlas"), поэтому отредактированный атлас читается обратно
+функцией read_atlas().
+"""
+
+import json
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from PIL.PngImagePlugin import PngInfo
+
+from .codec import decode_glyphs
+
+ATLAS_KEY = 'nftr-atlas'
+
+# --- Цвета ---
+COLOR_ON = (0, 0, 0)
+COLOR_OFF = (255, 255, 255)
+COLOR_GRID = (170, 170, 170)
+COLOR_LABEL = (240, 240, 240)
+COLOR_TEXT = (60, 60, 60)
+COLOR_GLYPH_WIDTH = (70, 110, 220)
+COLOR_ADVANCE = (220, 60, 60)
+COLOR_CHANGED_ON = (200, 0, 0)
+COLOR_CHANGED_OFF = (255, 215, 215)
+
+
+class AtlasLayout:
+    """Геометрия сетки атласа"""
+
+    def __init__(self, cell_width, cell_height, count, columns=16, scale=1, spacing=1, label_height=0):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.count = count
+        self.columns = columns
+        self.scale = scale
+        self.spacing = spacing
+        self.label_height = label_height
+
+    @property
+    def rows(self):
+        return max(1, -(-self.count // self.columns))
+
+    @property
+    def block_width(self):
+        return self.cell_width * self.scale + self.spacing
+
+    @property
+    def block_height(self):
+        return self.cell_height * self.scale + self.label_height + self.spacing
+
+    @property
+    def size(self):
+        """Размер изображения (ширина, высота)"""
+        return (self.columns * self.block_width + self.spacing,
+                self.rows * self.block_height + self.spacing)
+
+    def cell_origin(self, index):
+        """Левый верхний угол пикселей глифа index в изображении"""
+        row, column = divmod(index, self.columns)
+        return (self.spacing + column * self.block_width,
+                self.spacing + row * self.block_height)
+
+    def to_json(self):
+        return json.dumps({
+            'cell_width': self.cell_width, 'cell_height': self.cell_height, 'count': self.count,
+            'columns': self.columns, 'scale': self.scale, 'spacing': self.spacing,
+            'label_height': self.label_height,
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        return cls(**json.loads(text))
+
+
+def compose_cells(cells, layout):
+    """
+    Собирает массив ячеек (N, h, w, 3) uint8 в RGB-изображение сетки без циклов по ячейкам
+    """
+    count, h, w = cells.shape[:3]
+    s = layout.scale
+    blocks = np.empty((layout.rows * layout.columns, layout.block_height, layout.block_width, 3), dtype=np.uint8)
+    blocks[:] = COLOR_GRID
+    blocks[:count, :h * s + layout.label_height, :w * s] = COLOR_LABEL
+    blocks[count:, :h * s + layout.label_height, :w * s] = COLOR_OFF
+
+    scaled = cells.repeat(s, axis=1).repeat(s, axis=2)
+    blocks[:count, :h * s, :w * s] = scaled
+
+    grid = blocks.reshape(layout.rows, layout.columns, layout.block_height, layout.block_width, 3)
+    grid = grid.transpose(0, 2, 1, 3, 4).reshape(layout.rows * layout.block_height,
+                                                  layout.columns * layout.block_width, 3)
+
+    # Рамка слева и сверху: ячейки начинаются с отступа spacing
+    width, height = layout.size
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = COLOR_GRID
+    image[layout.spacing:, layout.spacing:] = grid
+    return image
+
+
+def render_atlas(font, columns=16, scale=3, labels=False, widths=False, changed=None):
+    """
+    Рисует все глифы шрифта в одну сетку.
+
+    labels  — подписать ячейки кодом символа (или индексом, если кода нет)
+    widths  — шкала под ячейкой: синяя полоса — ширина битмапа со смещением,
+              красная метка — шаг символа
+    changed — булев массив по глифам, отмеченные ячейки подсвечиваются
+    Возвращает (PIL.Image, AtlasLayout)
+    """
+    pixels = decode_glyphs(font).astype(bool)
+    count = len(pixels)
+
+    label_height = 0
+    if labels:
+        label_height += 4 * scale
+    if widths:
+        label_height += max(2, scale)
+    layout = AtlasLayout(font.cell_width, font.cell_height, count, columns, scale,
+                         spacing=1, label_height=label_height)
+
+    cells = np.empty(pixels.shape + (3,), dtype=np.uint8)
+    cells[~pixels] = COLOR_OFF
+    cells[pixels] = COLOR_ON
+    if changed is not None:
+        changed = np.asarray(changed, dtype=bool)
+        cells[changed[:, None, None] & ~pixels] = COLOR_CHANGED_OFF
+        cells[changed[:, None, None] & pixels] = COLOR_CHANGED_ON
+
+    image = Image.fromarray(compose_cells(cells, layout), 'RGB')
+
+    if labels or widths:
+        draw = ImageDraw.Draw(image)
+        text_font = _label_font(3 * scale)
+        strip_top = font.cell_height * scale
+        for index in range(count):
+            x, y = layout.cell_origin(index)
+            y += strip_top
+            if widths:
+                left, glyph_width, advance = font.width(index)
+                bar = max(2, scale)
+                x0 = x + max(0, left) * scale
+                draw.rectangle([x0, y, x0 + max(glyph_width * scale, 1) - 1, y + bar // 2 - 1],
+                               fill=COLOR_GLYPH_WIDTH)
+                tick = x + min(advance, font.cell_width) * scale - 1
+                draw.rectangle([tick, y, tick, y + bar - 1], fill=COLOR_ADVANCE)
+                y += bar
+            if labels:
+                code = font.code_of(index)
+                text = f"{code:X}" if code is not None else f"#{index}"
+                draw.text((x + 1, y), text, fill=COLOR_TEXT, font=text_font)
+    return image, layout
+
+
+def _label_font(size):
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def changed_glyphs(font_a, font_b):
+    """
+    Булев массив по глифам: отличается битмап или ширина.
+    Глифы за пределами меньшего шрифта считаются изменёнными
+    """
+    count = max(font_a.num_glyphs, font_b.num_glyphs)
+    common = min(font_a.num_glyphs, font_b.num_glyphs)
+    changed = np.ones(count, dtype=bool)
+    if (font_a.cell_width, font_a.cell_height) != (font_b.cell_width, font_b.cell_height):
+        return changed
+
+    indices = np.arange(common)
+    pixels_a = decode_glyphs(font_a, indices)
+    pixels_b = decode_glyphs(font_b, indices)
+    changed[:common] = (pixels_a != pixels_b).any(axis=(1, 2))
+    for index in range(common):
+        if font_a.width(index) != font_b.width(index):
+            changed[index] = True
+    return changed
+
+
+def save_atlas(image, layout, path):
+    """Сохраняет атлас в PNG вместе с описанием сетки"""
+    info = PngInfo()
+    info.add_text(ATLAS_KEY, layout.to_json())
+    image.save(path, pnginfo=info)
+
+
+def read_atlas_layout(image, font, columns=None, scale=None):
+    """
+    Геометрия атласа: из текстового блока PNG, а если его нет (например,
+    редактор его отбросил) — подбирается масштаб сетки без подписей по размеру изображения
+    """
+    text = image.info.get(ATLAS_KEY)
+    if text and columns is None and scale is None:
+        layout = AtlasLayout.from_json(text)
+        if (layout.cell_width, layout.cell_height) != (font.cell_width, font.cell_height):
+            raise ValueError(f"Атлас нарисован для ячеек {layout.cell_width}x{layout.cell_height}, "
+                             f"а в шрифте {font.cell_width}x{font.cell_height}")
+        return layout
+
+    columns = columns or 16
+    for candidate in ([scale] if scale else range(1, 17)):
+        layout = AtlasLayout(font.cell_width, font.cell_height, font.num_glyphs, columns, candidate)
+        if layout.size == image.size:
+            return layout
+    raise ValueError(f"Размер атласа {image.size[0]}x{image.size[1]} не соответствует сетке "
+                     f"из {columns} столбцов ячеек {font.cell_width}x{font.cell_height}")
+
+
+def read_atlas(path, font, columns=None, scale=None, threshold=128):
+    """
+    Читает PNG-атлас и возвращает битмапы всех ячеек массивом (N, cell_height, cell_width).
+
+    Пиксель считается закрашенным, если его яркость ниже threshold.
+    Из масштабированной ячейки берётся центральный пиксель каждого блока scale x scale
+    """
+    image = Image.open(path)
+    layout = read_atlas_layout(image, font, columns, scale)
+    if image.size != layout.size:
+        raise ValueError(f"Размер атласа {image.size} не совпадает с описанием сетки {layout.size}")
+
+    gray = np.asarray(image.convert('L'))
+    s = layout.scale
+    sp = layout.spacing
+    grid = gray[sp:sp + layout.rows * layout.block_height, sp:sp + layout.columns * layout.block_width]
+    blocks = grid.reshape(layout.rows, layout.block_height, layout.columns, layout.block_width)
+    blocks = blocks.transpose(0, 2, 1, 3).reshape(-1, layout.block_height, layout.block_width)
+    cells = blocks[:layout.count, s // 2:layout.cell_height * s:s, s // 2:layout.cell_width * s:s]
+    return (cells < threshold).astype(np.uint8), layout
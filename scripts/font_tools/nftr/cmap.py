@@ -0,0 +1,166 @@
+"""
+Декодирование блоков CMAP и двунаправленная таблица код ↔ индекс глифа
+
+Все три типа блоков (direct, table, scan) разворачиваются один раз при
+загрузке шрифта в плотные массивы array('H'), после чего поиск в обе
+стороны — одно обращение по индексу. Готовые массивы можно сохранить
+на диск и при следующем запуске загрузить без разбора блоков.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+# --- Типы блоков CMAP ---
+CMAP_DIRECT = 0
+CMAP_TABLE = 1
+CMAP_SCAN = 2
+NO_GLYPH = 0xFFFF
+
+CODE_SPACE = 0x10000
+CACHE_MAGIC = b'NFTRCMAP'
+CACHE_VERSION = 1
+
+
+def _u16_array(data, offset, count):
+    """Читает count значений u16 (little-endian) как array('H')"""
+    values = array('H')
+    values.frombytes(bytes(data[offset:offset + count * 2]))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def iter_block(data, block):
+    """Перебирает пары (код символа, индекс глифа) одного блока CMAP"""
+    if block.type == CMAP_DIRECT:
+        first_index = struct.unpack_from('<H', data, block.data_offset)[0]
+        for code in range(block.first_code, block.last_code + 1):
+            yield code, first_index + code - block.first_code
+    elif block.type == CMAP_TABLE:
+        table = _u16_array(data, block.data_offset, block.last_code - block.first_code + 1)
+        for code, index in enumerate(table, block.first_code):
+            if index != NO_GLYPH:
+                yield code, index
+    else:
+        count = struct.unpack_from('<H', data, block.data_offset)[0]
+        pairs = _u16_array(data, block.data_offset + 2, count * 2)
+        for i in range(0, len(pairs), 2):
+            yield pairs[i], pairs[i + 1]
+
+
+class CharMap:
+    """
+    Плотная таблица соответствия кодов символов и индексов глифов.
+
+    code_to_index — 65536 элементов, NO_GLYPH для отсутствующих кодов;
+    index_to_code — по элементу на глиф, NO_GLYPH для глифов без кода.
+    Если на один глиф указывают несколько кодов, обратная таблица хранит
+    первый из них, как и при последовательном просмотре блоков игрой.
+    """
+
+    def __init__(self, code_to_index, index_to_code):
+        self.code_to_index = code_to_index
+        self.index_to_code = index_to_code
+
+    @classmethod
+    def from_blocks(cls, data, blocks, num_glyphs):
+        """Строит таблицу из блоков CMAP шрифта"""
+        code_to_index = array('H', [NO_GLYPH]) * CODE_SPACE
+        index_to_code = array('H', [NO_GLYPH]) * num_glyphs
+        for block in blocks:
+            for code, index in iter_block(data, block):
+                # Первый блок, в котором встретился код, имеет приоритет
+                if code_to_index[code] == NO_GLYPH:
+                    code_to_index[code] = index
+                if index < num_glyphs and index_to_code[index] == NO_GLYPH:
+                    index_to_code[index] = code
+        return cls(code_to_index, index_to_code)
+
+    def index_of(self, code):
+        """Индекс глифа для кода символа или None"""
+        if not (0 <= code < CODE_SPACE):
+            return None
+        index = self.code_to_index[code]
+        return None if index == NO_GLYPH else index
+
+    def code_of(self, index):
+        """Код символа для индекса глифа или None"""
+        if not (0 <= index < len(self.index_to_code)):
+            return None
+        code = self.index_to_code[index]
+        return None if code == NO_GLYPH else code
+
+    def items(self):
+        """Пары (код, индекс) в порядке возрастания кода"""
+        for code, index in enumerate(self.code_to_index):
+            if index != NO_GLYPH:
+                yield code, index
+
+    def __len__(self):
+        return sum(1 for index in self.code_to_index if index != NO_GLYPH)
+
+    # --- Дисковый кэш ---
+
+    def save(self, path):
+        """Сохраняет таблицу в файл кэша"""
+        code_to_index = array('H', self.code_to_index)
+        index_to_code = array('H', self.index_to_code)
+        if sys.byteorder == 'big':
+            code_to_index.byteswap()
+            index_to_code.byteswap()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(CACHE_MAGIC)
+            f.write(struct.pack('<HI', CACHE_VERSION, len(index_to_code)))
+            f.write(code_to_index.tobytes())
+            f.write(index_to_code.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Загружает таблицу из файла кэша или возвращает None, если кэш не подходит"""
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return None
+        header_size = len(CACHE_MAGIC) + 6
+        if raw[:len(CACHE_MAGIC)] != CACHE_MAGIC or len(raw) < header_size:
+            return None
+        version, num_glyphs = struct.unpack_from('<HI', raw, len(CACHE_MAGIC))
+        if version != CACHE_VERSION or len(raw) != header_size + (CODE_SPACE + num_glyphs) * 2:
+            return None
+        code_to_index = _u16_array(raw, header_size, CODE_SPACE)
+        index_to_code = _u16_array(raw, header_size + CODE_SPACE * 2, num_glyphs)
+        return cls(code_to_index, index_to_code)
+
+
+def cmap_digest(data, blocks, num_glyphs):
+    """Хэш содержимого блоков CMAP — ключ дискового кэша"""
+    digest = hashlib.sha1(struct.pack('<I', num_glyphs))
+    for block in blocks:
+        section_size = struct.unpack_from('<I', data, block.offset + 4)[0]
+        digest.update(data[block.offset:block.offset + section_size])
+    return digest.hexdigest()
+
+
+def load_charmap(data, blocks, num_glyphs, cache_dir=None):
+    """
+    Строит CharMap для шрифта, при заданном cache_dir использует дисковый кэш
+    """
+    if cache_dir is None:
+        return CharMap.from_blocks(data, blocks, num_glyphs)
+
+    cache_path = os.path.join(cache_dir, cmap_digest(data, blocks, num_glyphs) + '.cmap')
+    charmap = CharMap.load(cache_path)
+    if charmap is None:
+        charmap = CharMap.from_blocks(data, blocks, num_glyphs)
+        try:
+            charmap.save(cache_path)
+        except OSError:
+            pass  # Кэш необязателен
+    return charmap
@@ -0,0 +1,114 @@
+"""
+Пакетное кодирование и декодирование битмапов глифов NFTR на NumPy
+
+Битмап глифа — это cell_width * cell_height пикселей по bpp бит,
+уложенных подряд слева направо, сверху вниз, старшим битом вперёд,
+без выравнивания строк; запись дополнена нулями до cell_size байт.
+Вместо циклов по пикселям весь набор глифов распаковывается одним
+вызовом np.unpackbits и упаковывается одним np.packbits.
+"""
+
+import numpy as np
+
+
+def glyph_buffer(font):
+    """
+    Битмапы всех глифов шрифта как массив (num_glyphs, cell_size) uint8.
+
+    Массив — представление буфера шрифта без копирования: запись в него
+    сразу меняет font.data.
+    """
+    return np.frombuffer(font.data, dtype=np.uint8,
+                         count=font.num_glyphs * font.cell_size,
+                         offset=font.bitmap_offset).reshape(font.num_glyphs, font.cell_size)
+
+
+def _bit_weights(bpp):
+    return (1 << np.arange(bpp - 1, -1, -1)).astype(np.uint8)
+
+
+def decode_cells(raw, width, height, bpp=1):
+    """
+    Декодирует записи глифов (N, cell_size) в массив пикселей (N, height, width)
+    """
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        raw = np.frombuffer(raw, dtype=np.uint8)
+    raw = np.asarray(raw, dtype=np.uint8)
+    if raw.ndim == 1:
+        raw = raw.reshape(1, -1)
+    num_bits = width * height * bpp
+    if raw.shape[1] * 8 < num_bits:
+        raise ValueError(f"Запись глифа из {raw.shape[1]} байт меньше {num_bits} бит битмапа")
+
+    bits = np.unpackbits(raw, axis=1, count=num_bits)
+    if bpp == 1:
+        return bits.reshape(-1, height, width)
+    values = bits.reshape(-1, width * height, bpp) @ _bit_weights(bpp)
+    return values.astype(np.uint8).reshape(-1, height, width)
+
+
+def encode_cells(pixels, cell_size, bpp=1):
+    """
+    Кодирует массив пикселей (N, height, width) в записи глифов (N, cell_size)
+
+    Значения пикселей обрезаются до bpp бит.
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if pixels.ndim == 2:
+        pixels = pixels[np.newaxis]
+    count, height, width = pixels.shape
+    num_bits = width * height * bpp
+    if num_bits > cell_size * 8:
+        raise ValueError(f"Битмап {width}x{height}x{bpp} не помещается в {cell_size} байт")
+
+    flat = pixels.reshape(count, width * height) & ((1 << bpp) - 1)
+    if bpp == 1:
+        bits = flat
+    else:
+        bits = (flat[:, :, np.newaxis] // _bit_weights(bpp)) & 1
+        bits = bits.reshape(count, num_bits)
+
+    cells = np.zeros((count, cell_size * 8), dtype=np.uint8)
+    cells[:, :num_bits] = bits
+    return np.packbits(cells, axis=1)
+
+
+def decode_glyphs(font, indices=None):
+    """
+    Декодирует глифы шрифта (все или по списку индексов) в массив (N, cell_height, cell_width)
+    """
+    raw = glyph_buffer(font)
+    if indices is not None:
+        raw = raw[np.asarray(indices, dtype=np.intp)]
+    return decode_cells(raw, font.cell_width, font.cell_height, font.bpp)
+
+
+def encode_glyphs(font, pixels):
+    """Кодирует массив пикселей (N, cell_height, cell_width) в записи глифов шрифта"""
+    pixels = np.asarray(pixels)
+    if pixels.shape[-2:] != (font.cell_height, font.cell_width):
+        raise ValueError(f"Ожидаются битмапы {font.cell_width}x{font.cell_height}, "
+                         f"получено {pixels.shape[-1]}x{pixels.shape[-2]}")
+    return encode_cells(pixels, font.cell_size, font.bpp)
+
+
+def write_glyphs(font, indices, pixels):
+    """Кодирует битмапы и записывает их в шрифт по индексам одним присваиванием"""
+    indices = np.asarray(indices, dtype=np.intp)
+    if indices.size and (indices.min() < 0 or indices.max() >= font.num_glyphs):
+        raise IndexError(f"Индекс глифа вне диапазона 0..{font.num_glyphs - 1}")
+    glyph_buffer(font)[indices] = encode_glyphs(font, pixels)
+
+
+def glyph_extents(pixels):
+    """
+    Горизонтальные границы закрашенных пикселей для массива (N, height, width).
+    Возвращает массивы (first, end): первый закрашенный столбец и столбец за
+    последним закрашенным; для пустых глифов оба равны 0
+    """
+    columns = np.asarray(pixels).any(axis=1)
+    filled = columns.any(axis=1)
+    width = columns.shape[1]
+    first = np.where(filled, columns.argmax(axis=1), 0)
+    end = np.where(filled, width - columns[:, ::-1].argmax(axis=1), 0)
+    return first, end
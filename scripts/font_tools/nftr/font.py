@@ -0,0 +1,243 @@
+"""
+Разбор и запись шрифтов Nintendo DS в формате NFTR
+
+Файл состоит из заголовка RTFN и цепочки секций:
+  FNIF — общая информация о шрифте (высота строки, ширина по умолчанию, кодировка)
+  PLGC — битмапы глифов (CGLP)
+  HDWC — таблица ширин глифов (CWDH)
+  PAMC — блоки соответствия кодов символов индексам глифов (CMAP)
+
+Все смещения берутся из самого файла, поэтому модуль работает с любым
+NFTR шрифтом из образа, а не только с tumefont.nftr.
+"""
+
+import os
+import struct
+from collections import namedtuple
+
+from .cmap import CMAP_DIRECT, CMAP_SCAN, CMAP_TABLE, iter_block, load_charmap
+from .patch import apply_patch, atomic_write, changed_runs
+
+# --- Сигнатуры (в файле хранятся в обратном порядке байт) ---
+RTFN_MAGIC = b'RTFN'
+FINF_MAGIC = b'FNIF'
+CGLP_MAGIC = b'PLGC'
+CWDH_MAGIC = b'HDWC'
+CMAP_MAGIC = b'PAMC'
+
+BOM = 0xFEFF
+SECTION_HEADER_SIZE = 8
+CGLP_HEADER_SIZE = 16
+CWDH_HEADER_SIZE = 16
+CMAP_HEADER_SIZE = 20
+WIDTH_ENTRY_SIZE = 3
+
+# Кодировки из поля FNIF
+ENCODINGS = {0: 'utf-8', 1: 'utf-16-le', 2: 'shift_jis', 3: 'cp1252'}
+
+Section = namedtuple('Section', 'magic offset size data')
+WidthBlock = namedtuple('WidthBlock', 'first last offset')
+CMapBlock = namedtuple('CMapBlock', 'first_code last_code type offset data_offset')
+
+
+class NFTRError(Exception):
+    """Ошибка структуры NFTR файла"""
+
+
+class Font:
+    """
+    Шрифт NFTR, разобранный за один проход по цепочке секций.
+
+    Данные хранятся в одном bytearray, секции доступны как memoryview
+    без копирования. Изменения глифов и ширин пишутся прямо в буфер,
+    save() записывает на диск только изменившиеся участки. Блоки CMAP разворачиваются при загрузке
+    в таблицу charmap, при заданном cache_dir она кэшируется на диске.
+    """
+
+    def __init__(self, data, path=None, cache_dir=None):
+        self.path = path
+        self.data = bytearray(data)
+        self.view = memoryview(self.data)
+        # Содержимое файла на диске на момент последней загрузки/записи
+        self._saved = bytearray(self.data) if path is not None else None
+        self.sections = []
+        self.width_blocks = []
+        self.cmap_blocks = []
+        self._parse()
+        self.charmap = load_charmap(self.data, self.cmap_blocks, self.num_glyphs, cache_dir)
+
+    # --- Разбор ---
+
+    def _parse(self):
+        if len(self.data) < 16 or self.data[:4] != RTFN_MAGIC:
+            raise NFTRError("Файл не является NFTR шрифтом (нет сигнатуры RTFN)")
+
+        bom, self.version, self.file_size, header_size, num_sections = \
+            struct.unpack_from('<HHIHH', self.data, 4)
+        if bom != BOM:
+            raise NFTRError(f"Неподдерживаемый порядок байт: 0x{bom:04X}")
+        if self.file_size > len(self.data):
+            raise NFTRError(f"Файл обрезан: заголовок указывает {self.file_size} байт, есть {len(self.data)}")
+
+        # Проход по цепочке секций
+        offset = header_size
+        for _ in range(num_sections):
+            if offset + SECTION_HEADER_SIZE > self.file_size:
+                raise NFTRError(f"Секция по смещению {offset} выходит за границы файла")
+            magic = bytes(self.data[offset:offset + 4])
+            size = struct.unpack_from('<I', self.data, offset + 4)[0]
+            if size < SECTION_HEADER_SIZE or offset + size > self.file_size:
+                raise NFTRError(f"Некорректный размер секции {magic!r} по смещению {offset}: {size}")
+            self.sections.append(Section(magic, offset, size, self.view[offset:offset + size]))
+            offset += size
+
+        finf = [s for s in self.sections if s.magic == FINF_MAGIC]
+        cglp = [s for s in self.sections if s.magic == CGLP_MAGIC]
+        if len(finf) != 1 or len(cglp) != 1:
+            raise NFTRError("Ожидается ровно одна секция FNIF и одна PLGC")
+
+        self._parse_finf(finf[0])
+        self._parse_cglp(cglp[0])
+        for section in self.sections:
+            if section.magic == CWDH_MAGIC:
+                first, last = struct.unpack_from('<HH', self.data, section.offset + 8)
+                self.width_blocks.append(WidthBlock(first, last, section.offset + CWDH_HEADER_SIZE))
+            elif section.magic == CMAP_MAGIC:
+                first, last, block_type = struct.unpack_from('<HHH', self.data, section.offset + 8)
+                if block_type not in (CMAP_DIRECT, CMAP_TABLE, CMAP_SCAN):
+                    raise NFTRError(f"Неизвестный тип блока CMAP {block_type} по смещению {section.offset}")
+                self.cmap_blocks.append(CMapBlock(first, last, block_type, section.offset,
+                                                  section.offset + CMAP_HEADER_SIZE))
+
+    def _parse_finf(self, section):
+        (self.font_type, self.line_height, self.default_index,
+         left, glyph_width, advance, encoding) = struct.unpack_from('<BBHbBBB', self.data, section.offset + 8)
+        self.default_width = (left, glyph_width, advance)
+        self.encoding = ENCODINGS.get(encoding, 'shift_jis')
+        self.encoding_id = encoding
+
+    def _parse_cglp(self, section):
+        (self.cell_width, self.cell_height, self.cell_size, self.baseline,
+         self.max_width, self.bpp, self.cglp_flags) = struct.unpack_from('<BBHBBBB', self.data, section.offset + 8)
+        if self.cell_size == 0:
+            raise NFTRError("Нулевой размер глифа в секции PLGC")
+        self.bitmap_offset = section.offset + CGLP_HEADER_SIZE
+        self.num_glyphs = (section.size - CGLP_HEADER_SIZE) // self.cell_size
+
+    # --- Битмапы ---
+
+    def _check_index(self, index):
+        if not (0 <= index < self.num_glyphs):
+            raise IndexError(f"Индекс глифа {index} вне диапазона 0..{self.num_glyphs - 1}")
+
+    def glyph_offset(self, index):
+        """Смещение битмапа глифа в файле"""
+        self._check_index(index)
+        return self.bitmap_offset + index * self.cell_size
+
+    def glyph(self, index):
+        """Битмап глифа как memoryview (без копирования)"""
+        offset = self.glyph_offset(index)
+        return self.view[offset:offset + self.cell_size]
+
+    def set_glyph(self, index, bitmap):
+        """Записывает битмап глифа (ровно cell_size байт)"""
+        if len(bitmap) != self.cell_size:
+            raise ValueError(f"Ожидается {self.cell_size} байт битмапа, получено {len(bitmap)}")
+        offset = self.glyph_offset(index)
+        self.data[offset:offset + self.cell_size] = bytes(bitmap)
+
+    # --- Ширины ---
+
+    def width_offset(self, index):
+        """Смещение записи ширины глифа в файле или None, если глиф не описан в CWDH"""
+        self._check_index(index)
+        for block in self.width_blocks:
+            if block.first <= index <= block.last:
+                return block.offset + (index - block.first) * WIDTH_ENTRY_SIZE
+        return None
+
+    def width(self, index):
+        """Ширина глифа: (левый отступ, ширина битмапа, полная ширина символа)"""
+        offset = self.width_offset(index)
+        if offset is None:
+            return self.default_width
+        return struct.unpack_from('<bBB', self.data, offset)
+
+    def set_width(self, index, left, glyph_width, advance):
+        """Записывает ширину глифа в таблицу CWDH"""
+        offset = self.width_offset(index)
+        if offset is None:
+            raise NFTRError(f"Глиф {index} не описан ни в одном блоке CWDH")
+        self.data[offset:offset + WIDTH_ENTRY_SIZE] = struct.pack('<bBB', left, glyph_width, advance)
+
+    # --- Коды символов ---
+
+    def iter_cmap(self):
+        """Перебирает все пары (код символа, индекс глифа) из блоков CMAP в порядке блоков"""
+        for block in self.cmap_blocks:
+            yield from iter_block(self.data, block)
+
+    def index_of(self, code):
+        """Индекс глифа для кода символа или None"""
+        return self.charmap.index_of(code)
+
+    def code_of(self, index):
+        """Код символа для индекса глифа или None"""
+        return self.charmap.code_of(index)
+
+    def char_of(self, code):
+        """Символ Юникода для кода в кодировке шрифта или None"""
+        if code is None:
+            return None
+        try:
+            if self.encoding == 'shift_jis':
+                raw = code.to_bytes(2, 'big') if code > 0xFF else bytes([code])
+                return raw.decode('shift_jis')
+            if self.encoding == 'cp1252':
+                return bytes([code]).decode('cp1252')
+            return chr(code)
+        except (UnicodeDecodeError, OverflowError, ValueError):
+            return None
+
+    # --- Запись ---
+
+    def save(self, path=None, journal=True):
+        """
+        Сохраняет шрифт (по умолчанию — в исходный файл).
+
+        Исходный файл обновляется на месте: через mmap пишутся только
+        изменившиеся байты, а их прежние значения при journal=True попадают
+        в журнал отката <файл>.undo. Новый файл пишется целиком через
+        временный файл и переименование, а прежний журнал отката удаляется.
+        Возвращает число записанных байт
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError("Не указан путь для сохранения шрифта")
+
+        in_place = (self._saved is not None and self.path is not None
+                    and os.path.abspath(path) == os.path.abspath(self.path)
+                    and os.path.exists(path) and os.path.getsize(path) == len(self.data))
+        if in_place:
+            runs = changed_runs(self._saved, self.data)
+            written = apply_patch(path, [(offset, self.view[offset:offset + length]) for offset, length in runs],
+                                  journal)
+            # Снимок обновляется только в изменённых участках
+            for offset, length in runs:
+                self._saved[offset:offset + length] = self.view[offset:offset + length]
+        else:
+            atomic_write(path, self.data)
+            written = len(self.data)
+            self._saved = bytearray(self.data)
+
+        self.path = path
+        return written
+
+
+def load_font(path, cache_dir=None):
+    """Загружает NFTR шрифт из файла"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Файл '{path}' не найден.")
+    with open(path, 'rb') as f:
+        return Font(f.read(), path, cache_dir)
@@ -0,0 +1,283 @@
+"""
+Компактная модель шрифта в памяти: глифы как массивы, а не объекты
+
+Все битмапы лежат подряд в одном bytearray (num_glyphs * cell_size байт),
+ширины — в трёх массивах array('b')/array('B'), коды символов — в
+array('H') с NO_GLYPH для глифов без кода. Отдельный глиф (Glyph) — это
+лёгкое представление с __slots__ из ссылки на модель и индекса, оно
+ничего не копирует. Поэтому загрузка, правка и сравнение шрифтов на
+тысячи глифов (CJK) занимают несколько массивов, а не тысячи словарей.
+
+Модель независима от раскладки файла: FontModel.from_font() снимает
+данные со шрифта, apply_to() записывает битмапы и ширины обратно в
+буфер Font, после чего шрифт сохраняется как обычно (font.save()).
+"""
+
+from array import array
+
+import numpy as np
+
+from .cmap import NO_GLYPH
+from .codec import decode_cells, encode_cells, glyph_buffer
+from .font import WIDTH_ENTRY_SIZE, NFTRError, load_font
+
+# Запись CWDH: левый отступ (со знаком), ширина битмапа, шаг
+WIDTH_DTYPE = np.dtype([('left', 'i1'), ('glyph_width', 'u1'), ('advance', 'u1')])
+
+
+class Glyph:
+    """Представление одного глифа модели (без копирования данных)"""
+
+    __slots__ = ('model', 'index')
+
+    def __init__(self, model, index):
+        self.model = model
+        self.index = index
+
+    def __repr__(self):
+        return f"Glyph({self.index}, code={self.code!r}, width={self.width})"
+
+    @property
+    def bitmap(self):
+        """Запись битмапа как memoryview (cell_size байт)"""
+        size = self.model.cell_size
+        return self.model.view[self.index * size:(self.index + 1) * size]
+
+    @bitmap.setter
+    def bitmap(self, raw):
+        size = self.model.cell_size
+        if len(raw) != size:
+            raise ValueError(f"Ожидается {size} байт битмапа, получено {len(raw)}")
+        self.model.bitmaps[self.index * size:(self.index + 1) * size] = bytes(raw)
+
+    @property
+    def pixels(self):
+        """Пиксели глифа как массив (cell_height, cell_width)"""
+        model = self.model
+        return decode_cells(self.bitmap, model.cell_width, model.cell_height, model.bpp)[0]
+
+    @pixels.setter
+    def pixels(self, pixels):
+        model = self.model
+        pixels = np.asarray(pixels)
+        if pixels.shape != (model.cell_height, model.cell_width):
+            raise ValueError(f"Ожидается битмап {model.cell_width}x{model.cell_height}, "
+                             f"получено {pixels.shape[-1]}x{pixels.shape[0]}")
+        self.bitmap = encode_cells(pixels, model.cell_size, model.bpp)[0].tobytes()
+
+    @property
+    def width(self):
+        """(левый отступ, ширина битмапа, шаг)"""
+        model = self.model
+        i = self.index
+        return model.left[i], model.glyph_width[i], model.advance[i]
+
+    @width.setter
+    def width(self, value):
+        model = self.model
+        i = self.index
+        model.left[i], model.glyph_width[i], model.advance[i] = value
+
+    @property
+    def code(self):
+        """Код символа в кодировке шрифта или None"""
+        code = self.model.codes[self.index]
+        return None if code == NO_GLYPH else code
+
+    @code.setter
+    def code(self, code):
+        self.model.set_code(self.index, code)
+
+    @property
+    def char(self):
+        """Символ Юникода или None"""
+        return self.model.char_of(self.code)
+
+
+class FontModel:
+    """
+    Глифы шрифта в плотных массивах.
+
+    bitmaps — bytearray (num_glyphs * cell_size), left — array('b'),
+    glyph_width и advance — array('B'), codes — array('H'). Глифы без
+    записи в CWDH получают ширину по умолчанию из FNIF.
+    """
+
+    def __init__(self, cell_width, cell_height, cell_size, bpp, bitmaps, left, glyph_width, advance, codes,
+                 encoding='shift_jis'):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.cell_size = cell_size
+        self.bpp = bpp
+        self.bitmaps = bitmaps
+        self.view = memoryview(bitmaps)
+        self.left = left
+        self.glyph_width = glyph_width
+        self.advance = advance
+        self.codes = codes
+        self.encoding = encoding
+        self._index = None
+        if len(bitmaps) != len(codes) * cell_size or not (len(left) == len(glyph_width) == len(advance) == len(codes)):
+            raise ValueError("Размеры массивов модели не согласованы с числом глифов")
+
+    @classmethod
+    def from_font(cls, font):
+        """Снимает битмапы, ширины и коды со шрифта Font (данные копируются)"""
+        count = font.num_glyphs
+        bitmaps = bytearray(glyph_buffer(font).tobytes())
+
+        widths = np.empty(count, dtype=WIDTH_DTYPE)
+        widths[:] = tuple(font.default_width)
+        for block in font.width_blocks:
+            last = min(block.last, count - 1)
+            if last < block.first:
+                continue
+            widths[block.first:last + 1] = np.frombuffer(font.data, dtype=WIDTH_DTYPE,
+                                                         count=last - block.first + 1, offset=block.offset)
+
+        codes = array('H', font.charmap.index_to_code)
+        return cls(font.cell_width, font.cell_height, font.cell_size, font.bpp, bitmaps,
+                   array('b', widths['left'].tobytes()), array('B', widths['glyph_width'].tobytes()),
+                   array('B', widths['advance'].tobytes()), codes, font.encoding)
+
+    def copy(self):
+        return FontModel(self.cell_width, self.cell_height, self.cell_size, self.bpp, bytearray(self.bitmaps),
+                         array('b', self.left), array('B', self.glyph_width), array('B', self.advance),
+                         array('H', self.codes), self.encoding)
+
+    # --- Доступ к глифам ---
+
+    @property
+    def num_glyphs(self):
+        return len(self.codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _check_index(self, index):
+        if not (0 <= index < len(self.codes)):
+            raise IndexError(f"Индекс глифа {index} вне диапазона 0..{len(self.codes) - 1}")
+
+    def glyph(self, index):
+        self._check_index(index)
+        return Glyph(self, index)
+
+    __getitem__ = glyph
+
+    def __iter__(self):
+        for index in range(len(self.codes)):
+            yield Glyph(self, index)
+
+    def cells(self):
+        """Битмапы как массив (num_glyphs, cell_size) uint8 — представление bitmaps без копирования"""
+        return np.frombuffer(self.bitmaps, dtype=np.uint8).reshape(len(self.codes), self.cell_size)
+
+    def pixels(self, indices=None):
+        """Пиксели глифов (все или по списку индексов) как массив (N, cell_height, cell_width)"""
+        cells = self.cells()
+        if indices is not None:
+            cells = cells[np.asarray(indices, dtype=np.intp)]
+        return decode_cells(cells, self.cell_width, self.cell_height, self.bpp)
+
+    def set_pixels(self, indices, pixels):
+        """Кодирует битмапы и записывает их по индексам одним присваиванием"""
+        indices = np.asarray(indices, dtype=np.intp)
+        if indices.size and (indices.min() < 0 or indices.max() >= len(self.codes)):
+            raise IndexError(f"Индекс глифа вне диапазона 0..{len(self.codes) - 1}")
+        self.cells()[indices] = encode_cells(pixels, self.cell_size, self.bpp)
+
+    def widths(self):
+        """Ширины как структурированный массив NumPy (left, glyph_width, advance) — копия"""
+        widths = np.empty(len(self.codes), dtype=WIDTH_DTYPE)
+        widths['left'] = np.frombuffer(self.left, dtype=np.int8)
+        widths['glyph_width'] = np.frombuffer(self.glyph_width, dtype=np.uint8)
+        widths['advance'] = np.frombuffer(self.advance, dtype=np.uint8)
+        return widths
+
+    # --- Коды символов ---
+
+    def index_of(self, code):
+        """Индекс глифа для кода символа или None (первый глиф с этим кодом)"""
+        if self._index is None:
+            self._index = {}
+            for index, value in enumerate(self.codes):
+                if value != NO_GLYPH:
+                    self._index.setdefault(value, index)
+        return self._index.get(code)
+
+    def code_of(self, index):
+        self._check_index(index)
+        code = self.codes[index]
+        return None if code == NO_GLYPH else code
+
+    def set_code(self, index, code):
+        self._check_index(index)
+        self.codes[index] = NO_GLYPH if code is None else code
+        self._index = None
+
+    def char_of(self, code):
+        """Символ Юникода для кода в кодировке шрифта или None"""
+        if code is None:
+            return None
+        try:
+            if self.encoding == 'shift_jis':
+                raw = code.to_bytes(2, 'big') if code > 0xFF else bytes([code])
+                return raw.decode('shift_jis')
+            if self.encoding == 'cp1252':
+                return bytes([code]).decode('cp1252')
+            return chr(code)
+        except (UnicodeDecodeError, OverflowError, ValueError):
+            return None
+
+    # --- Сравнение и запись ---
+
+    def diff(self, other):
+        """
+        Индексы глифов, у которых отличается битмап, ширина или код.
+        Глифы за пределами меньшей модели считаются изменёнными
+        """
+        common = min(len(self), len(other))
+        changed = np.ones(max(len(self), len(other)), dtype=bool)
+        if (self.cell_size, self.bpp) == (other.cell_size, other.bpp):
+            changed[:common] = (self.cells()[:common] != other.cells()[:common]).any(axis=1)
+        for ours, theirs, dtype in ((self.left, other.left, np.int8),
+                                    (self.glyph_width, other.glyph_width, np.uint8),
+                                    (self.advance, other.advance, np.uint8),
+                                    (self.codes, other.codes, np.uint16)):
+            changed[:common] |= (np.frombuffer(ours, dtype=dtype)[:common]
+                                 != np.frombuffer(theirs, dtype=dtype)[:common])
+        return np.flatnonzero(changed)
+
+    def apply_to(self, font):
+        """
+        Записывает битмапы и ширины модели в буфер шрифта Font.
+
+        Раскладка файла не меняется: число глифов и коды символов должны
+        совпадать со шрифтом, а ширины глифов вне блоков CWDH — с шириной
+        по умолчанию. Сохраняет изменения на диск font.save()
+        """
+        if (font.num_glyphs, font.cell_size, font.bpp) != (len(self), self.cell_size, self.bpp):
+            raise NFTRError(f"Модель ({len(self)} глифов по {self.cell_size} байт) не совпадает "
+                            f"с раскладкой шрифта ({font.num_glyphs} по {font.cell_size})")
+        if self.codes != font.charmap.index_to_code:
+            raise NFTRError("Коды символов модели отличаются от CMAP шрифта: нужна пересборка файла")
+
+        widths = self.widths()
+        blocks = []
+        covered = np.zeros(len(self), dtype=bool)
+        for block in font.width_blocks:
+            last = min(block.last, len(self) - 1)
+            if last >= block.first:
+                covered[block.first:last + 1] = True
+                blocks.append((block.first, last, block.offset))
+        if (widths[~covered] != np.array(tuple(font.default_width), dtype=WIDTH_DTYPE)).any():
+            raise NFTRError("Ширина глифа вне блоков CWDH отличается от ширины по умолчанию")
+
+        for first, last, offset in blocks:
+            font.data[offset:offset + (last - first + 1) * WIDTH_ENTRY_SIZE] = widths[first:last + 1].tobytes()
+        glyph_buffer(font)[:] = self.cells()
+
+
+def load_model(path, cache_dir=None):
+    """Загружает NFTR шрифт из файла и возвращает его модель"""
+    return FontModel.from_font(load_font(path, cache_dir))
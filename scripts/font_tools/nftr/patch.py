@@ -0,0 +1,259 @@
+"""
+Точечная запись изменений в файл через mmap с журналом отката
+
+Вместо перезаписи всего файла сравниваются старые и новые данные,
+и на диск через отображение в память пишутся только изменившиеся
+участки. Перед записью исходные байты этих участков дописываются
+в журнал отката <файл>.undo и сбрасываются на диск, поэтому даже
+прерванный запуск можно откатить командой undo_patch().
+
+В заголовке журнала хранятся размер и SHA-1 файла до первой записи
+(исходное состояние, файл хэшируется один раз при создании журнала) и
+отметка файла после последней записи: размер, время изменения и inode.
+Пока отметка совпадает, запись стоит только чтения заголовка журнала;
+иначе (прерванная запись, файл заменили или переписали) записи журнала
+проверяются откатом по SHA-1, и неподходящий журнал заменяется новым.
+Откат выполняется, только если записи возвращают файл точно в исходное
+состояние, а atomic_write() удаляет прежний журнал сразу. Когда журнал
+становится больше самого файла, он сжимается до одной разницы между
+исходным и текущим состоянием.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+import numpy as np
+
+JOURNAL_SUFFIX = '.undo'
+JOURNAL_MAGIC = b'NFTRUND3'
+OLD_JOURNAL_MAGICS = (b'NFTRUNDO', b'NFTRUND2')
+# Сигнатура, размер и SHA-1 исходного файла; отметка после последней записи: размер, mtime (нс), inode
+JOURNAL_HEADER = struct.Struct('<8sI20sIQQ')
+JOURNAL_STAMP = struct.Struct('<IQQ')
+JOURNAL_STAMP_OFFSET = 8 + 4 + 20
+RECORD_HEADER = struct.Struct('<II')
+
+# Соседние изменения ближе этого расстояния объединяются в один участок
+MERGE_GAP = 8
+
+
+def changed_runs(old, new, merge_gap=MERGE_GAP):
+    """
+    Участки, где new отличается от old (одинаковой длины).
+    Возвращает список пар (смещение, длина)
+    """
+    a = np.frombuffer(old, dtype=np.uint8)
+    b = np.frombuffer(new, dtype=np.uint8)
+    if a.shape != b.shape:
+        raise ValueError("Сравниваемые данные должны быть одной длины")
+    diff = np.flatnonzero(a != b)
+    if diff.size == 0:
+        return []
+
+    # Разрывы между изменёнными байтами больше merge_gap делят участки
+    breaks = np.flatnonzero(np.diff(diff) > merge_gap)
+    starts = np.concatenate(([diff[0]], diff[breaks + 1]))
+    ends = np.concatenate((diff[breaks], [diff[-1]])) + 1
+    return [(int(start), int(end - start)) for start, end in zip(starts, ends)]
+
+
+def _digest(data):
+    return hashlib.sha1(data).digest()
+
+
+def _stamp(f):
+    """Отметка открытого файла: размер, время изменения (нс) и inode"""
+    stat = os.fstat(f.fileno())
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def _records_bytes(records):
+    return b''.join(RECORD_HEADER.pack(offset, len(old)) + bytes(old) for offset, old in records)
+
+
+def restore(data, records):
+    """Содержимое файла после отката записей журнала (в обратном порядке) или None, если они не подходят"""
+    restored = bytearray(data)
+    for offset, old in reversed(records):
+        if offset + len(old) > len(restored):
+            return None
+        restored[offset:offset + len(old)] = old
+    return bytes(restored)
+
+
+def journal_matches(data, header, records):
+    """Возвращают ли записи журнала данные data в исходное состояние из заголовка"""
+    restored = restore(data, records)
+    return restored is not None and (len(restored), _digest(restored)) == tuple(header[:2])
+
+
+def _write_journal(journal_path, header, records):
+    atomic_write(journal_path, JOURNAL_HEADER.pack(JOURNAL_MAGIC, *header) + _records_bytes(records),
+                 discard_journal=False)
+
+
+def _read_header(journal_path):
+    """Заголовок журнала текущего формата или None (журнала нет, он старый или повреждён)"""
+    try:
+        with open(journal_path, 'rb') as f:
+            raw = f.read(JOURNAL_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(raw) < JOURNAL_HEADER.size or raw[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+        return None
+    return JOURNAL_HEADER.unpack(raw)[1:]
+
+
+def _append_journal(journal_path, f, mm, records):
+    """
+    Дописывает записи в журнал, начиная новый, если журнала нет или он не подходит к файлу
+    (f и mm — открытый файл и его отображение перед записью)
+    """
+    header = _read_header(journal_path)
+    valid = header is not None and tuple(header[2:]) == _stamp(f)
+    if header is not None and not valid:
+        # Отметка не совпала: прерванная запись откатывается к исходному состоянию, чужие изменения — нет
+        valid = journal_matches(mm, header, read_journal(journal_path)[1])
+    if not valid:
+        _write_journal(journal_path, (len(mm), _digest(mm)) + _stamp(f), records)
+        return
+    with open(journal_path, 'ab') as journal:
+        journal.write(_records_bytes(records))
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def _finish_journal(journal_path, f, mm):
+    """Отмечает в журнале состояние файла после записи; слишком большой журнал сжимается"""
+    stamp = _stamp(f)
+    if os.path.getsize(journal_path) > JOURNAL_HEADER.size + max(len(mm), 4096):
+        header, records = read_journal(journal_path)
+        base = restore(mm, records)
+        compact = [(offset, base[offset:offset + length]) for offset, length in changed_runs(mm, base)]
+        _write_journal(journal_path, header[:2] + stamp, compact)
+        return
+    with open(journal_path, 'r+b') as journal:
+        journal.seek(JOURNAL_STAMP_OFFSET)
+        journal.write(JOURNAL_STAMP.pack(*stamp))
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def apply_patch(path, patches, journal=True):
+    """
+    Применяет изменения [(смещение, новые байты), ...] к файлу на месте.
+
+    Записываются только действительно отличающиеся байты. При journal=True
+    исходные байты сначала сохраняются в журнал отката.
+    Возвращает число записанных байт
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        raise ValueError(f"Файл '{path}' пуст")
+
+    with open(path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as mm:
+        writes = []
+        for offset, data in patches:
+            data = bytes(data)
+            if offset < 0 or offset + len(data) > size:
+                raise ValueError(f"Изменение {offset}..{offset + len(data)} выходит за границы файла ({size} байт)")
+            old = mm[offset:offset + len(data)]
+            for run_offset, run_length in changed_runs(old, data):
+                start = offset + run_offset
+                writes.append((start, old[run_offset:run_offset + run_length],
+                               data[run_offset:run_offset + run_length]))
+
+        if not writes:
+            return 0
+        if journal:
+            _append_journal(path + JOURNAL_SUFFIX, f, mm, [(offset, old) for offset, old, _ in writes])
+        for offset, _, new in writes:
+            mm[offset:offset + len(new)] = new
+        mm.flush()
+        if journal:
+            _finish_journal(path + JOURNAL_SUFFIX, f, mm)
+    return sum(len(new) for _, _, new in writes)
+
+
+def patch_file(path, old_data, new_data, journal=True):
+    """Записывает в файл отличия new_data от old_data (содержимое файла на момент чтения)"""
+    return apply_patch(path, [(offset, new_data[offset:offset + length])
+                              for offset, length in changed_runs(old_data, new_data)], journal)
+
+
+def read_journal(journal_path):
+    """
+    Заголовок журнала (размер и SHA-1 исходного файла, отметка файла после последней записи)
+    и записи [(смещение, исходные байты), ...]; неполная последняя запись отбрасывается
+    """
+    with open(journal_path, 'rb') as f:
+        raw = f.read()
+    if raw[:len(JOURNAL_MAGIC)] in OLD_JOURNAL_MAGICS:
+        raise ValueError(f"'{journal_path}' — журнал старого формата, его нельзя проверить")
+    if raw[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC or len(raw) < JOURNAL_HEADER.size:
+        raise ValueError(f"'{journal_path}' не является журналом отката")
+    header = JOURNAL_HEADER.unpack_from(raw, 0)[1:]
+
+    records = []
+    pos = JOURNAL_HEADER.size
+    while pos + RECORD_HEADER.size <= len(raw):
+        offset, length = RECORD_HEADER.unpack_from(raw, pos)
+        pos += RECORD_HEADER.size
+        if pos + length > len(raw):
+            break  # Запись не дописана — изменение после неё не применялось
+        records.append((offset, raw[pos:pos + length]))
+        pos += length
+    return header, records
+
+
+def undo_patch(path):
+    """
+    Откатывает все изменения из журнала (в обратном порядке) и удаляет журнал.
+    Если откат не возвращает файл в исходное состояние из заголовка журнала
+    (файл заменён или переписан), файл не трогается и выдаётся ValueError.
+    Возвращает число восстановленных участков
+    """
+    journal_path = path + JOURNAL_SUFFIX
+    header, records = read_journal(journal_path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    restored = restore(data, records)
+    if restored is None or (len(restored), _digest(restored)) != tuple(header[:2]):
+        raise ValueError(f"Журнал отката '{journal_path}' не соответствует файлу '{path}' "
+                         f"(файл заменён или переписан целиком), откат отменён")
+    if records:
+        with open(path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as mm:
+            for offset, old in reversed(records):
+                mm[offset:offset + len(old)] = old
+            mm.flush()
+    os.remove(journal_path)
+    return len(records)
+
+
+def _discard_journal(path):
+    """Удаляет журнал отката файла, если он есть"""
+    try:
+        os.remove(path + JOURNAL_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def atomic_write(path, data, discard_journal=True):
+    """
+    Записывает файл целиком через временный файл и переименование.
+    Прежний журнал отката к новому содержимому не относится и удаляется
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if discard_journal:
+        _discard_journal(path)
@@ -0,0 +1,252 @@
+"""
+Пересборка NFTR с подмножеством глифов
+
+В отличие от Font.save(), который правит байты на месте, здесь файл
+собирается заново: из шрифта берутся только глифы для заданных кодов
+символов (и глиф по умолчанию), они нумеруются подряд в порядке кодов,
+после чего пишутся компактные CGLP и CWDH (один блок на все глифы) и CMAP
+с минимальным набором блоков. Смещения секций, указатели FNIF и
+размеры в заголовках пересчитываются.
+
+Раскладка CMAP выбирается динамическим программированием по отсортированным
+парам (код, индекс): каждая пара либо входит в блок direct (подряд идущие
+коды и индексы, 24 байта на блок) или table (плотный диапазон кодов,
+2 байта на код), либо попадает в общий блок scan (4 байта на пару).
+Из равных по размеру раскладок берётся та, где меньше блоков.
+"""
+
+import struct
+from array import array
+from collections import namedtuple
+
+from .cmap import CMAP_DIRECT, CMAP_SCAN, CMAP_TABLE, NO_GLYPH
+from .font import (
+    BOM, CGLP_HEADER_SIZE, CGLP_MAGIC, CMAP_HEADER_SIZE, CMAP_MAGIC, CWDH_MAGIC, FINF_MAGIC, RTFN_MAGIC,
+    SECTION_HEADER_SIZE, Font, NFTRError,
+)
+from .model import FontModel
+
+RTFN_HEADER_SIZE = 16
+# Смещение указателей на данные CGLP, CWDH и CMAP внутри FNIF
+FINF_POINTERS = 16
+
+CMapPlan = namedtuple('CMapPlan', 'type first_code last_code pairs')
+RepackResult = namedtuple('RepackResult', 'data old_indices kept_codes blocks')
+
+
+def _align4(size):
+    return (size + 3) & ~3
+
+
+def _block_size(block_type, count, span):
+    """Размер секции CMAP с выравниванием"""
+    if block_type == CMAP_DIRECT:
+        return _align4(CMAP_HEADER_SIZE + 2)
+    if block_type == CMAP_TABLE:
+        return _align4(CMAP_HEADER_SIZE + 2 * span)
+    return _align4(CMAP_HEADER_SIZE + 2 + 4 * count)
+
+
+def plan_cmap(pairs):
+    """
+    Минимальный по размеру набор блоков CMAP для пар (код, индекс).
+    Возвращает список CMapPlan в порядке кодов, блок scan (если есть) — последним
+    """
+    pairs = sorted(pairs)
+    n = len(pairs)
+    if not n:
+        return []
+    scan_entry = 4
+    scan_header = _block_size(CMAP_SCAN, 0, 0)
+    inf = (float('inf'), 0)
+
+    # best[s][i] — (байты, блоки) для первых i пар; s=1 — блок scan уже начат
+    best = [[inf] * (n + 1), [inf] * (n + 1)]
+    back = [[None] * (n + 1), [None] * (n + 1)]
+    best[0][0] = (0, 0)
+    for i in range(1, n + 1):
+        for s in (0, 1):
+            # Пара i-1 уходит в блок scan
+            if s == 1:
+                options = [(best[1][i - 1], 1), (best[0][i - 1], 0)]
+                for prev, prev_s in options:
+                    extra = scan_entry + (scan_header if prev_s == 0 else 0)
+                    cost = (prev[0] + extra, prev[1] + (prev_s == 0))
+                    if cost < best[1][i]:
+                        best[1][i] = cost
+                        back[1][i] = (i - 1, prev_s, CMAP_SCAN)
+
+            # Пары j..i-1 образуют блок direct или table
+            last_code = pairs[i - 1][0]
+            contiguous = True
+            for j in range(i - 1, -1, -1):
+                if j < i - 1:
+                    contiguous = contiguous and pairs[j][0] + 1 == pairs[j + 1][0] and \
+                        pairs[j][1] + 1 == pairs[j + 1][1]
+                span = last_code - pairs[j][0] + 1
+                table_size = _block_size(CMAP_TABLE, i - j, span)
+                if not contiguous and table_size >= best[s][i][0]:
+                    break  # Дальше таблица только длиннее
+                prev = best[s][j]
+                if prev[0] == float('inf'):
+                    continue
+                for block_type, size in ((CMAP_DIRECT, _block_size(CMAP_DIRECT, 0, 0)), (CMAP_TABLE, table_size)):
+                    if block_type == CMAP_DIRECT and not contiguous:
+                        continue
+                    cost = (prev[0] + size, prev[1] + 1)
+                    if cost < best[s][i]:
+                        best[s][i] = cost
+                        back[s][i] = (j, s, block_type)
+
+    # Восстановление раскладки
+    s = 0 if best[0][n] <= best[1][n] else 1
+    i = n
+    blocks, scan = [], []
+    while i > 0:
+        j, prev_s, block_type = back[s][i]
+        if block_type == CMAP_SCAN:
+            scan.append(pairs[j])
+        else:
+            segment = pairs[j:i]
+            blocks.append(CMapPlan(block_type, segment[0][0], segment[-1][0], segment))
+        i, s = j, prev_s
+    blocks.reverse()
+    if scan:
+        scan.reverse()
+        blocks.append(CMapPlan(CMAP_SCAN, scan[0][0], scan[-1][0], scan))
+    return blocks
+
+
+def cmap_size(blocks):
+    """Общий размер секций CMAP для раскладки plan_cmap()"""
+    return sum(_block_size(b.type, len(b.pairs), b.last_code - b.first_code + 1) for b in blocks)
+
+
+# --- Запись секций ---
+
+def _section(magic, body):
+    """Секция: сигнатура, размер с выравниванием, тело с нулевым дополнением"""
+    size = _align4(SECTION_HEADER_SIZE + len(body))
+    return magic + struct.pack('<I', size) + body + b'\x00' * (size - SECTION_HEADER_SIZE - len(body))
+
+
+def _cmap_body(block, next_pointer):
+    header = struct.pack('<HHHHI', block.first_code, block.last_code, block.type, 0, next_pointer)
+    if block.type == CMAP_DIRECT:
+        return header + struct.pack('<H', block.pairs[0][1])
+    if block.type == CMAP_TABLE:
+        table = [NO_GLYPH] * (block.last_code - block.first_code + 1)
+        for code, index in block.pairs:
+            table[code - block.first_code] = index
+        return header + struct.pack(f'<{len(table)}H', *table)
+    flat = [value for pair in block.pairs for value in pair]
+    return header + struct.pack(f'<H{len(flat)}H', len(block.pairs), *flat)
+
+
+def build_nftr(font, model, blocks, default_index):
+    """
+    Собирает файл NFTR из модели глифов и раскладки CMAP.
+    FNIF и заголовок CGLP берутся из исходного шрифта, указатели и размеры пересчитываются
+    """
+    finf = next(s for s in font.sections if s.magic == FINF_MAGIC)
+    cglp = next(s for s in font.sections if s.magic == CGLP_MAGIC)
+
+    cglp_body = bytes(cglp.data[SECTION_HEADER_SIZE:CGLP_HEADER_SIZE]) + bytes(model.bitmaps)
+    widths = model.widths()
+    cwdh_body = struct.pack('<HHI', 0, max(len(model) - 1, 0), 0) + widths.tobytes()
+
+    finf_offset = RTFN_HEADER_SIZE
+    cglp_offset = finf_offset + finf.size
+    cwdh_offset = cglp_offset + _align4(SECTION_HEADER_SIZE + len(cglp_body))
+    cmap_offset = cwdh_offset + _align4(SECTION_HEADER_SIZE + len(cwdh_body))
+
+    # Указатели в NFTR ссылают на данные секции (после сигнатуры и размера)
+    cmap_sections = []
+    offset = cmap_offset
+    for i, block in enumerate(blocks):
+        size = _block_size(block.type, len(block.pairs), block.last_code - block.first_code + 1)
+        next_pointer = offset + size + SECTION_HEADER_SIZE if i + 1 < len(blocks) else 0
+        cmap_sections.append(_section(CMAP_MAGIC, _cmap_body(block, next_pointer)))
+        offset += size
+
+    finf_data = bytearray(finf.data)
+    struct.pack_into('<H', finf_data, SECTION_HEADER_SIZE + 2, default_index)
+    struct.pack_into('<III', finf_data, FINF_POINTERS, cglp_offset + SECTION_HEADER_SIZE,
+                     cwdh_offset + SECTION_HEADER_SIZE, cmap_offset + SECTION_HEADER_SIZE if blocks else 0)
+
+    sections = [bytes(finf_data), _section(CGLP_MAGIC, cglp_body), _section(CWDH_MAGIC, cwdh_body)] + cmap_sections
+    body = b''.join(sections)
+    header = RTFN_MAGIC + struct.pack('<HHIHH', BOM, font.version, RTFN_HEADER_SIZE + len(body),
+                                      RTFN_HEADER_SIZE, len(sections))
+    return header + body
+
+
+# --- Подмножество ---
+
+def subset_font(font, codes):
+    """
+    Пересобирает шрифт, оставляя только глифы для кодов codes и глиф по умолчанию.
+    Коды без глифа в шрифте пропускаются. Возвращает RepackResult:
+    data — байты нового NFTR, old_indices — прежний индекс каждого нового глифа,
+    kept_codes — сохранённые коды, blocks — раскладка CMAP
+    """
+    pairs = sorted((code, font.index_of(code)) for code in set(codes) if font.index_of(code) is not None)
+    kept_codes = [code for code, _ in pairs]
+
+    # Глифы нумеруются в порядке своего первого кода, тогда подряд идущие коды
+    # получают подряд идущие индексы и укладываются в блоки direct
+    old_indices = []
+    seen = set()
+    for _, index in pairs:
+        if index not in seen:
+            seen.add(index)
+            old_indices.append(index)
+    if font.default_index not in seen and 0 <= font.default_index < font.num_glyphs:
+        old_indices.append(font.default_index)
+    if not old_indices:
+        raise NFTRError("Нет ни одного глифа для нового шрифта")
+    new_index = {old: new for new, old in enumerate(old_indices)}
+
+    source = FontModel.from_font(font)
+    size = source.cell_size
+    cells = source.cells()[old_indices]
+    widths = source.widths()[old_indices]
+    codes_array = array('H', [NO_GLYPH]) * len(old_indices)
+    for code, index in pairs:
+        if codes_array[new_index[index]] == NO_GLYPH:
+            codes_array[new_index[index]] = code
+    model = FontModel(source.cell_width, source.cell_height, size, source.bpp, bytearray(cells.tobytes()),
+                      array('b', widths['left'].tobytes()), array('B', widths['glyph_width'].tobytes()),
+                      array('B', widths['advance'].tobytes()), codes_array, source.encoding)
+
+    blocks = plan_cmap([(code, new_index[index]) for code, index in pairs])
+    default_index = new_index.get(font.default_index, 0)
+    return RepackResult(build_nftr(font, model, blocks, default_index), old_indices, kept_codes, blocks)
+
+
+def verify_subset(font, result):
+    """
+    Проверяет пересобранный шрифт: каждый сохранённый код указывает на глиф с тем же
+    битмапом и шириной, лишних кодов нет, глиф по умолчанию совпадает.
+    Возвращает разобранный новый Font, при расхождении — NFTRError
+    """
+    packed = Font(result.data)
+    if packed.num_glyphs != len(result.old_indices):
+        raise NFTRError(f"В новом шрифте {packed.num_glyphs} глифов, ожидалось {len(result.old_indices)}")
+
+    errors = []
+    for code in result.kept_codes:
+        old, new = font.index_of(code), packed.index_of(code)
+        if new is None:
+            errors.append(f"код 0x{code:04X}: нет в CMAP")
+        elif bytes(packed.glyph(new)) != bytes(font.glyph(old)):
+            errors.append(f"код 0x{code:04X}: битмап глифа {new} не совпадает с исходным {old}")
+        elif tuple(packed.width(new)) != tuple(font.width(old)):
+            errors.append(f"код 0x{code:04X}: ширина {tuple(packed.width(new))} вместо {tuple(font.width(old))}")
+    if len(packed.charmap) != len(result.kept_codes):
+        errors.append(f"в CMAP {len(packed.charmap)} кодов, ожидалось {len(result.kept_codes)}")
+    if bytes(packed.glyph(packed.default_index)) != bytes(font.glyph(font.default_index)):
+        errors.append("глиф по умолчанию не совпадает с исходным")
+    if errors:
+        raise NFTRError("Проверка пересборки не пройдена: " + "; ".join(errors[:10]))
+    return packed
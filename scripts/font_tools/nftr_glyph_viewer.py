@@ -1,102 +1,160 @@
 import sys
 import os
 
-# --- Финальные параметры ---
+from nftr import NFTRError, load_font
+from nftr.codec import decode_cells
 
-CMAP_OFFSET = 15664
-WIDTH_TABLE_OFFSET = 16746
-CGLP_OFFSET = 59
-
-NUM_GLYPHS = 541
-BYTES_PER_GLYPH_BITMAP = 25
-CELL_WIDTH = 13
-CELL_HEIGHT = 15
 PIXEL_ON = "██"
 PIXEL_OFF = "  "
+CACHE_DIR = os.path.join(".cache", "nftr")
 
-def draw_bitmap(glyph_data):
-    """Сначала столбцы 8–12 из строки y, затем 0–7 из строки y+1 (или пусто, если вышли за пределы)."""
-    if len(glyph_data) < BYTES_PER_GLYPH_BITMAP:
+def resolve_glyph_index(font, value):
+    """Индекс глифа по строке: десятичный индекс, код 0xXXXX или одиночный символ"""
+    if value.isdigit():
+        return int(value)
+    if value.lower().startswith("0x"):
+        try:
+            return font.index_of(int(value, 16))
+        except ValueError:
+            return None
+    if len(value) == 1:
+        try:
+            raw = value.encode(font.encoding)
+        except (UnicodeEncodeError, LookupError):
+            return None
+        return font.index_of(int.from_bytes(raw, 'big'))
+    return None
+
+def draw_bitmap(glyph_data, cell_width, cell_height, bpp=1):
+    """Пиксели идут подряд слева направо, сверху вниз, без выравнивания строк."""
+    if len(glyph_data) * 8 < cell_width * cell_height * bpp:
         print("Ошибка: недостаточно данных для отрисовки битмапа.")
         return
 
-    pixels = []
-    for byte in glyph_data:
-        for i in range(7, -1, -1):
-            bit = (byte >> i) & 1
-            pixels.append(bit)
-
-    is_empty = all(p == 0 for p in pixels[:CELL_WIDTH * CELL_HEIGHT])
-    print(f"\nБитмап символа (13x15): {'(ПУСТОЙ)' if is_empty else ''}")
-    print("+" + "-" * (CELL_WIDTH * 2) + "+")
-
-    for y in range(CELL_HEIGHT):
-        print("|", end="")
-        # Столбцы 8–12 из строки y
-        for x in range(8, 13):
-            idx = y * CELL_WIDTH + x
-            if idx < len(pixels):
-                print(PIXEL_ON if pixels[idx] else PIXEL_OFF, end="")
-        # Столбцы 0–7 из строки y+1
-        if y < CELL_HEIGHT - 1:
-            for x in range(0, 8):
-                idx = (y + 1) * CELL_WIDTH + x
-                if idx < len(pixels):
-                    print(PIXEL_ON if pixels[idx] else PIXEL_OFF, end="")
-        else:
-            print(PIXEL_OFF * 8, end="")
-        print("|")
-    print("+" + "-" * (CELL_WIDTH * 2) + "+")
+    pixels = decode_cells(glyph_data, cell_width, cell_height, bpp)[0]
+
+    is_empty = not pixels.any()
+    print(f"\nБитмап символа ({cell_width}x{cell_height}): {'(ПУСТОЙ)' if is_empty else ''}")
+    print("+" + "-" * (cell_width * 2) + "+")
+
+    for row in pixels:
+        print("|" + "".join(PIXEL_ON if p else PIXEL_OFF for p in row) + "|")
+    print("+" + "-" * (cell_width * 2) + "+")
+
+def export_atlas(font_file, output, columns=16, scale=3, labels=False, widths=False, diff_file=None):
+    """Выгружает все глифы шрифта в PNG-атлас; с diff_file подсвечивает отличия"""
+    from nftr.atlas import changed_glyphs, render_atlas, save_atlas
+
+    font = load_font(font_file, cache_dir=CACHE_DIR)
+    changed = None
+    if diff_file is not None:
+        other = load_font(diff_file, cache_dir=CACHE_DIR)
+        changed = changed_glyphs(font, other)[:font.num_glyphs]
+        indices = [int(i) for i in changed.nonzero()[0]]
+        print(f"Отличающихся глифов: {len(indices)} (сравнение с {diff_file})")
+        if indices:
+            print("Индексы: " + ", ".join(str(i) for i in indices))
+        if other.num_glyphs != font.num_glyphs:
+            print(f"⚠️  Разное число глифов: {font.num_glyphs} и {other.num_glyphs}")
+
+    image, layout = render_atlas(font, columns, scale, labels, widths, changed)
+    save_atlas(image, layout, output)
+    print(f"Атлас {font.num_glyphs} глифов ({layout.columns}x{layout.rows}) сохранён в {output}")
+
+def atlas_main(args):
+    """Разбор параметров режима атласа"""
+    font_file = args[0]
+    options = {}
+    output = None
+    rest = iter(args[1:])
+    for arg in rest:
+        if arg == '--atlas':
+            output = next(rest, None)
+        elif arg == '--labels':
+            options['labels'] = True
+        elif arg == '--widths':
+            options['widths'] = True
+        elif arg == '--diff':
+            options['diff_file'] = next(rest, None)
+        elif arg in ('--columns', '--scale'):
+            value = next(rest, '')
+            if not value.isdigit() or int(value) == 0:
+                print(f"Ошибка: Параметр {arg} требует положительное целое число.")
+                sys.exit(1)
+            options[arg[2:]] = int(value)
+    if output is None or ('diff_file' in options and options['diff_file'] is None):
+        print("Ошибка: не указан файл для --atlas или --diff.")
+        sys.exit(1)
+
+    for path in (font_file, options.get('diff_file')):
+        if path is not None and not os.path.exists(path):
+            print(f"Ошибка: Файл '{path}' не найден.")
+            sys.exit(1)
+    try:
+        export_atlas(font_file, output, **options)
+    except NFTRError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
 
 def main():
+    if len(sys.argv) >= 3 and '--atlas' in sys.argv[2:]:
+        atlas_main(sys.argv[1:])
+        return
+
     if len(sys.argv) != 3:
-        print(f"Использование: python {sys.argv[0]} <файл.nftr> <индекс_глифа>")
+        print(f"Использование: python {sys.argv[0]} <файл.nftr> <индекс_глифа | 0xКОД | символ>")
+        print(f"               python {sys.argv[0]} <файл.nftr> --atlas <атлас.png> [--labels] [--widths]")
+        print(f"                      [--scale N] [--columns N] [--diff <другой.nftr>]")
         sys.exit(1)
 
     font_file, glyph_index_str = sys.argv[1], sys.argv[2]
 
-    try:
-        glyph_index = int(glyph_index_str)
-    except ValueError:
-        print(f"Ошибка: Индекс '{glyph_index_str}' не является целым числом.")
-        sys.exit(1)
-
     if not os.path.exists(font_file):
         print(f"Ошибка: Файл '{font_file}' не найден.")
         sys.exit(1)
 
-    if not (0 <= glyph_index < NUM_GLYPHS):
-        print(f"Ошибка: Индекс должен быть в диапазоне от 0 до {NUM_GLYPHS - 1}.")
+    try:
+        font = load_font(font_file, cache_dir=CACHE_DIR)
+    except NFTRError as e:
+        print(f"Ошибка: {e}")
         sys.exit(1)
 
-    with open(font_file, 'rb') as f:
-        data = f.read()
+    # Глиф можно указать индексом, кодом символа (0x82a0) или самим символом
+    glyph_index = resolve_glyph_index(font, glyph_index_str)
+    if glyph_index is None:
+        print(f"Ошибка: '{glyph_index_str}' не является индексом и не найден в CMAP шрифта.")
+        sys.exit(1)
 
-    sjis_code_addr = CMAP_OFFSET + (glyph_index * 2)
-    width_addr = WIDTH_TABLE_OFFSET + (glyph_index * 1)
-    bitmap_addr = CGLP_OFFSET + (glyph_index * BYTES_PER_GLYPH_BITMAP)
+    if not (0 <= glyph_index < font.num_glyphs):
+        print(f"Ошибка: Индекс должен быть в диапазоне от 0 до {font.num_glyphs - 1}.")
+        sys.exit(1)
 
-    sjis_code = int.from_bytes(data[sjis_code_addr:sjis_code_addr+2], 'little')
-    width = data[width_addr]
-    bitmap_data = data[bitmap_addr : bitmap_addr + BYTES_PER_GLYPH_BITMAP]
+    sjis_code = font.code_of(glyph_index)
+    left, glyph_width, advance = font.width(glyph_index)
+    width_addr = font.width_offset(glyph_index)
+    bitmap_addr = font.glyph_offset(glyph_index)
+    bitmap_data = font.glyph(glyph_index)
 
     print(f"\n--- Полный анализ глифа с индексом {glyph_index} ---")
 
-    char_repr = f"(код: 0x{sjis_code:X})"
-    if sjis_code != 0:
-        try:
-            if 0x20 <= sjis_code <= 0x7E:
-                char_repr = f"'{chr(sjis_code)}' (код ASCII: 0x{sjis_code:X})"
-            else:
-                char_repr = f"'{sjis_code.to_bytes(2, 'big').decode('shift_jis')}' (код SJIS: 0x{sjis_code:X})"
-        except (UnicodeDecodeError, OverflowError):
+    if sjis_code is None:
+        char_repr = "(нет в CMAP)"
+    else:
+        char = font.char_of(sjis_code)
+        if char is None:
             char_repr = f"(неизвестный код: 0x{sjis_code:X})"
+        elif sjis_code <= 0xFF:
+            char_repr = f"'{char}' (код ASCII: 0x{sjis_code:X})"
+        else:
+            char_repr = f"'{char}' (код SJIS: 0x{sjis_code:X})"
+    width_repr = f"{glyph_width} пикселей (отступ {left}, шаг {advance})"
+    width_addr_repr = f"{width_addr} (0x{width_addr:X})" if width_addr is not None else "нет (ширина по умолчанию)"
 
-    print(f"Код символа: {char_repr.ljust(30)} | Смещение в файле: {sjis_code_addr} (0x{sjis_code_addr:X})")
-    print(f"Ширина глифа: {width} пикселей{''.ljust(23)} | Смещение в файле: {width_addr} (0x{width_addr:X})")
+    print(f"Код символа: {char_repr.ljust(30)} | Блоков CMAP: {len(font.cmap_blocks)}")
+    print(f"Ширина глифа: {width_repr.ljust(29)} | Смещение в файле: {width_addr_repr}")
     print(f"Данные битмапа: {len(bitmap_data)} байт{''.ljust(26)}| Смещение в файле: {bitmap_addr} (0x{bitmap_addr:X})")
 
-    draw_bitmap(bitmap_data)
+    draw_bitmap(bitmap_data, font.cell_width, font.cell_height, font.bpp)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Скрипт для отката изменений NFTR файла по журналу <файл>.undo
+"""
+
+import sys
+import os
+
+from nftr.patch import JOURNAL_SUFFIX, undo_patch
+
+def main():
+    if len(sys.argv) != 2:
+        print(f"Использование: python {sys.argv[0]} <файл.nftr>")
+        sys.exit(1)
+
+    nftr_file = sys.argv[1]
+    journal_file = nftr_file + JOURNAL_SUFFIX
+    if not os.path.exists(journal_file):
+        print(f"ОШИБКА: Журнал отката '{journal_file}' не найден.")
+        sys.exit(1)
+
+    try:
+        restored = undo_patch(nftr_file)
+    except (OSError, ValueError) as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+    print(f"✓ Восстановлено участков: {restored}")
+    print(f"Файл {nftr_file} возвращён в состояние до первой записи")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Таймеры этапов и счётчики для профилирования скриптов
+
+Profiler накапливает время и число входов по этапам (with profiler.stage(...))
+и произвольные счётчики, а затем сохраняет отчёт в JSON. Когда
+профилирование выключено, используется NULL_PROFILER: его методы ничего
+не делают, а stage() возвращает один и тот же пустой контекст, так что
+инструментированный код почти не замедляется.
+
+Для детального разбора по функциям есть run_traced(): запуск под cProfile
+с сохранением статистики в файл (открывается pstats или snakeviz).
+"""
+
+import cProfile
+import json
+import platform
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+_NULL_STAGE = nullcontext()
+
+
+class Profiler:
+    """Время этапов (суммарное и число входов) и счётчики"""
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            total, calls = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + time.perf_counter() - started, calls + 1)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        """Отчёт: этапы по убыванию времени, счётчики и общее время"""
+        total = time.perf_counter() - self.started
+        stages = sorted(self.stages.items(), key=lambda item: item[1][0], reverse=True)
+        return {
+            'total_seconds': total,
+            'stages': {name: {'seconds': seconds, 'calls': calls,
+                              'share': seconds / total if total else 0.0}
+                       for name, (seconds, calls) in stages},
+            'counters': dict(self.counters),
+            'python': platform.python_version(),
+            'argv': sys.argv,
+        }
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+
+    def print_summary(self):
+        report = self.report()
+        print(f"⏱ Профиль: всего {report['total_seconds'] * 1e3:.1f} мс")
+        for name, stage in report['stages'].items():
+            print(f"  {name:<14} {stage['seconds'] * 1e3:>9.2f} мс  {stage['share']:>6.1%}  ×{stage['calls']}")
+        for name, value in report['counters'].items():
+            print(f"  {name:<14} {value}")
+
+
+class NullProfiler:
+    """Заглушка с тем же интерфейсом; используется, когда профилирование выключено"""
+
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def count(self, name, value=1):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def run_traced(path, func, *args, **kwargs):
+    """Выполняет func под cProfile и сохраняет статистику в path. Возвращает результат func"""
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(func, *args, **kwargs)
+    finally:
+        profile.dump_stats(path)
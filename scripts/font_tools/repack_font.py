@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Пересборка NFTR шрифта только с нужными глифами
+
+Набор кодов, которые должны остаться, собирается из:
+  * файлов перевода — символы кодируются той же таблицей замен, что и в
+    text_encoder.py (с --mapping — таблицей, с которой собран шрифт);
+  * --chars — строки символов, кодируемых так же;
+  * --rom — ресурсов образа с оставшимся японским текстом (разбор
+    Shift-JIS из glyph_usage.py).
+
+Остальные глифы удаляются, CGLP, CWDH и CMAP собираются заново
+(nftr.repack), и каждый сохранённый глиф сверяется с исходным шрифтом
+по битмапу и ширине.
+
+Индексы глифов в новом шрифте другие, поэтому рядом с ним сохраняется
+таблица соответствия <выход>.mapping.json с новыми индексами — её нужно
+передавать в text_encoder.py и text_fit.py через --mapping.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+from batch_insert_cyrillic import CYRILLIC_MAPPING, load_mapping
+from glyph_usage import MIN_RUN, count_translation, scan_resources
+from nftr import NFTRError, load_font
+from nftr.cmap import CMAP_DIRECT, CMAP_SCAN, CMAP_TABLE
+from nftr.patch import atomic_write
+from nftr.repack import subset_font, verify_subset
+from text_encoder import TextEncoder, bytes_to_codes, print_missing_report
+
+BLOCK_NAMES = {CMAP_DIRECT: 'direct', CMAP_TABLE: 'table', CMAP_SCAN: 'scan'}
+
+
+def codes_for_chars(encoder, counts):
+    """
+    Коды шрифта, которыми рисуются символы counts ({символ: число вхождений}).
+    Символы без собственного глифа, в том числе со слотом Shift-JIS, отданным под
+    русскую букву, попадают в encoder.missing с числом вхождений
+    """
+    codes = set()
+    for char, count in counts.items():
+        codes.update(bytes_to_codes(encoder.encode_char(char)))
+        if char in encoder.missing:
+            encoder.missing[char] = count
+    return codes
+
+
+def collect_codes(font, translations=(), chars='', rom_paths=(), mapping=CYRILLIC_MAPPING, min_run=MIN_RUN):
+    """Коды, которые должны остаться в шрифте. Возвращает (коды, кодировщик)"""
+    encoder = TextEncoder(font, mapping)
+    counts = count_translation(translations)
+    counts.update(set(chars) - set(counts))
+    codes = codes_for_chars(encoder, counts)
+    if rom_paths:
+        rom_counts, _ = scan_resources(font, rom_paths, min_run)
+        codes.update(int(code) for code in np.flatnonzero(rom_counts))
+    return {code for code in codes if font.index_of(code) is not None}, encoder
+
+
+def remap(mapping, old_indices):
+    """Таблица соответствия [(индекс, символ)] с индексами нового шрифта (удалённые глифы выпадают)"""
+    new_index = {old: new for new, old in enumerate(old_indices)}
+    return [(new_index[idx], char) for idx, char in mapping if idx in new_index]
+
+
+def print_summary(font, result, packed):
+    print(f"Глифов: {font.num_glyphs} → {packed.num_glyphs}, кодов: {len(font.charmap)} → {len(result.kept_codes)}")
+    print(f"Размер: {len(font.data)} → {len(result.data)} байт ({len(result.data) / len(font.data):.0%})")
+    blocks = ', '.join(f"{BLOCK_NAMES[b.type]} 0x{b.first_code:04X}-0x{b.last_code:04X} ({len(b.pairs)})"
+                       for b in result.blocks)
+    print(f"Блоки CMAP: {blocks or 'нет'}")
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(f"Использование: python {sys.argv[0]} <шрифт.nftr> <выход.nftr> [перевод.txt ...] [--chars S] "
+              f"[--rom каталог]... [--mapping F.json] [--min-run N]")
+        print(f"")
+        print(f"Пример: python {sys.argv[0]} data/tumefont.fsize-12.nftr build/tumefont.nftr translation/*.txt "
+              f"--rom data/full_extracted/data")
+        print(f"")
+        print(f"Параметры:")
+        print(f"  --chars S       Символы, которые нужно сохранить дополнительно")
+        print(f"  --rom PATH      Каталог или файл ресурсов с оставшимся японским текстом (можно несколько)")
+        print(f"  --mapping F     Таблица соответствия, с которой собран шрифт (по умолчанию CYRILLIC_MAPPING)")
+        print(f"  --min-run N     Минимальная длина цепочки символов в ресурсах (по умолчанию {MIN_RUN})")
+        sys.exit(1)
+
+    font_file, output_file = sys.argv[1], sys.argv[2]
+    translations = []
+    rom_paths = []
+    chars = ''
+    mapping_file = None
+    min_run = MIN_RUN
+    args = iter(sys.argv[3:])
+    for arg in args:
+        if arg == '--chars':
+            chars += next(args, '')
+        elif arg == '--rom':
+            rom_paths.append(next(args, ''))
+        elif arg == '--mapping':
+            mapping_file = next(args, None)
+        elif arg == '--min-run':
+            try:
+                min_run = int(next(args, ''))
+            except ValueError:
+                print("ОШИБКА: Параметр --min-run требует целое число.")
+                sys.exit(1)
+        else:
+            translations.append(arg)
+
+    for path in [font_file, mapping_file] + translations + rom_paths:
+        if path is not None and not os.path.exists(path):
+            print(f"ОШИБКА: '{path}' не найден.")
+            sys.exit(1)
+
+    try:
+        font = load_font(font_file)
+        mapping = load_mapping(mapping_file) if mapping_file else CYRILLIC_MAPPING
+        codes, encoder = collect_codes(font, translations, chars, rom_paths, mapping, min_run)
+        if not codes:
+            print("ОШИБКА: Не задано ни одного символа, который нужно сохранить.")
+            sys.exit(1)
+        result = subset_font(font, codes)
+        packed = verify_subset(font, result)
+    except (NFTRError, ValueError) as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    atomic_write(output_file, result.data)
+    print_summary(font, result, packed)
+    print(f"✓ Все {len(result.kept_codes)} кодов проверены, шрифт сохранён в {output_file}")
+
+    mapping_output = os.path.splitext(output_file)[0] + '.mapping.json'
+    with open(mapping_output, 'w', encoding='utf-8') as f:
+        json.dump({'font': output_file, 'mapping': remap(mapping, result.old_indices)}, f, indent=2, ensure_ascii=False)
+    print(f"✓ Таблица соответствия для нового шрифта: {mapping_output}")
+    print_missing_report(encoder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Перебор параметров рендера кириллицы: размеры TTF, смещения и порог
+
+Каждый символ таблицы соответствия рисуется для всех размеров из сетки
+(в пуле процессов, по заданию на размер), все смещения x / y и пороги
+оцениваются векторно на NumPy. Для каждой комбинации
+(size_upper, size_lower, x_pos, y_offset, threshold) считаются метрики:
+  * clipped  — закрашенные пиксели, обрезанные границей ячейки (13x15);
+  * empty    — символы без единого пикселя;
+  * baseline — символы без нижнего выносного элемента, нижняя строка
+    которых не совпадает с общей базовой линией (заглавные и строчные вместе);
+  * shift    — расстояние от общей базовой линии до базовой линии шрифта игры
+    (поле baseline секции CGLP: японские глифы стоят на строке 12);
+  * error    — средняя ошибка бинаризации: насколько битмап после порога
+    отличается от полутонового рендера (пропавшие и слипшиеся штрихи);
+  * fill     — средняя доля высоты ячейки, занятая символом (крупнее — читаемее).
+Оценка — взвешенная сумма (SCORE_WEIGHTS), чем меньше, тем лучше.
+
+Результат — JSON с лучшей конфигурацией (поля как в задании
+batch_build_fonts.py / watch_font.py) и списком следующих за ней, а также
+атлас сравнения: по строке на конфигурацию (первая — текущие параметры
+по умолчанию), красная линия — базовая линия строки.
+"""
+
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from batch_insert_cyrillic import (
+    BITMAP_HEIGHT, BITMAP_WIDTH, CYRILLIC_MAPPING, FONT_PATH, FONT_SIZE_LOWER, FONT_SIZE_UPPER, load_mapping,
+)
+from glyph_render import THRESHOLD, X_POS, Y_OFFSET, draw_char, render_char
+from nftr import NFTRError, load_font
+from nftr.atlas import COLOR_ADVANCE, COLOR_GRID, COLOR_LABEL, COLOR_OFF, COLOR_ON, COLOR_TEXT
+
+# --- Сетка перебора по умолчанию ---
+SIZES = list(range(6, 15))
+X_POSITIONS = [0, 1]
+Y_OFFSETS = list(range(-2, 5))
+THRESHOLDS = [64, 96, 128, 160, 192]
+
+# Символы с нижним выносным элементом не участвуют в оценке базовой линии
+DESCENDERS = set("ДЦЩдруфцщ")
+BASELINE = 12   # Нижняя строка японских глифов tumefont (CGLP baseline)
+
+SCORE_WEIGHTS = {
+    'clipped': 10.0,    # за каждый обрезанный пиксель
+    'empty': 1000.0,    # за каждый пустой символ
+    'baseline': 5.0,    # за каждый символ вне базовой линии
+    'shift': 5.0,       # за каждую строку между базовой линией и BASELINE
+    'error': 100.0,     # за среднюю ошибку бинаризации на пиксель (0..1)
+    'fill': -30.0,      # за среднюю заполненность высоты ячейки (0..1)
+}
+
+TOP_CONFIGS = 8
+ATLAS_SCALE = 3
+LABEL_WIDTH = 200
+DEFAULT_OUTPUT = "sweep_best.json"
+
+
+# --- Метрики одного размера (выполняется в процессе пула) ---
+
+def measure_chunk(task):
+    """
+    Метрики всех символов одного размера TTF для всех x / y / порогов.
+    Возвращает {символ: {метрика: массив (X, Y, T)}}
+    """
+    ttf, size, chars, width, height, xs, ys, thresholds = task
+    thresholds = np.asarray(thresholds, dtype=np.int16)[:, None, None, None, None]
+    pad = max(abs(x) for x in xs) + size
+    results = {}
+    for char in chars:
+        # Полный рендер с запасом по краям — сколько пикселей было бы без обрезки
+        full = draw_char(char, ttf, size, width + 2 * pad, height + 2 * pad, pad, 0)
+        total = (full[None] < thresholds[:, 0, 0]).sum(axis=(1, 2))
+
+        # Точный рендер ячейки для каждого y (дробная часть позиции зависит от знака),
+        # смещения по x — окна в строке с запасом по горизонтали
+        rows = np.stack([draw_char(char, ttf, size, width + 2 * pad, height, pad, y) for y in ys])
+        cells = np.stack([rows[:, :, pad - x:pad - x + width] for x in xs])       # (X, Y, h, w)
+        ink = cells[None] < thresholds                                              # (T, X, Y, h, w)
+        darkness = (255 - cells[None].astype(np.float32)) / 255
+
+        count = ink.sum(axis=(3, 4))
+        rows_any = ink.any(axis=4)
+        top = np.where(count > 0, rows_any.argmax(axis=3), -1)
+        bottom = np.where(count > 0, height - 1 - rows_any[..., ::-1].argmax(axis=3), -1)
+        error = np.abs(ink - darkness).mean(axis=(3, 4))
+        clipped = np.maximum(total[:, None, None] - count, 0)
+
+        # Оси (T, X, Y) → (X, Y, T)
+        results[char] = {name: np.moveaxis(value, 0, -1) for name, value in (
+            ('count', count), ('top', top), ('bottom', bottom), ('error', error), ('clipped', clipped))}
+    return size, results
+
+
+def measure_all(ttf, chars, sizes, xs, ys, thresholds, width, height, workers=None):
+    """Метрики {размер: {символ: метрики}} в пуле процессов"""
+    tasks = [(ttf, size, chars, width, height, xs, ys, thresholds) for size in sizes]
+    if workers == 1 or len(tasks) < 2:
+        return dict(measure_chunk(task) for task in tasks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(measure_chunk, tasks))
+
+
+# --- Оценка конфигураций ---
+
+def score_pair(upper, lower, height, target=BASELINE, weights=SCORE_WEIGHTS):
+    """
+    Метрики и оценка для пары размеров: upper / lower — метрики заглавных
+    и строчных символов {символ: {метрика: (X, Y, T)}}. Возвращает словарь массивов (X, Y, T)
+    """
+    metrics = list(upper.values()) + list(lower.values())
+    chars = list(upper) + list(lower)
+    stack = {name: np.stack([m[name] for m in metrics]) for name in metrics[0]}   # (N, X, Y, T)
+
+    count = stack['count']
+    clipped = stack['clipped'].sum(axis=0)
+    empty = (count == 0).sum(axis=0)
+
+    regular = np.array([char not in DESCENDERS for char in chars])
+    bottoms = stack['bottom'][regular]
+    if len(bottoms):
+        votes = (bottoms[None] == np.arange(height)[:, None, None, None, None]).sum(axis=1)   # (h, X, Y, T)
+        baseline = votes.argmax(axis=0)
+        misses = len(bottoms) - votes.max(axis=0)
+    else:
+        baseline = np.zeros(clipped.shape, dtype=np.intp)
+        misses = np.zeros(clipped.shape, dtype=np.intp)
+
+    shift = np.abs(baseline - target)
+    heights = np.where(count > 0, stack['bottom'] - stack['top'] + 1, 0)
+    fill = heights.mean(axis=0) / height
+    error = stack['error'].mean(axis=0)
+
+    score = (weights['clipped'] * clipped + weights['empty'] * empty + weights['baseline'] * misses
+             + weights['shift'] * shift + weights['error'] * error + weights['fill'] * fill)
+    return {'score': score, 'clipped': clipped, 'empty': empty, 'baseline_misses': misses,
+            'baseline': baseline, 'shift': shift, 'error': error, 'fill': fill}
+
+
+def sweep(measured, upper_chars, lower_chars, xs, ys, thresholds, height, target=BASELINE, weights=SCORE_WEIGHTS):
+    """
+    Оценивает все конфигурации. Возвращает список словарей, отсортированный по оценке
+    """
+    configs = []
+    sizes = sorted(measured)
+    for size_upper, size_lower in itertools.product(sizes, sizes):
+        upper = {char: measured[size_upper][char] for char in upper_chars}
+        lower = {char: measured[size_lower][char] for char in lower_chars}
+        if not upper and not lower:
+            continue
+        result = score_pair(upper, lower, height, target, weights)
+        for (xi, yi, ti), score in np.ndenumerate(result['score']):
+            configs.append({
+                'size_upper': size_upper, 'size_lower': size_lower,
+                'x_pos': xs[xi], 'y_offset': ys[yi], 'threshold': thresholds[ti],
+                'score': round(float(score), 3),
+                'metrics': {name: round(float(result[name][xi, yi, ti]), 4) for name in
+                            ('clipped', 'empty', 'baseline_misses', 'baseline', 'shift', 'error', 'fill')},
+            })
+    # При равной оценке — ближе к текущим параметрам
+    configs.sort(key=lambda c: (c['score'], abs(c['y_offset'] - Y_OFFSET), abs(c['x_pos'] - X_POS),
+                                abs(c['threshold'] - THRESHOLD)))
+    return configs
+
+
+# --- Атлас сравнения ---
+
+def render_config(config, chars, ttf, width, height):
+    """Битмапы символов конфигурации (N, height, width) — тем же render_char, что и при вставке"""
+    return np.stack([render_char(char, ttf, config['size_upper'] if char.isupper() else config['size_lower'],
+                                 width, height, config['x_pos'], config['y_offset'], config['threshold'])[0]
+                     for char in chars])
+
+
+def save_comparison_atlas(configs, chars, ttf, width, height, path, scale=ATLAS_SCALE):
+    """PNG: по строке на конфигурацию, слева подпись с параметрами и оценкой"""
+    block_w, block_h = width * scale + 1, height * scale + 1
+    canvas = np.empty((len(configs) * block_h + 1, LABEL_WIDTH + len(chars) * block_w + 1, 3), dtype=np.uint8)
+    canvas[:] = COLOR_GRID
+    on, off = np.array(COLOR_ON, np.uint8), np.array(COLOR_OFF, np.uint8)
+    for row, config in enumerate(configs):
+        y0 = row * block_h + 1
+        canvas[y0:y0 + height * scale, :LABEL_WIDTH] = COLOR_LABEL
+        pixels = render_config(config, chars, ttf, width, height).astype(bool)
+        cells = np.where(pixels[..., None], on, off).repeat(scale, axis=1).repeat(scale, axis=2)
+        for i, cell in enumerate(cells):
+            x0 = LABEL_WIDTH + 1 + i * block_w
+            canvas[y0:y0 + height * scale, x0:x0 + width * scale] = cell
+        baseline = config.get('metrics', {}).get('baseline')
+        if baseline is not None:
+            canvas[y0 + (int(baseline) + 1) * scale - 1, LABEL_WIDTH + 1:] = COLOR_ADVANCE
+
+    image = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(image)
+    label_font = ImageFont.load_default()
+    for row, config in enumerate(configs):
+        y0 = row * block_h + 1
+        label = (f"{config.get('name', '')}{config['size_upper']}/{config['size_lower']} "
+                 f"x{config['x_pos']:+d} y{config['y_offset']:+d} t{config['threshold']}")
+        draw.text((4, y0 + 2), label, fill=COLOR_TEXT, font=label_font)
+        if 'score' in config:
+            draw.text((4, y0 + 16), f"score {config['score']:.1f}", fill=COLOR_TEXT, font=label_font)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    image.save(path)
+
+
+def current_config(configs):
+    """Конфигурация с параметрами по умолчанию из batch_insert_cyrillic / glyph_render, если она в сетке"""
+    for config in configs:
+        if (config['size_upper'], config['size_lower'], config['x_pos'], config['y_offset'], config['threshold']) == \
+                (FONT_SIZE_UPPER, FONT_SIZE_LOWER, X_POS, Y_OFFSET, THRESHOLD):
+            return config
+    return {'size_upper': FONT_SIZE_UPPER, 'size_lower': FONT_SIZE_LOWER, 'x_pos': X_POS,
+            'y_offset': Y_OFFSET, 'threshold': THRESHOLD}
+
+
+def parse_list(value):
+    """'6:14' (диапазон включительно) или '0,1,2' → список целых"""
+    values = []
+    for part in value.split(','):
+        if ':' in part:
+            first, last = part.split(':', 1)
+            values.extend(range(int(first), int(last) + 1))
+        else:
+            values.append(int(part))
+    if not values:
+        raise ValueError(f"пустой список '{value}'")
+    return values
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ('-h', '--help'):
+        print(f"Использование: python {sys.argv[0]} [--ttf F] [--sizes 6:14] [--x 0,1] [--y -2:4] "
+              f"[--thresholds 64,128] [--nftr F] [--mapping F.json] [--jobs N] [--top N] [--output {DEFAULT_OUTPUT}] "
+              f"[--atlas F.png]")
+        print(f"")
+        print(f"Параметры:")
+        print(f"  --ttf F          TTF шрифт (по умолчанию {FONT_PATH})")
+        print(f"  --sizes LIST     Размеры TTF для заглавных и строчных (по умолчанию {SIZES[0]}:{SIZES[-1]})")
+        print(f"  --x / --y LIST   Смещения по горизонтали и вертикали (по умолчанию {X_POSITIONS[0]}:{X_POSITIONS[-1]} "
+              f"и {Y_OFFSETS[0]}:{Y_OFFSETS[-1]})")
+        print(f"  --thresholds L   Пороги бинаризации (по умолчанию {','.join(map(str, THRESHOLDS))})")
+        print(f"  --nftr F         Шрифт игры: размер ячейки и базовая линия (по умолчанию "
+              f"{BITMAP_WIDTH}x{BITMAP_HEIGHT}, строка {BASELINE})")
+        print(f"  --mapping F      Таблица соответствия — какие символы оценивать (по умолчанию CYRILLIC_MAPPING)")
+        print(f"  --jobs N         Число процессов")
+        print(f"  --top N          Сколько лучших конфигураций сохранить и показать в атласе (по умолчанию {TOP_CONFIGS})")
+        print(f"  --output F       JSON с лучшей конфигурацией (по умолчанию {DEFAULT_OUTPUT})")
+        print(f"  --atlas F        Атлас сравнения (по умолчанию <output>.png)")
+        sys.exit(1)
+
+    ttf = FONT_PATH
+    sizes, xs, ys, thresholds = SIZES, X_POSITIONS, Y_OFFSETS, THRESHOLDS
+    mapping = CYRILLIC_MAPPING
+    width, height, baseline = BITMAP_WIDTH, BITMAP_HEIGHT, BASELINE
+    workers = None
+    top = TOP_CONFIGS
+    output = DEFAULT_OUTPUT
+    atlas = None
+    args = iter(sys.argv[1:])
+    try:
+        for arg in args:
+            if arg == '--ttf':
+                ttf = next(args, FONT_PATH)
+            elif arg == '--sizes':
+                sizes = parse_list(next(args, ''))
+            elif arg == '--x':
+                xs = parse_list(next(args, ''))
+            elif arg == '--y':
+                ys = parse_list(next(args, ''))
+            elif arg == '--thresholds':
+                thresholds = parse_list(next(args, ''))
+            elif arg == '--mapping':
+                mapping = load_mapping(next(args, ''))
+            elif arg == '--nftr':
+                font = load_font(next(args, ''))
+                width, height, baseline = font.cell_width, font.cell_height, font.baseline
+            elif arg == '--jobs':
+                workers = int(next(args, ''))
+                if workers < 1:
+                    raise ValueError("--jobs должен быть не меньше 1")
+            elif arg == '--top':
+                top = int(next(args, ''))
+            elif arg == '--output':
+                output = next(args, DEFAULT_OUTPUT)
+            elif arg == '--atlas':
+                atlas = next(args, None)
+    except (OSError, ValueError, NFTRError) as e:
+        print(f"ОШИБКА: Некорректный параметр: {e}")
+        sys.exit(1)
+    atlas = atlas or os.path.splitext(output)[0] + '.png'
+
+    if not os.path.exists(ttf):
+        print(f"ОШИБКА: Шрифт '{ttf}' не найден.")
+        sys.exit(1)
+
+    chars = [char for _, char in mapping]
+    upper_chars = [char for char in chars if char.isupper()]
+    lower_chars = [char for char in chars if not char.isupper()]
+    total = len(sizes) ** 2 * len(xs) * len(ys) * len(thresholds)
+    print(f"🔬 Перебор {total} конфигураций для {len(chars)} символов ({ttf})")
+
+    started = time.perf_counter()
+    measured = measure_all(ttf, chars, sizes, xs, ys, thresholds, width, height, workers)
+    rendered = time.perf_counter()
+    configs = sweep(measured, upper_chars, lower_chars, xs, ys, thresholds, height, baseline)
+    finished = time.perf_counter()
+    print(f"  Рендер и метрики: {rendered - started:.2f} с, оценка: {finished - rendered:.2f} с")
+
+    best = configs[0]
+    print(f"✓ Лучшая: size_upper={best['size_upper']}, size_lower={best['size_lower']}, x_pos={best['x_pos']}, "
+          f"y_offset={best['y_offset']}, threshold={best['threshold']} (оценка {best['score']:.1f})")
+    print(f"  {best['metrics']}")
+    current = current_config(configs)
+    if 'score' in current:
+        print(f"  Текущие параметры: оценка {current['score']:.1f}, {current['metrics']}")
+
+    report = {
+        'ttf': ttf,
+        'size_upper': best['size_upper'], 'size_lower': best['size_lower'],
+        'x_pos': best['x_pos'], 'y_offset': best['y_offset'], 'threshold': best['threshold'],
+        'score': best['score'], 'metrics': best['metrics'],
+        'weights': SCORE_WEIGHTS,
+        'grid': {'sizes': sizes, 'x': xs, 'y': ys, 'thresholds': thresholds},
+        'cell': {'width': width, 'height': height, 'baseline': baseline},
+        'top': configs[:top],
+    }
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"✓ Конфигурация сохранена в {output}")
+
+    save_comparison_atlas([dict(current, name='* ')] + configs[:top], chars, ttf, width, height, atlas)
+    print(f"✓ Атлас сравнения: {atlas} (первая строка — текущие параметры)")
+
+
+if __name__ == "__main__":
+    main()
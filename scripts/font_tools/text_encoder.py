@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Скрипт для перекодирования переведённых строк (UTF-8) в байты игры
+
+Русские буквы заменяются кодами Shift-JIS тех слотов шрифта, в которые
+batch_insert_cyrillic.py вставил их битмапы (индекс глифа → код через
+CMAP шрифта). Знаки препинания, цифры и латиница берутся из таблицы
+PUNCTUATION_CODES, остальные символы кодируются в Shift-JIS напрямую,
+если такой глиф есть в шрифте и его слот не отдан под русскую букву
+(иначе символ считается отсутствующим и заменяется). Файл
+обрабатывается построчно, поэтому размер входных данных не ограничен
+памятью.
+"""
+
+import sys
+import os
+from collections import Counter
+
+from batch_insert_cyrillic import CYRILLIC_MAPPING, load_mapping
+from nftr import NFTRError, load_font
+
+# --- Знаки препинания, цифры и латиница (коды глифов оригинального шрифта) ---
+PUNCTUATION_CODES = {
+    ' ': 0x8140, ',': 0x8141, '◦': 0x8142, '.': 0x8145, ':': 0x8146, '?': 0x8148, '!': 0x8149,
+    '-': 0x815b, '~': 0x8160, '…': 0x8163, '[': 0x816d, ']': 0x816e,
+    '┌': 0x8175, '┘': 0x8176,
+    '○': 0x819b, '△': 0x81a2, '▲': 0x81a3,
+    '0': 0x824f, '1': 0x8250, '2': 0x8251, '3': 0x8252, '4': 0x8253,
+    '5': 0x8254, '6': 0x8255, '7': 0x8256, '8': 0x8257,
+    'A': 0x8260, 'B': 0x8261, 'C': 0x8262, 't': 0x8294,
+}
+
+# --- Замены для символов, которых нет в шрифте ---
+FALLBACK_CHARS = {
+    '—': '-', '–': '-', '«': '[', '»': ']', '„': '[', '“': ']', '”': ']',
+    ';': ',', '\u00a0': ' ', '\t': ' ',
+}
+DEFAULT_FALLBACK = '?'
+DEFAULT_TERMINATOR = b'\x00'
+NEWLINE_ESCAPE = '\\n'
+NEWLINE_BYTE = b'\n'
+
+
+def code_to_bytes(code):
+    """Код символа в байты Shift-JIS (двухбайтовые коды — старшим байтом вперёд)"""
+    return code.to_bytes(2, 'big') if code > 0xFF else bytes([code])
+
+
+def bytes_to_codes(raw):
+    """Байты Shift-JIS → коды символов (двухбайтовые — старшим байтом вперёд)"""
+    codes = []
+    i = 0
+    while i < len(raw):
+        byte = raw[i]
+        if (0x81 <= byte <= 0x9F or 0xE0 <= byte <= 0xFC) and i + 1 < len(raw):
+            codes.append(byte << 8 | raw[i + 1])
+            i += 2
+        else:
+            codes.append(byte)
+            i += 1
+    return codes
+
+
+def reassigned_indices(mapping=CYRILLIC_MAPPING):
+    """Индексы глифов, чьи битмапы заменены символами таблицы соответствия"""
+    return {glyph_index for glyph_index, _ in mapping}
+
+
+def native_bytes(font, char, reassigned=frozenset()):
+    """
+    Байты символа, который есть в шрифте под своим кодом Shift-JIS, или None.
+    Глифы из reassigned уже рисуют другие символы и исходным не считаются
+    """
+    try:
+        raw = char.encode(font.encoding)
+    except (UnicodeEncodeError, LookupError):
+        return None
+    if len(raw) > 2:
+        return None
+    index = font.index_of(int.from_bytes(raw, 'big'))
+    if index is None or index in reassigned:
+        return None
+    return raw
+
+
+def build_substitution_table(font, mapping=CYRILLIC_MAPPING, punctuation=PUNCTUATION_CODES):
+    """
+    Таблица символ → байты игры для всех символов с известным слотом в шрифте.
+    Знаки, чей глиф занят символом из mapping, в таблицу не попадают
+    """
+    reassigned = reassigned_indices(mapping)
+    table = {}
+    for char, code in punctuation.items():
+        index = font.index_of(code)
+        if index is not None and index not in reassigned:
+            table[char] = code_to_bytes(code)
+    for glyph_index, char in mapping:
+        code = font.code_of(glyph_index)
+        if code is not None:
+            table[char] = code_to_bytes(code)
+    return table
+
+
+class TextEncoder:
+    """
+    Потоковый кодировщик строк перевода.
+
+    Результат кодирования каждого символа запоминается, так что строка
+    кодируется за одно обращение к словарю на символ. Символы без глифа
+    заменяются через FALLBACK_CHARS или символом fallback и учитываются в missing
+    """
+
+    def __init__(self, font, mapping=CYRILLIC_MAPPING, fallback=DEFAULT_FALLBACK, terminator=DEFAULT_TERMINATOR):
+        self.font = font
+        self.table = build_substitution_table(font, mapping)
+        self.reassigned = reassigned_indices(mapping)
+        self.fallback = fallback
+        self.terminator = terminator
+        self.missing = Counter()
+        self.first_seen = {}
+        self._line_number = 0
+
+    def _native(self, char):
+        """Символ, который есть в шрифте под своим кодом Shift-JIS (и слот не занят переводом)"""
+        return native_bytes(self.font, char, self.reassigned)
+
+    def encode_char(self, char):
+        """Байты одного символа (с учётом замен)"""
+        encoded = self.table.get(char)
+        if encoded is not None:
+            return encoded
+
+        encoded = self._native(char)
+        if encoded is None:
+            self.missing[char] += 1
+            self.first_seen.setdefault(char, self._line_number)
+            substitute = FALLBACK_CHARS.get(char, self.fallback)
+            encoded = b''.join(self.table.get(c) or self._native(c) or b'' for c in substitute)
+            # Замена не кэшируется, чтобы каждое вхождение попало в отчёт
+            return encoded
+        self.table[char] = encoded
+        return encoded
+
+    def encode(self, text):
+        """Байты строки без терминатора; '\\n' в тексте перевода — перевод строки"""
+        parts = []
+        for i, chunk in enumerate(text.split(NEWLINE_ESCAPE)):
+            if i:
+                parts.append(NEWLINE_BYTE)
+            table = self.table
+            for char in chunk:
+                encoded = table.get(char)
+                parts.append(encoded if encoded is not None else self.encode_char(char))
+        return b''.join(parts)
+
+    def encode_lines(self, lines):
+        """Генератор: строки перевода → байты строк с терминатором"""
+        for line in lines:
+            self._line_number += 1
+            yield self.encode(line.rstrip('\r\n')) + self.terminator
+
+
+def encode_file(encoder, input_file, output_file):
+    """Перекодирует файл построчно. Возвращает (число строк, число байт)"""
+    lines = 0
+    size = 0
+    with open(input_file, 'r', encoding='utf-8-sig') as src, open(output_file, 'wb') as dst:
+        for encoded in encoder.encode_lines(src):
+            dst.write(encoded)
+            lines += 1
+            size += len(encoded)
+    return lines, size
+
+
+def print_missing_report(encoder):
+    """Печатает символы, для которых в шрифте нет глифа"""
+    if not encoder.missing:
+        print("✓ Все символы есть в шрифте")
+        return
+    print(f"⚠️  Символов без глифа: {len(encoder.missing)}")
+    for char, count in encoder.missing.most_common():
+        substitute = FALLBACK_CHARS.get(char, encoder.fallback)
+        # Номер строки есть только у символов из кодируемого файла
+        line = encoder.first_seen.get(char)
+        seen = f"впервые в строке {line}, " if line else ""
+        print(f"  '{char}' (U+{ord(char):04X}): {count} раз, {seen}заменён на '{substitute}'")
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(f"Использование: python {sys.argv[0]} <шрифт.nftr> <перевод.txt> [выход.bin] [--fallback C] [--terminator HEX] [--mapping F.json]")
+        print(f"")
+        print(f"Пример: python {sys.argv[0]} data/tumefont.fsize-12.nftr translation/menu.txt build/menu.bin")
+        print(f"")
+        print(f"Каждая строка входного файла — одна строка игры, '\\n' внутри строки — перевод строки.")
+        print(f"Параметры:")
+        print(f"  --fallback C      Символ вместо отсутствующих в шрифте (по умолчанию '{DEFAULT_FALLBACK}')")
+        print(f"  --terminator HEX  Байты конца строки (по умолчанию {DEFAULT_TERMINATOR.hex()})")
+        print(f"  --mapping F.json  Таблица соответствия, с которой собран шрифт (по умолчанию CYRILLIC_MAPPING)")
+        sys.exit(1)
+
+    font_file, input_file = sys.argv[1], sys.argv[2]
+    output_file = None
+    fallback = DEFAULT_FALLBACK
+    terminator = DEFAULT_TERMINATOR
+    mapping = CYRILLIC_MAPPING
+    args = iter(sys.argv[3:])
+    for arg in args:
+        if arg == '--fallback':
+            fallback = next(args, DEFAULT_FALLBACK)
+        elif arg == '--terminator':
+            try:
+                terminator = bytes.fromhex(next(args, ''))
+            except ValueError:
+                print("ОШИБКА: --terminator ожидает байты в шестнадцатеричном виде, например 00 или 0d0a.")
+                sys.exit(1)
+        elif arg == '--mapping':
+            value = next(args, None)
+            try:
+                mapping = load_mapping(value)
+            except (TypeError, OSError, ValueError) as e:
+                print(f"ОШИБКА: Не удалось прочитать таблицу соответствия '{value}': {e}")
+                sys.exit(1)
+        elif output_file is None:
+            output_file = arg
+    output_file = output_file or os.path.splitext(input_file)[0] + '.bin'
+
+    for path in (font_file, input_file):
+        if not os.path.exists(path):
+            print(f"ОШИБКА: Файл '{path}' не найден.")
+            sys.exit(1)
+
+    try:
+        font = load_font(font_file, cache_dir=os.path.join(".cache", "nftr"))
+    except NFTRError as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+    encoder = TextEncoder(font, mapping, fallback=fallback, terminator=terminator)
+    lines, size = encode_file(encoder, input_file, output_file)
+    print(f"✓ {input_file} → {output_file}: {lines} строк, {size} байт")
+    print_missing_report(encoder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Проверка, помещаются ли строки перевода в окна игры
+
+Ширина строки в пикселях считается по таблице ширин шрифта (CWDH) так же,
+как её рисует игра: перо сдвигается на шаг (advance) каждого глифа, а
+правый край строки — это левый отступ плюс ширина битмапа последнего
+глифа. Шаги и правые края всех глифов заранее собраны в массивы NumPy,
+символы переводятся в индексы глифов через ту же таблицу замен, что и в
+text_encoder.py, поэтому ширины тысяч строк считаются одним проходом.
+
+Ограничения окон задаются JSON-файлом (--boxes):
+
+    {
+      "default":      {"width": 240, "lines": 3},
+      "menu*.txt":    {"width": 96,  "lines": 1},
+      "dialog.txt:12": {"width": 200, "lines": 2}
+    }
+
+Ключ — шаблон имени файла перевода (fnmatch) или "файл:строка" для
+отдельной строки. С --wrap длинные строки переносятся по пробелам, как
+в окнах диалогов, и проверяется число получившихся строк. Для строк,
+которые не поместились, можно сохранить PNG-превью с границей окна.
+"""
+
+import fnmatch
+import json
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from batch_insert_cyrillic import CYRILLIC_MAPPING, load_mapping
+from nftr import FontModel, NFTRError, load_font
+from text_encoder import DEFAULT_FALLBACK, FALLBACK_CHARS, NEWLINE_ESCAPE, TextEncoder, bytes_to_codes
+
+# --- Окно по умолчанию: экран DS 256 пикселей минус поля по 8 пикселей ---
+DEFAULT_BOX = {'width': 240, 'lines': 3}
+PREVIEW_SCALE = 3
+PREVIEW_PADDING = 4
+PREVIEW_INK = (0, 0, 0)
+PREVIEW_PAPER = (255, 255, 255)
+PREVIEW_LIMIT = (220, 0, 0)
+
+Overflow = namedtuple('Overflow', 'source line text lines widths box')
+
+
+class TextLayout:
+    """
+    Раскладка строк по таблице ширин шрифта.
+
+    advance[i] — шаг пера после глифа i, extent[i] — правый край его битмапа
+    относительно пера. Символ → индексы глифов запоминается при первой встрече
+    (символ без глифа может заменяться несколькими глифами); символы без
+    глифа собираются в missing_chars
+    """
+
+    def __init__(self, font, encoder=None):
+        self.font = font
+        self.model = FontModel.from_font(font)
+        self.encoder = encoder or TextEncoder(font)
+        widths = self.model.widths()
+        self.advance = widths['advance'].astype(np.int32)
+        self.extent = widths['left'].astype(np.int32) + widths['glyph_width']
+        self._indices = {}
+        self.missing_chars = set()
+
+    def char_indices(self, char):
+        """
+        Индексы глифов, которыми игра нарисует символ. Символ, чей слот Shift-JIS
+        отдан под русскую букву, считается отсутствующим, как в TextEncoder
+        """
+        indices = self._indices.get(char)
+        if indices is None:
+            raw = self.encoder.encode_char(char)
+            indices = tuple(index for index in map(self.font.index_of, bytes_to_codes(raw)) if index is not None)
+            # Найденные символы кодировщик запоминает в table, заменённые — нет
+            if char not in self.encoder.table:
+                self.missing_chars.add(char)
+            self._indices[char] = indices
+        return indices
+
+    def line_indices(self, text):
+        """Индексы глифов одной строки (без переводов строки) как массив"""
+        indices = []
+        for char in text:
+            indices.extend(self._indices.get(char) or self.char_indices(char))
+        return np.array(indices, dtype=np.intp)
+
+    def measure(self, text):
+        """Ширина одной строки в пикселях"""
+        return int(self.measure_lines([text])[0])
+
+    def measure_lines(self, lines):
+        """
+        Ширины множества строк одним проходом: индексы всех строк склеиваются,
+        шаги суммируются np.add.reduceat по началам строк
+        """
+        arrays = [self.line_indices(line) for line in lines]
+        lengths = np.array([len(a) for a in arrays], dtype=np.intp)
+        widths = np.zeros(len(arrays), dtype=np.int32)
+        filled = lengths > 0
+        if not filled.any():
+            return widths
+
+        indices = np.concatenate(arrays)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))[filled]
+        last = indices[starts + lengths[filled] - 1]
+        sums = np.add.reduceat(self.advance[indices], starts)
+        widths[filled] = sums - self.advance[last] + self.extent[last]
+        return widths
+
+    def wrap(self, text, max_width):
+        """Разбивает строку на строки по пробелам так, чтобы каждая помещалась в max_width"""
+        result = []
+        for paragraph in text.split(NEWLINE_ESCAPE):
+            line = None
+            for word in paragraph.split(' '):
+                candidate = word if line is None else line + ' ' + word
+                if line is not None and self.measure(candidate) > max_width:
+                    result.append(line)
+                    line = word
+                else:
+                    line = candidate
+            result.append(line or '')
+        return result
+
+    def layout(self, text, max_width=None):
+        """Строки и их ширины: по явным '\\n', а при заданном max_width — с переносом"""
+        lines = text.split(NEWLINE_ESCAPE)
+        widths = self.measure_lines(lines)
+        if max_width is not None and (widths > max_width).any():
+            lines = self.wrap(text, max_width)
+            widths = self.measure_lines(lines)
+        return lines, widths
+
+    def render(self, lines, box_width=None, scale=PREVIEW_SCALE):
+        """PNG-превью строк: пиксели глифов по таблице ширин, красная линия — граница окна"""
+        model = self.model
+        widths = self.measure_lines(lines)
+        line_height = max(self.font.line_height, model.cell_height)
+        width = max(int(widths.max(initial=0)), box_width or 0) + PREVIEW_PADDING * 2 + model.cell_width
+        height = line_height * len(lines) + PREVIEW_PADDING * 2
+        canvas = np.zeros((height, width), dtype=bool)
+
+        left = np.frombuffer(model.left, dtype=np.int8)
+        for row, line in enumerate(lines):
+            indices = self.line_indices(line)
+            pixels = model.pixels(indices).astype(bool)
+            pens = np.concatenate(([0], np.cumsum(self.advance[indices])[:-1])) + PREVIEW_PADDING
+            y = PREVIEW_PADDING + row * line_height
+            for glyph, pen, index in zip(pixels, pens, indices):
+                x = max(0, pen + left[index])
+                region = canvas[y:y + model.cell_height, x:x + model.cell_width]
+                region |= glyph[:region.shape[0], :region.shape[1]]
+
+        rgb = np.empty((height, width, 3), dtype=np.uint8)
+        rgb[:] = PREVIEW_PAPER
+        rgb[canvas] = PREVIEW_INK
+        if box_width is not None:
+            rgb[:, PREVIEW_PADDING + box_width] = PREVIEW_LIMIT
+        image = Image.fromarray(rgb, 'RGB')
+        return image.resize((width * scale, height * scale), Image.NEAREST)
+
+
+# --- Ограничения окон ---
+
+def load_boxes(path):
+    """Читает JSON с ограничениями окон; без файла — только окно по умолчанию"""
+    boxes = {}
+    if path is not None:
+        with open(path, 'r', encoding='utf-8') as f:
+            boxes = json.load(f)
+    boxes['default'] = dict(DEFAULT_BOX, **boxes.get('default', {}))
+    return boxes
+
+
+def box_for(boxes, source, line):
+    """Ограничение для строки: 'файл:строка', затем шаблоны имени файла, затем default"""
+    name = os.path.basename(source)
+    for key in (f"{source}:{line}", f"{name}:{line}"):
+        if key in boxes:
+            return dict(boxes['default'], **boxes[key])
+    for pattern, box in boxes.items():
+        if ':' not in pattern and pattern != 'default' and (fnmatch.fnmatch(source, pattern)
+                                                            or fnmatch.fnmatch(name, pattern)):
+            return dict(boxes['default'], **box)
+    return boxes['default']
+
+
+# --- Проверка ---
+
+def read_strings(paths):
+    """Генератор (файл, номер строки, текст) по файлам перевода"""
+    for path in paths:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for number, text in enumerate(f, 1):
+                yield path, number, text.rstrip('\r\n')
+
+
+def check_strings(layout, strings, boxes, wrap=False, missing=None):
+    """
+    Проверяет строки (файл, номер, текст) по ограничениям окон.
+    Возвращает (число проверенных строк, список Overflow). В словарь missing
+    (если задан) попадают символы без глифа: символ → [число, первое место]
+
+    Ширины всех строк без переноса считаются одним вызовом measure_lines;
+    перенос пересчитывается только для строк, которые не уместились
+    """
+    strings = list(strings)
+    parts = [text.split(NEWLINE_ESCAPE) for _, _, text in strings]
+    widths = layout.measure_lines([line for lines in parts for line in lines])
+
+    overflows = []
+    offset = 0
+    for (source, number, text), lines in zip(strings, parts):
+        line_widths = widths[offset:offset + len(lines)]
+        offset += len(lines)
+        if missing is not None:
+            for char in layout.missing_chars.intersection(text):
+                entry = missing.setdefault(char, [0, f"{source}:{number}"])
+                entry[0] += text.count(char)
+        box = box_for(boxes, source, number)
+        if wrap and (line_widths > box['width']).any():
+            lines = layout.wrap(text, box['width'])
+            line_widths = layout.measure_lines(lines)
+        if len(lines) > box['lines'] or (line_widths > box['width']).any():
+            overflows.append(Overflow(source, number, text, lines, [int(w) for w in line_widths], box))
+    return len(strings), overflows
+
+
+def save_previews(layout, overflows, out_dir):
+    """Сохраняет PNG-превью не поместившихся строк: <файл>_<строка>.png"""
+    os.makedirs(out_dir, exist_ok=True)
+    for overflow in overflows:
+        name = f"{os.path.splitext(os.path.basename(overflow.source))[0]}_{overflow.line}.png"
+        layout.render(overflow.lines, overflow.box['width']).save(os.path.join(out_dir, name))
+
+
+def print_report(checked, overflows):
+    if not overflows:
+        print(f"✅ Все {checked} строк помещаются в окна")
+        return
+    print(f"❌ Не помещаются {len(overflows)} из {checked} строк:")
+    for overflow in overflows:
+        box = overflow.box
+        widest = max(overflow.widths, default=0)
+        print(f"  {overflow.source}:{overflow.line}: {len(overflow.lines)} стр. (макс. {box['lines']}), "
+              f"ширина {widest} пикс. (макс. {box['width']})")
+        for line, width in zip(overflow.lines, overflow.widths):
+            mark = " ⚠️" if width > box['width'] else ""
+            print(f"      {width:>4} | {line}{mark}")
+
+
+def print_missing(missing):
+    """Печатает символы без глифа (они нарисуются заменой из FALLBACK_CHARS)"""
+    if not missing:
+        return
+    print(f"⚠️  Символов без глифа: {len(missing)}")
+    for char, (count, place) in sorted(missing.items(), key=lambda item: -item[1][0]):
+        print(f"  '{char}' (U+{ord(char):04X}): {count} раз, впервые в {place}, "
+              f"ширина считается по замене '{FALLBACK_CHARS.get(char, DEFAULT_FALLBACK)}'")
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(f"Использование: python {sys.argv[0]} <шрифт.nftr> <перевод.txt>... [--boxes boxes.json] [--wrap] "
+              f"[--preview каталог] [--json отчёт.json] [--mapping F.json]")
+        print(f"")
+        print(f"Пример: python {sys.argv[0]} data/tumefont.fsize-12.nftr translation/*.txt --boxes translation/boxes.json --wrap")
+        print(f"")
+        print(f"Параметры:")
+        print(f"  --boxes FILE      Ограничения окон (по умолчанию {DEFAULT_BOX['width']} пикс., {DEFAULT_BOX['lines']} строки)")
+        print(f"  --wrap            Переносить длинные строки по пробелам")
+        print(f"  --preview DIR     Сохранить PNG-превью не поместившихся строк")
+        print(f"  --json FILE       Сохранить отчёт в JSON")
+        print(f"  --mapping FILE    Таблица соответствия, с которой собран шрифт (по умолчанию CYRILLIC_MAPPING)")
+        sys.exit(1)
+
+    font_file = sys.argv[1]
+    inputs = []
+    boxes_file = None
+    preview_dir = None
+    json_path = None
+    wrap = False
+    mapping_file = None
+    args = iter(sys.argv[2:])
+    for arg in args:
+        if arg == '--boxes':
+            boxes_file = next(args, None)
+        elif arg == '--preview':
+            preview_dir = next(args, None)
+        elif arg == '--json':
+            json_path = next(args, None)
+        elif arg == '--mapping':
+            mapping_file = next(args, None)
+        elif arg == '--wrap':
+            wrap = True
+        else:
+            inputs.append(arg)
+
+    for path in [font_file, boxes_file, mapping_file] + inputs:
+        if path is not None and not os.path.exists(path):
+            print(f"ОШИБКА: Файл '{path}' не найден.")
+            sys.exit(1)
+    if not inputs:
+        print("ОШИБКА: Не указаны файлы перевода.")
+        sys.exit(1)
+
+    try:
+        font = load_font(font_file, cache_dir=os.path.join(".cache", "nftr"))
+        boxes = load_boxes(boxes_file)
+        mapping = load_mapping(mapping_file) if mapping_file else CYRILLIC_MAPPING
+    except (NFTRError, ValueError) as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+    layout = TextLayout(font, TextEncoder(font, mapping))
+    missing = {}
+    checked, overflows = check_strings(layout, read_strings(inputs), boxes, wrap, missing)
+    print_report(checked, overflows)
+    print_missing(missing)
+
+    if preview_dir and overflows:
+        save_previews(layout, overflows, preview_dir)
+        print(f"🖼  Превью сохранены в {preview_dir}")
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'checked': checked, 'overflows': [o._asdict() for o in overflows]},
+                      f, indent=2, ensure_ascii=False)
+    if overflows:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Режим наблюдения: живая настройка вставляемых глифов
+
+Скрипт держит в памяти TTF, шрифт NFTR и кэш рендера и опрашивает файлы
+конфигурации, TTF, таблицы соответствия и атласа. При изменении:
+  * перерисовываются только глифы, у которых изменились параметры рендера
+    (символ, TTF, размер, x_pos / y_offset / threshold из glyph_render);
+  * при смене left / tracking пересчитываются только ширины;
+  * ячейки, изменённые в атласе вручную, импортируются в шрифт;
+  * в выходной NFTR через patch_file пишутся только изменившиеся байты,
+    атлас-превью перерисовывается (изменённые относительно исходного
+    шрифта глифы подсвечены).
+
+Конфигурация — JSON с теми же полями, что задание batch_build_fonts.py,
+плюс параметры размещения и атласа:
+
+{
+  "nftr": "data/tumefont.orig.nftr", "output": "build/tumefont-watch.nftr",
+  "ttf": "fonts/PressStart2P-Regular.ttf", "size_upper": 12, "size_lower": 10,
+  "x_pos": 0, "y_offset": 2, "threshold": 128, "left": 0, "tracking": 1,
+  "mapping": "slots.json", "atlas": "build/tumefont-watch.png", "scale": 3
+}
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from batch_insert_cyrillic import (
+    CYRILLIC_MAPPING, FONT_PATH, FONT_SIZE_LOWER, FONT_SIZE_UPPER,
+    GLYPH_LEFT_OFFSET, GLYPH_TRACKING, compute_widths, load_mapping,
+)
+from glyph_render import THRESHOLD, X_POS, Y_OFFSET, RenderCache, file_digest, load_truetype
+from nftr import Font, NFTRError, load_font
+from nftr.atlas import read_atlas, render_atlas, save_atlas
+from nftr.codec import decode_glyphs, glyph_buffer, write_glyphs
+
+POLL_INTERVAL = 0.1   # Период опроса файлов, с
+ATLAS_COLUMNS = 16
+ATLAS_SCALE = 3
+
+
+def load_config(path):
+    """Читает конфигурацию наблюдения и дополняет её значениями по умолчанию"""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if 'nftr' not in config:
+        raise ValueError("Не указан исходный файл 'nftr'")
+    output = config.get('output') or os.path.splitext(config['nftr'])[0] + '.watch.nftr'
+    return {
+        'nftr': config['nftr'],
+        'output': output,
+        'ttf': config.get('ttf', FONT_PATH),
+        'size_upper': config.get('size_upper', FONT_SIZE_UPPER),
+        'size_lower': config.get('size_lower', FONT_SIZE_LOWER),
+        'x_pos': config.get('x_pos', X_POS),
+        'y_offset': config.get('y_offset', Y_OFFSET),
+        'threshold': config.get('threshold', THRESHOLD),
+        'left': config.get('left', GLYPH_LEFT_OFFSET),
+        'tracking': config.get('tracking', GLYPH_TRACKING),
+        'widths': config.get('widths', True),
+        'mapping': config.get('mapping'),
+        'start': config.get('start'),
+        'end': config.get('end'),
+        'atlas': config.get('atlas', os.path.splitext(output)[0] + '.png'),
+        'columns': config.get('columns', ATLAS_COLUMNS),
+        'scale': config.get('scale', ATLAS_SCALE),
+        'labels': config.get('labels', False),
+    }
+
+
+def file_stamp(path):
+    """(mtime, размер) файла или None, если файла нет"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class WatchSession:
+    """
+    Состояние режима наблюдения: исходный и выходной шрифты, ключи рендера
+    каждого вставленного глифа и штампы наблюдаемых файлов
+    """
+
+    def __init__(self, config_path, cache=None):
+        self.config_path = config_path
+        self.cache = cache if cache is not None else RenderCache()
+        self.config = None
+        self.base = None
+        self.font = None
+        self.keys = {}          # индекс глифа → ключ рендера, с которым он записан
+        self.width_params = None
+        self.stamps = {}
+        self.atlas_stamp = None
+
+    # --- Наблюдаемые файлы ---
+
+    def watched(self):
+        paths = [self.config_path]
+        if self.config:
+            paths += [self.config['ttf'], self.config['mapping'], self.config['atlas']]
+        return [path for path in paths if path]
+
+    def poll(self):
+        """True, если какой-либо наблюдаемый файл изменился с прошлого опроса"""
+        stamps = {path: file_stamp(path) for path in self.watched()}
+        changed = stamps != self.stamps
+        self.stamps = stamps
+        return changed
+
+    # --- Обновление ---
+
+    def _open_fonts(self, config):
+        self.base = load_font(config['nftr'])
+        self.font = Font(self.base.data)
+        self.keys = {}
+        self.width_params = None
+        self.atlas_stamp = None
+
+    def mapping(self, config):
+        mapping = load_mapping(config['mapping']) if config['mapping'] else CYRILLIC_MAPPING
+        if config['start'] is not None or config['end'] is not None:
+            start = config['start'] if config['start'] is not None else 0
+            end = config['end'] if config['end'] is not None else self.font.num_glyphs - 1
+            mapping = [(idx, char) for idx, char in mapping if start <= idx <= end]
+        return [(idx, char) for idx, char in mapping if 0 <= idx < self.font.num_glyphs]
+
+    def render_key(self, config, char):
+        size = config['size_upper'] if char.isupper() else config['size_lower']
+        return (char, config['ttf'], file_digest(config['ttf']), size,
+                config['x_pos'], config['y_offset'], config['threshold'])
+
+    def update(self):
+        """
+        Приводит выходной шрифт и атлас в соответствие с файлами.
+        Возвращает словарь со статистикой прохода
+        """
+        started = time.perf_counter()
+        config = load_config(self.config_path)
+        if self.config is None or (config['nftr'], config['output']) != (self.config['nftr'], self.config['output']):
+            self._open_fonts(config)
+        font, base = self.font, self.base
+        width, height = font.cell_width, font.cell_height
+        load_truetype(config['ttf'], config['size_upper'])
+        load_truetype(config['ttf'], config['size_lower'])
+
+        # Ручные правки атласа (файл изменён не этим скриптом) применяются до перерисовки:
+        # атлас показывает шрифт в состоянии прошлого прохода
+        imported = []
+        atlas_stamp = file_stamp(config['atlas'])
+        if atlas_stamp is not None and self.atlas_stamp is not None and atlas_stamp != self.atlas_stamp:
+            cells, _ = read_atlas(config['atlas'], font)
+            if len(cells) == font.num_glyphs:
+                imported = [int(i) for i in np.flatnonzero((decode_glyphs(font) != cells).any(axis=(1, 2)))]
+                write_glyphs(font, imported, cells[imported])
+
+        # Глифы, убранные из таблицы соответствия, возвращаются к исходным
+        mapping = self.mapping(config)
+        keys = {idx: self.render_key(config, char) for idx, char in mapping}
+        restored = sorted(set(self.keys) - set(keys))
+        for idx in restored:
+            font.set_glyph(idx, base.glyph(idx))
+            if font.width_offset(idx) is not None:
+                font.set_width(idx, *base.width(idx))
+
+        stale = sorted(idx for idx, key in keys.items() if self.keys.get(idx) != key)
+        if stale:
+            pixels = np.stack([self.cache.render(keys[idx][0], config['ttf'], keys[idx][3], width, height,
+                                                 config['x_pos'], config['y_offset'], config['threshold'])[0]
+                               for idx in stale])
+            write_glyphs(font, stale, pixels)
+
+        # Ширины: для перерисованных глифов, а при смене left/tracking — для всех вставленных
+        width_params = (config['widths'], config['left'], config['tracking'])
+        widths_for = sorted(set(stale) | (set(imported) & set(keys)))
+        if width_params != self.width_params:
+            widths_for = sorted(keys)
+        if config['widths'] and widths_for:
+            entries = compute_widths(decode_glyphs(font, widths_for), config['left'], config['tracking'],
+                                     font.default_width[2])
+            for idx, entry in zip(widths_for, entries):
+                if font.width_offset(idx) is not None:
+                    font.set_width(idx, *entry)
+        elif not config['widths'] and width_params != self.width_params:
+            for idx in keys:
+                if font.width_offset(idx) is not None:
+                    font.set_width(idx, *base.width(idx))
+
+        os.makedirs(os.path.dirname(config['output']) or '.', exist_ok=True)
+        bytes_written = font.save(config['output'], journal=False)
+
+        atlas_written = False
+        if bytes_written or atlas_stamp is None or atlas_stamp != self.atlas_stamp:
+            changed = (glyph_buffer(font) != glyph_buffer(base)).any(axis=1)
+            image, layout = render_atlas(font, config['columns'], config['scale'], config['labels'],
+                                         True, changed)
+            os.makedirs(os.path.dirname(config['atlas']) or '.', exist_ok=True)
+            save_atlas(image, layout, config['atlas'])
+            atlas_stamp = file_stamp(config['atlas'])
+            atlas_written = True
+
+        self.config = config
+        self.keys = keys
+        self.width_params = width_params
+        self.atlas_stamp = atlas_stamp
+        self.stamps = {path: file_stamp(path) for path in self.watched()}
+        return {
+            'rendered': len(stale), 'restored': len(restored), 'imported': len(imported),
+            'widths': len(widths_for) if config['widths'] else 0, 'bytes': bytes_written,
+            'atlas': atlas_written, 'seconds': time.perf_counter() - started,
+        }
+
+
+def print_update(stats, config):
+    parts = [f"перерисовано {stats['rendered']}"]
+    if stats['restored']:
+        parts.append(f"восстановлено {stats['restored']}")
+    if stats['imported']:
+        parts.append(f"из атласа {stats['imported']}")
+    parts.append(f"ширин {stats['widths']}")
+    parts.append(f"записано {stats['bytes']} байт")
+    if stats['atlas']:
+        parts.append(f"атлас → {config['atlas']}")
+    print(f"⟳ {time.strftime('%H:%M:%S')} {', '.join(parts)} ({stats['seconds'] * 1e3:.0f} мс)")
+
+
+def watch(config_path, interval=POLL_INTERVAL, once=False):
+    """Основной цикл: обновление при каждом изменении наблюдаемых файлов"""
+    session = WatchSession(config_path)
+    pending = True
+    try:
+        while True:
+            if session.poll() or pending:
+                pending = False
+                try:
+                    stats = session.update()
+                    print_update(stats, session.config)
+                except (OSError, ValueError, NFTRError) as e:
+                    # Ошибка в конфигурации или атласе не останавливает наблюдение
+                    print(f"ОШИБКА: {e}")
+                    session.stamps = {path: file_stamp(path) for path in session.watched()}
+                    if once:
+                        return False
+            if once:
+                return True
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nНаблюдение остановлено")
+        return True
+    finally:
+        session.cache.save()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(f"Использование: python {sys.argv[0]} <конфигурация.json> [--interval сек] [--once]")
+        print(f"")
+        print(f"Пример: python {sys.argv[0]} watch_font.json")
+        print(f"")
+        print(f"Параметры:")
+        print(f"  --interval S  Период опроса файлов (по умолчанию {POLL_INTERVAL} с)")
+        print(f"  --once        Выполнить одно обновление и выйти")
+        sys.exit(1)
+
+    config_path = sys.argv[1]
+    interval = POLL_INTERVAL
+    once = False
+    args = iter(sys.argv[2:])
+    for arg in args:
+        if arg == '--once':
+            once = True
+        elif arg == '--interval':
+            try:
+                interval = float(next(args, ''))
+            except ValueError:
+                print("ОШИБКА: Параметр --interval требует число.")
+                sys.exit(1)
+
+    if not os.path.exists(config_path):
+        print(f"ОШИБКА: Файл '{config_path}' не найден.")
+        sys.exit(1)
+
+    print(f"👀 Наблюдение за {config_path} (TTF, таблица соответствия, атлас); Ctrl+C — выход")
+    if not watch(config_path, interval, once):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
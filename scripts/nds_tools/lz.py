@@ -0,0 +1,666 @@
+#!/usr/bin/env python3
+"""
+Сжатие LZ10 / LZ11 (LZ77 из BIOS Nintendo DS)
+
+Формат: заголовок (тип 0x10 или 0x11 и размер распакованных данных, 24 бита;
+для LZ11 размер больше 16 МиБ пишется отдельным u32 после нулевого поля),
+затем группы из байта флагов (старший бит — первый) и до восьми элементов:
+флаг 0 — байт как есть, флаг 1 — ссылка (длина, расстояние до 4096 назад).
+
+  LZ10: 2 байта, длина 3..18
+  LZ11: 2 байта — длина 3..16, 3 байта — 17..272, 4 байта — 273..65808
+
+Распаковка потоковая (Decompressor.feed принимает данные частями).
+Сжатие — оптимальный разбор: для каждой позиции находится самое длинное
+совпадение (векторный поиск по хэш-цепочкам на NumPy, см. find_matches),
+затем динамическим программированием с конца выбирается разбиение
+минимальной длины в битах. На одном ядре это около 450 КБ/с на графике
+(NCGR/NSCR) и 150–250 КБ/с на данных с длинными повторами. Данные
+обрабатываются блоками по BLOCK_SIZE с окном из предыдущего блока, так что
+iter_compress() тоже работает с потоком. Ссылки на расстояние 1 по
+умолчанию не используются (min_distance=2): BIOS распаковывает в VRAM
+по 16 бит, и такие ссылки читают ещё не записанный байт.
+
+Запуск из корня репозитория:
+
+    python scripts/nds_tools/lz.py unpack data/full_extracted data/lz_unpacked [--jobs N]
+    python scripts/nds_tools/lz.py pack data/lz_unpacked build/lz [--jobs N]
+    python scripts/nds_tools/lz.py compress <файл> <выход> [--lz10]
+    python scripts/nds_tools/lz.py decompress <файл> <выход>
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+LZ10 = 0x10
+LZ11 = 0x11
+
+WINDOW_SIZE = 0x1000
+MIN_MATCH = 3
+MAX_MATCH = {LZ10: 0x12, LZ11: 0x10110}
+MAX_SIZE_24 = 0xFFFFFF
+
+BLOCK_SIZE = 1 << 16      # Размер блока оптимального разбора
+MAX_CHAIN = 64            # Сколько кандидатов проверять в хэш-цепочке
+NICE_LENGTH = 64          # Совпадение такой длины дальше не ищется (как nice_length в zlib)
+DEFAULT_MIN_DISTANCE = 2  # Безопасно для распаковки в VRAM
+
+# Стоимость элементов в битах (с битом флага)
+LITERAL_BITS = 9
+SHORT_MATCH = {LZ10: 0x12, LZ11: 0x10}  # Самая длинная ссылка наименьшей стоимости (17 бит)
+
+MANIFEST_NAME = "lz_manifest.json"
+MAX_PADDING = 7           # Сколько байт выравнивания допускается после сжатых данных
+
+
+class LZError(Exception):
+    """Ошибка формата сжатых данных"""
+
+
+def match_bits(fmt, length):
+    """Стоимость ссылки в битах"""
+    if fmt == LZ10 or length <= 16:
+        return 17
+    return 25 if length <= 0x110 else 33
+
+
+def detect(data):
+    """Тип сжатия по заголовку (LZ10, LZ11) или None"""
+    if len(data) >= 4 and data[0] in (LZ10, LZ11):
+        return data[0]
+    return None
+
+
+# --- Распаковка ---
+
+class Decompressor:
+    """
+    Потоковая распаковка: feed() принимает очередную порцию сжатых данных
+    и возвращает распакованные байты, которые уже можно отдать
+    """
+
+    def __init__(self):
+        self.fmt = None
+        self.size = None
+        self.produced = 0
+        self.pending = bytearray()
+        self.window = bytearray()
+        self.flags = 0
+        self.flag_bits = 0
+
+    @property
+    def eof(self):
+        return self.size is not None and self.produced >= self.size
+
+    @property
+    def unused_data(self):
+        """Байты после конца сжатых данных (выравнивание)"""
+        return bytes(self.pending) if self.eof else b''
+
+    def _read_header(self):
+        if len(self.pending) < 4:
+            return False
+        fmt = self.pending[0]
+        if fmt not in (LZ10, LZ11):
+            raise LZError(f"Неизвестный тип сжатия 0x{fmt:02X}")
+        size = int.from_bytes(self.pending[1:4], 'little')
+        header = 4
+        if size == 0 and fmt == LZ11:
+            if len(self.pending) < 8:
+                return False
+            size = int.from_bytes(self.pending[4:8], 'little')
+            header = 8
+        del self.pending[:header]
+        self.fmt, self.size = fmt, size
+        return True
+
+    def feed(self, data):
+        self.pending += data
+        if self.size is None and not self._read_header():
+            return b''
+
+        pending, window = self.pending, self.window
+        start = len(window)
+        pos = 0
+        remaining = self.size - self.produced
+        lz11 = self.fmt == LZ11
+        while remaining > 0:
+            if not self.flag_bits:
+                if pos >= len(pending):
+                    break
+                self.flags = pending[pos]
+                self.flag_bits = 8
+                pos += 1
+            if not self.flags & 0x80:
+                if pos >= len(pending):
+                    break
+                window.append(pending[pos])
+                pos += 1
+                remaining -= 1
+            else:
+                if pos + 1 >= len(pending):
+                    break
+                b0 = pending[pos]
+                if not lz11:
+                    length = (b0 >> 4) + 3
+                    distance = ((b0 & 0xF) << 8 | pending[pos + 1]) + 1
+                    pos += 2
+                else:
+                    indicator = b0 >> 4
+                    if indicator == 0:
+                        if pos + 2 >= len(pending):
+                            break
+                        b1, b2 = pending[pos + 1], pending[pos + 2]
+                        length = ((b0 & 0xF) << 4 | b1 >> 4) + 0x11
+                        distance = ((b1 & 0xF) << 8 | b2) + 1
+                        pos += 3
+                    elif indicator == 1:
+                        if pos + 3 >= len(pending):
+                            break
+                        b1, b2, b3 = pending[pos + 1], pending[pos + 2], pending[pos + 3]
+                        length = ((b0 & 0xF) << 12 | b1 << 4 | b2 >> 4) + 0x111
+                        distance = ((b2 & 0xF) << 8 | b3) + 1
+                        pos += 4
+                    else:
+                        length = indicator + 1
+                        distance = ((b0 & 0xF) << 8 | pending[pos + 1]) + 1
+                        pos += 2
+                if distance > len(window):
+                    raise LZError(f"Ссылка на {distance} байт назад, распаковано только "
+                                  f"{self.produced + len(window) - start}")
+                length = min(length, remaining)
+                begin = len(window) - distance
+                if distance >= length:
+                    window += window[begin:begin + length]
+                else:
+                    # Перекрывающаяся ссылка: повтор последних distance байт
+                    pattern = window[begin:]
+                    window += (pattern * (length // distance + 1))[:length]
+                remaining -= length
+            self.flags = (self.flags << 1) & 0xFF
+            self.flag_bits -= 1
+
+        del pending[:pos]
+        output = bytes(window[start:])
+        self.produced += len(output)
+        # Для ссылок достаточно последних WINDOW_SIZE байт
+        if len(window) > WINDOW_SIZE:
+            del window[:len(window) - WINDOW_SIZE]
+        return output
+
+
+def decompress(data):
+    """Распаковывает данные целиком; обрезанные данные — LZError"""
+    decompressor = Decompressor()
+    output = decompressor.feed(data)
+    if not decompressor.eof:
+        raise LZError(f"Данные обрезаны: распаковано {decompressor.produced} из {decompressor.size or '?'} байт")
+    return output
+
+
+def iter_decompress(chunks):
+    """Генератор: части сжатых данных → части распакованных"""
+    decompressor = Decompressor()
+    for chunk in chunks:
+        output = decompressor.feed(chunk)
+        if output:
+            yield output
+        if decompressor.eof:
+            return
+    raise LZError(f"Данные обрезаны: распаковано {decompressor.produced} из {decompressor.size or '?'} байт")
+
+
+# --- Сжатие ---
+
+def _words(a):
+    """Восемь байт с каждой позиции массива как u64 (за концом — нули)"""
+    padded = np.concatenate((a, np.zeros(8, dtype=np.uint8)))
+    return sliding_window_view(padded, 8)[:len(a)].copy().view('<u8').ravel()
+
+
+def _common_length(words, a, b, known, cap):
+    """
+    Длины общих префиксов с позиций a и b (векторы) не больше cap, если первые
+    known байт уже совпадают: сравнение по 8 байт, первый отличающийся байт —
+    по младшему единичному биту XOR
+    """
+    length = np.minimum(np.full(len(a), known, dtype=np.int64), cap)
+    active = np.flatnonzero(length < cap)
+    while active.size:
+        x = words[a[active] + length[active]] ^ words[b[active] + length[active]]
+        same = x == 0
+        diff = x[~same]
+        lowest = diff & (~diff + np.uint64(1))
+        length[active[~same]] += np.log2(lowest.astype(np.float64)).astype(np.int64) >> 3
+        length[active[same]] += 8
+        np.minimum(length, cap, out=length)
+        active = active[same]
+        active = active[length[active] < cap[active]]
+    return length
+
+
+def find_matches(buf, start, end, max_length, min_distance=DEFAULT_MIN_DISTANCE, max_chain=MAX_CHAIN,
+                 nice_length=NICE_LENGTH):
+    """
+    Самое длинное совпадение для каждой позиции buf[start:end] (окно — до WINDOW_SIZE байт назад,
+    в том числе из buf[:start]). Возвращает списки длин и расстояний.
+
+    Поиск векторный: позиции сортируются по трёхбайтовому ключу (группа ключа —
+    хэш-цепочка, внутри по возрастанию), и на шаге k все позиции сразу сравниваются
+    со своим k-м предшественником в цепочке. Позиция выходит из поиска, когда
+    цепочка кончилась, ушла за окно или найдено совпадение длиной nice_length;
+    такие совпадения затем продлеваются на том же расстоянии до полной длины
+    """
+    count = end - start
+    lengths = np.zeros(count, dtype=np.int64)
+    distances = np.zeros(count, dtype=np.int64)
+    a = np.frombuffer(buf, dtype=np.uint8, count=end)
+    lo = max(0, start - WINDOW_SIZE)
+    last = end - MIN_MATCH + 1  # Позиции, с которых есть полный ключ
+    if last <= start:
+        return lengths.tolist(), distances.tolist()
+
+    keys = (a[lo:last].astype(np.int32) | a[lo + 1:last + 1].astype(np.int32) << 8
+            | a[lo + 2:last + 2].astype(np.int32) << 16)
+    order = np.argsort(keys, kind='stable')
+    sorted_pos = order + lo
+    targets = np.flatnonzero(sorted_pos >= start)
+    # Глубина цепочки в окне: сколько предшественников с тем же ключом не дальше WINDOW_SIZE
+    combined = keys[order].astype(np.int64) << 32 | sorted_pos
+    first = np.searchsorted(combined, combined[targets] - WINDOW_SIZE)
+    depth = np.minimum(targets - first, max_chain)
+    pos = sorted_pos[targets]
+    limit = np.minimum(max_length, end - pos)
+    cap = np.minimum(limit, nice_length)
+    best = np.zeros(len(targets), dtype=np.int64)
+    dist = np.zeros(len(targets), dtype=np.int64)
+    words = _words(a)
+
+    # Состояние активных позиций держится в сжатых массивах, чтобы не собирать его на каждом шаге
+    lane = np.flatnonzero(depth > 0)
+    slot, here, lane_depth, lane_cap = targets[lane], pos[lane], depth[lane], cap[lane]
+    known = np.zeros(len(lane), dtype=np.int64)
+    for k in range(1, max_chain + 1):
+        if not lane.size:
+            break
+        candidate = sorted_pos[slot - k]
+        # Кандидат интересен, только если совпадает и на байте, которым он длиннее найденного
+        useful = a[candidate + known] == a[here + known]
+        if min_distance > 1:
+            useful &= here - candidate >= min_distance
+        chosen = np.flatnonzero(useful)
+        if chosen.size:
+            length = _common_length(words, here[chosen], candidate[chosen], MIN_MATCH, lane_cap[chosen])
+            better = length > known[chosen]
+            chosen = chosen[better]
+            known[chosen] = length[better]
+            dist[lane[chosen]] = here[chosen] - candidate[chosen]
+        keep = (known < lane_cap) & (lane_depth > k)
+        best[lane[~keep]] = known[~keep]
+        lane, slot, here, lane_depth, lane_cap, known = (
+            lane[keep], slot[keep], here[keep], lane_depth[keep], lane_cap[keep], known[keep])
+
+    # Совпадения, обрезанные на nice_length, продлеваются на том же расстоянии
+    extend = np.flatnonzero((best >= nice_length) & (best < limit))
+    for distance in np.unique(dist[extend]):
+        selected = extend[dist[extend] == distance]
+        first = int(pos[selected].min())
+        stop = min(end, int(pos[selected].max()) + max_length)
+        span = np.arange(stop - first)
+        mismatch = np.where(a[first:stop] == a[first - distance:stop - distance], len(span), span)
+        next_mismatch = np.minimum.accumulate(mismatch[::-1])[::-1]
+        offsets = pos[selected] - first
+        best[selected] = np.minimum(next_mismatch[offsets] - offsets, limit[selected])
+
+    found = best >= MIN_MATCH
+    lengths[pos[found] - start] = best[found]
+    distances[pos[found] - start] = dist[found]
+    return lengths.tolist(), distances.tolist()
+
+
+def optimal_parse(fmt, lengths):
+    """
+    Разбор минимальной длины по найденным длинам совпадений.
+    Возвращает для каждой позиции длину выбранного элемента (0 — байт как есть).
+
+    Ссылки длиной до SHORT_MATCH[fmt] стоят одинаково, поэтому из них берётся
+    самая длинная среди ведущих к наименьшей стоимости остатка; длиннее —
+    только границы диапазонов стоимости и максимальная длина
+    """
+    count = len(lengths)
+    cost = [0] * (count + 1)
+    choice = [0] * count
+    short = SHORT_MATCH[fmt]
+    short_bits = match_bits(fmt, MIN_MATCH)
+    borders = [n for n in (short + 1, short + 2, 0x110, 0x111) if n > short]
+    for i in range(count - 1, -1, -1):
+        best_cost = cost[i + 1] + LITERAL_BITS
+        longest = lengths[i]
+        if longest < MIN_MATCH:
+            cost[i] = best_cost
+            continue
+        best_length = 0
+        top = longest if longest < short else short
+        window = cost[i + MIN_MATCH:i + top + 1]
+        low = min(window)
+        if low + short_bits <= best_cost:
+            best_cost = low + short_bits
+            # Из равных — самая длинная ссылка
+            best_length = top if window[-1] == low else top - window[::-1].index(low)
+        if longest > short:
+            for length in borders + [longest]:
+                if length <= longest:
+                    value = cost[i + length] + match_bits(fmt, length)
+                    if value <= best_cost:
+                        best_cost, best_length = value, length
+        cost[i] = best_cost
+        choice[i] = best_length
+    return choice
+
+
+class _TokenWriter:
+    """Группировка элементов по восемь с байтом флагов"""
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.out = bytearray()
+        self.group = bytearray()
+        self.flags = 0
+        self.count = 0
+
+    def _next(self, is_match):
+        self.flags = self.flags << 1 | is_match
+        self.count += 1
+        if self.count == 8:
+            self.out.append(self.flags)
+            self.out += self.group
+            self.group.clear()
+            self.flags = self.count = 0
+
+    def literal(self, byte):
+        self.group.append(byte)
+        self._next(0)
+
+    def match(self, length, distance):
+        d = distance - 1
+        if self.fmt == LZ10:
+            self.group += bytes(((length - 3) << 4 | d >> 8, d & 0xFF))
+        elif length <= 16:
+            self.group += bytes(((length - 1) << 4 | d >> 8, d & 0xFF))
+        elif length <= 0x110:
+            n = length - 0x11
+            self.group += bytes((n >> 4, (n & 0xF) << 4 | d >> 8, d & 0xFF))
+        else:
+            n = length - 0x111
+            self.group += bytes((0x10 | n >> 12, (n >> 4) & 0xFF, (n & 0xF) << 4 | d >> 8, d & 0xFF))
+        self._next(1)
+
+    def take(self):
+        """Готовые группы"""
+        output = bytes(self.out)
+        self.out.clear()
+        return output
+
+    def flush(self):
+        """Последняя неполная группа (флаги прижаты к старшим битам)"""
+        if self.count:
+            self.out.append(self.flags << (8 - self.count))
+            self.out += self.group
+            self.group.clear()
+            self.flags = self.count = 0
+        return self.take()
+
+
+def compress_header(fmt, size):
+    if size <= MAX_SIZE_24 and (size or fmt == LZ10):
+        return bytes((fmt,)) + size.to_bytes(3, 'little')
+    if fmt == LZ11:
+        return bytes((fmt, 0, 0, 0)) + size.to_bytes(4, 'little')
+    raise LZError(f"LZ10 не поддерживает размер {size} байт")
+
+
+def iter_compress(chunks, size, fmt=LZ10, min_distance=DEFAULT_MIN_DISTANCE, max_chain=MAX_CHAIN):
+    """
+    Потоковое сжатие: chunks — части исходных данных общей длиной size (она нужна
+    для заголовка). Возвращает генератор частей сжатых данных
+    """
+    if fmt not in MAX_MATCH:
+        raise LZError(f"Неизвестный тип сжатия 0x{fmt:02X}")
+    header = compress_header(fmt, size)
+    yield header
+    written = len(header)
+    writer = _TokenWriter(fmt)
+    history = b''
+    buffer = bytearray()
+    total = 0
+    chunks = iter(chunks)
+    finished = False
+    while not finished:
+        for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= BLOCK_SIZE:
+                break
+        else:
+            finished = True
+        while len(buffer) >= BLOCK_SIZE or (finished and buffer):
+            block = bytes(buffer[:BLOCK_SIZE])
+            del buffer[:BLOCK_SIZE]
+            buf = history + block
+            start = len(history)
+            lengths, distances = find_matches(buf, start, len(buf), MAX_MATCH[fmt], min_distance, max_chain)
+            choice = optimal_parse(fmt, lengths)
+            i = 0
+            while i < len(block):
+                length = choice[i]
+                if length:
+                    writer.match(length, distances[i])
+                    i += length
+                else:
+                    writer.literal(block[i])
+                    i += 1
+            total += len(block)
+            history = buf[-WINDOW_SIZE:]
+            output = writer.take()
+            if output:
+                written += len(output)
+                yield output
+    if total != size:
+        raise LZError(f"Объявлено {size} байт, получено {total}")
+    tail = writer.flush()
+    # Выравнивание до 4 байт, как в файлах игры
+    yield tail + b'\x00' * (-(written + len(tail)) % 4)
+
+
+def compress(data, fmt=LZ10, min_distance=DEFAULT_MIN_DISTANCE, max_chain=MAX_CHAIN, verify=False):
+    """Сжимает данные целиком; verify=True — распаковывает результат и сверяет с исходными"""
+    data = bytes(data)
+    compressed = b''.join(iter_compress([data], len(data), fmt, min_distance, max_chain))
+    if verify and decompress(compressed) != data:
+        raise LZError("Проверка не пройдена: распакованные данные отличаются от исходных")
+    return compressed
+
+
+# --- Пакетная обработка ---
+
+def probe(data):
+    """
+    Тип сжатия, если данные действительно сжаты LZ10/LZ11 (распаковываются
+    и заканчиваются не дальше MAX_PADDING байт от конца файла), иначе None
+    """
+    fmt = detect(data)
+    if fmt is None or int.from_bytes(data[1:4], 'little') == 0 and fmt == LZ10:
+        return None
+    decompressor = Decompressor()
+    try:
+        decompressor.feed(data)
+    except LZError:
+        return None
+    if not decompressor.eof or len(decompressor.unused_data) > MAX_PADDING:
+        return None
+    return fmt
+
+
+def _unpack_one(task):
+    src, dst = task
+    with open(src, 'rb') as f:
+        data = f.read()
+    fmt = probe(data)
+    if fmt is None:
+        return src, None, None
+    try:
+        raw = decompress(data)
+        os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+        with open(dst, 'wb') as f:
+            f.write(raw)
+    except (OSError, LZError) as e:
+        return src, fmt, str(e)
+    return src, fmt, None
+
+
+def _pack_one(task):
+    src, dst, fmt = task
+    size = 0
+    try:
+        with open(src, 'rb') as f:
+            data = f.read()
+        size = len(data)
+        compressed = compress(data, fmt, verify=True)
+        os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+        with open(dst, 'wb') as f:
+            f.write(compressed)
+    except (OSError, LZError) as e:
+        return src, size, 0, str(e)
+    return src, size, len(compressed), None
+
+
+def run_pool(function, tasks, workers=None):
+    """Выполняет задания в пуле процессов (при одном задании или workers=1 — в этом процессе)"""
+    if workers == 1 or len(tasks) < 2:
+        return [function(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, tasks, chunksize=4))
+
+
+def list_files(root):
+    found = []
+    for directory, _, files in os.walk(root):
+        found += [os.path.join(directory, name) for name in files if name != MANIFEST_NAME]
+    return sorted(found)
+
+
+def unpack_tree(source, out_dir, workers=None):
+    """
+    Распаковывает все сжатые LZ10/LZ11 файлы каталога в out_dir (те же относительные пути)
+    и записывает манифест {путь: "lz10" | "lz11"}. Возвращает (манифест, ошибки)
+    """
+    tasks = [(path, os.path.join(out_dir, os.path.relpath(path, source))) for path in list_files(source)]
+    manifest, errors = {}, []
+    for src, fmt, error in run_pool(_unpack_one, tasks, workers):
+        rel = os.path.relpath(src, source).replace(os.sep, '/')
+        if error:
+            errors.append((rel, error))
+        elif fmt is not None:
+            manifest[rel] = 'lz10' if fmt == LZ10 else 'lz11'
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest, errors
+
+
+def pack_tree(source, out_dir, workers=None):
+    """
+    Сжимает файлы из манифеста каталога source (результат unpack_tree) в out_dir,
+    проверяя каждый распаковкой. Возвращает список (путь, размер, сжатый размер, ошибка)
+    """
+    with open(os.path.join(source, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    tasks = [(os.path.join(source, *rel.split('/')), os.path.join(out_dir, *rel.split('/')),
+              LZ10 if fmt == 'lz10' else LZ11) for rel, fmt in sorted(manifest.items())]
+    return run_pool(_pack_one, tasks, workers)
+
+
+def main():
+    if len(sys.argv) < 4 or sys.argv[1] not in ('unpack', 'pack', 'compress', 'decompress'):
+        print(f"Использование: python {sys.argv[0]} unpack <каталог> <выходной каталог> [--jobs N]")
+        print(f"               python {sys.argv[0]} pack <распакованный каталог> <выходной каталог> [--jobs N]")
+        print(f"               python {sys.argv[0]} compress <файл> <выход> [--lz10 | --lz11]")
+        print(f"               python {sys.argv[0]} decompress <файл> <выход>")
+        print(f"")
+        print(f"unpack находит сжатые файлы и записывает в выходной каталог {MANIFEST_NAME},")
+        print(f"pack сжимает их обратно тем же типом и сверяет каждый результат распаковкой.")
+        sys.exit(1)
+
+    command, source, target = sys.argv[1:4]
+    workers = None
+    fmt = LZ10
+    args = iter(sys.argv[4:])
+    for arg in args:
+        if arg == '--lz10':
+            fmt = LZ10
+        elif arg == '--lz11':
+            fmt = LZ11
+        elif arg == '--jobs':
+            try:
+                workers = int(next(args, ''))
+            except ValueError:
+                print("ОШИБКА: Параметр --jobs требует целое число.")
+                sys.exit(1)
+            if workers < 1:
+                print("ОШИБКА: Параметр --jobs должен быть не меньше 1.")
+                sys.exit(1)
+
+    if not os.path.exists(source):
+        print(f"ОШИБКА: '{source}' не найден.")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    if command in ('compress', 'decompress'):
+        try:
+            with open(source, 'rb') as f:
+                data = f.read()
+            output = compress(data, fmt, verify=True) if command == 'compress' else decompress(data)
+            os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(output)
+        except (OSError, LZError) as e:
+            print(f"ОШИБКА: {e}")
+            sys.exit(1)
+        print(f"✓ {source} ({len(data)} байт) → {target} ({len(output)} байт) "
+              f"за {time.perf_counter() - started:.2f} с")
+        return
+
+    if not os.path.isdir(source):
+        print(f"ОШИБКА: '{source}' не является каталогом.")
+        sys.exit(1)
+
+    if command == 'unpack':
+        manifest, errors = unpack_tree(source, target, workers)
+        for rel, error in errors:
+            print(f"✗ {rel}: {error}")
+        lz11 = sum(1 for fmt in manifest.values() if fmt == 'lz11')
+        print(f"✅ Распаковано {len(manifest)} сжатых файлов (LZ10: {len(manifest) - lz11}, LZ11: {lz11}) → {target} "
+              f"за {time.perf_counter() - started:.2f} с")
+    else:
+        if not os.path.exists(os.path.join(source, MANIFEST_NAME)):
+            print(f"ОШИБКА: В '{source}' нет {MANIFEST_NAME} (создаётся командой unpack).")
+            sys.exit(1)
+        results = pack_tree(source, target, workers)
+        errors = [(path, error) for path, _, _, error in results if error]
+        for path, error in errors:
+            print(f"✗ {path}: {error}")
+        raw = sum(size for _, size, _, error in results if not error)
+        packed = sum(size for _, _, size, error in results if not error)
+        print(f"✅ Сжато {len(results) - len(errors)} из {len(results)} файлов: {raw} → {packed} байт, "
+              f"проверено распаковкой, за {time.perf_counter() - started:.2f} с")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
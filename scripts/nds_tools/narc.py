@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Чтение и сборка архивов NARC (BTAF / BTNF / GMIF)
+
+Архив разбирается поверх любого буфера: файл отображается в память
+(load_narc), а архив внутри образа можно открыть прямо из
+NDSRom.file() без копирования. Таблица размещения BTAF разбирается при
+открытии, таблица имён BTNF (формат FNT, как в образе) — при первом
+обращении; файлы архива отдаются как memoryview.
+
+Новый архив пишется так же, как образ в nds_rom.py: участки между
+неизменёнными файлами копируются из исходного архива целыми кусками,
+заменённые файлы вставляются на свои места, а если новый файл длиннее
+старого — следующие сдвигаются (с выравниванием NARC_ALIGN). Без замен
+архив совпадает с исходным побайтно.
+
+Запуск из корня репозитория:
+
+    python scripts/nds_tools/narc.py info <архив.narc>
+    python scripts/nds_tools/narc.py unpack <архив.narc> <каталог>
+    python scripts/nds_tools/narc.py pack <архив.narc> <новый.narc> [--dir <каталог>] [--replace <имя>=<файл>] ...
+"""
+
+import io
+import mmap
+import os
+import struct
+import sys
+
+from nds_rom import _copy, _write_file, walk_fnt
+
+NARC_MAGIC = b'NARC'
+BTAF_MAGIC = b'BTAF'
+BTNF_MAGIC = b'BTNF'
+GMIF_MAGIC = b'GMIF'
+NARC_BOM = 0xFFFE
+NARC_HEADER = struct.Struct('<4sHHIHH')
+SECTION_HEADER = struct.Struct('<4sI')
+FAT_ENTRY = struct.Struct('<II')
+BTAF_HEADER_SIZE = 12
+NARC_ALIGN = 4
+PADDING_BYTE = 0xFF
+
+
+class NARCError(Exception):
+    """Ошибка разбора или сборки архива NARC"""
+
+
+def align(value, alignment=NARC_ALIGN):
+    return (value + alignment - 1) // alignment * alignment
+
+
+class NARC:
+    """
+    Архив NARC поверх буфера (bytes, mmap или memoryview).
+
+    files    — список (начало, конец) из BTAF, смещения относительно данных GMIF
+    sections — {сигнатура: (смещение, размер)} секций по порядку в файле
+    paths    — путь → индекс файла (пустой словарь, если имён в архиве нет)
+    """
+
+    def __init__(self, data, name='<буфер>'):
+        self.name = name
+        self.view = memoryview(data)
+        self.size = len(self.view)
+        self._owner = None
+        self._paths = None
+        try:
+            self._parse()
+        except NARCError:
+            self.view.release()
+            raise
+
+    def _parse(self):
+        name = self.name
+        if self.size < NARC_HEADER.size:
+            raise NARCError(f"'{name}' слишком мал для архива NARC")
+
+        magic, bom, self.version, file_size, header_size, count = NARC_HEADER.unpack_from(self.view, 0)
+        if magic != NARC_MAGIC or bom != NARC_BOM:
+            raise NARCError(f"'{name}' не является архивом NARC")
+        if file_size > self.size:
+            raise NARCError(f"'{name}' обрезан: в заголовке {file_size} байт, в файле {self.size}")
+
+        self.sections = {}
+        offset = header_size
+        for _ in range(count):
+            if offset + SECTION_HEADER.size > file_size:
+                raise NARCError(f"Секция {len(self.sections) + 1} выходит за границы архива")
+            section_magic, section_size = SECTION_HEADER.unpack_from(self.view, offset)
+            if section_size < SECTION_HEADER.size or offset + section_size > file_size:
+                raise NARCError(f"Секция {section_magic!r}: неверный размер {section_size}")
+            self.sections[section_magic] = (offset, section_size)
+            offset += section_size
+        for required in (BTAF_MAGIC, BTNF_MAGIC, GMIF_MAGIC):
+            if required not in self.sections:
+                raise NARCError(f"В архиве нет секции {required.decode()}")
+
+        btaf_offset, btaf_size = self.sections[BTAF_MAGIC]
+        num_files = struct.unpack_from('<H', self.view, btaf_offset + SECTION_HEADER.size)[0]
+        if BTAF_HEADER_SIZE + num_files * FAT_ENTRY.size > btaf_size:
+            raise NARCError(f"BTAF: {num_files} записей не помещаются в секцию")
+        self.files = [FAT_ENTRY.unpack_from(self.view, btaf_offset + BTAF_HEADER_SIZE + i * FAT_ENTRY.size)
+                      for i in range(num_files)]
+
+        gmif_offset, gmif_size = self.sections[GMIF_MAGIC]
+        self.data_offset = gmif_offset + SECTION_HEADER.size
+        self.data_size = gmif_size - SECTION_HEADER.size
+        for index, (start, end) in enumerate(self.files):
+            if start > end or end > self.data_size:
+                raise NARCError(f"Файл {index}: запись BTAF {start:#x}..{end:#x} выходит за границы GMIF")
+
+    def close(self):
+        self.view.release()
+        if self._owner is not None:
+            mapping, handle = self._owner
+            mapping.close()
+            handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.files)
+
+    # --- BTNF ---
+
+    @property
+    def paths(self):
+        if self._paths is None:
+            offset, size = self.sections[BTNF_MAGIC]
+            fnt = self.view[offset + SECTION_HEADER.size:offset + size]
+            self._paths = dict(walk_fnt(fnt))
+            fnt.release()
+        return self._paths
+
+    def names(self):
+        """Имя каждого файла по индексу; для безымянных — <индекс>.bin"""
+        by_index = {index: path for path, index in self.paths.items()}
+        return [by_index.get(index, f"{index:04d}.bin") for index in range(len(self.files))]
+
+    def member_id(self, name):
+        """Индекс по пути, по имени файла (если оно уникально) или по номеру"""
+        name = name.replace('\\', '/').lstrip('/')
+        if name in self.paths:
+            return self.paths[name]
+        matches = [index for path, index in self.paths.items() if path.rsplit('/', 1)[-1] == name]
+        if len(matches) == 1:
+            return matches[0]
+        if matches:
+            raise NARCError(f"Имя '{name}' встречается в архиве {len(matches)} раз, укажите полный путь")
+        stem = name[:-4] if name.endswith('.bin') else name
+        if stem.isdigit() and int(stem) < len(self.files):
+            return int(stem)
+        raise NARCError(f"Файл '{name}' не найден в архиве")
+
+    # --- Содержимое ---
+
+    def member(self, index):
+        """memoryview содержимого файла (без копирования)"""
+        start, end = self.files[index]
+        return self.view[self.data_offset + start:self.data_offset + end]
+
+    def unpack(self, out_dir):
+        """Распаковывает файлы архива по именам из BTNF. Возвращает число записанных файлов"""
+        for index, name in enumerate(self.names()):
+            data = self.member(index)
+            _write_file(os.path.join(out_dir, *name.split('/')), data)
+            data.release()
+        return len(self.files)
+
+    def changed_members(self, extracted_dir):
+        """Замены по распакованному каталогу: файлы, отличающиеся от архива. Возвращает {индекс: байты}"""
+        changed = {}
+        for index, name in enumerate(self.names()):
+            path = os.path.join(extracted_dir, *name.split('/'))
+            if not os.path.exists(path):
+                continue
+            original = self.member(index)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data != original:
+                changed[index] = data
+            original.release()
+        return changed
+
+    # --- Сборка ---
+
+    def _layout(self, replacements):
+        """
+        Раскладка данных GMIF с заменами: список кусков (смещение, конец) исходных данных
+        или bytes и новые (начало, конец) файлов. Соседние исходные куски сливаются,
+        так что неизменённые участки копируются одним блоком
+        """
+        order = sorted(range(len(self.files)), key=lambda index: self.files[index])
+        positions = list(self.files)
+        pieces = []
+        delta = 0
+        out_pos = prev_end = 0
+
+        def original(start, end):
+            if start == end:
+                return
+            if pieces and not isinstance(pieces[-1], bytes) and pieces[-1][1] == start:
+                pieces[-1] = (pieces[-1][0], end)
+            else:
+                pieces.append((start, end))
+
+        for i, index in enumerate(order):
+            start, end = self.files[index]
+            new_start = start + delta
+            if new_start < out_pos:
+                raise NARCError(f"Файлы архива перекрываются около {start:#x}")
+            # Промежуток: исходные байты, если он не изменился, иначе заполнитель
+            gap = new_start - out_pos
+            if gap == start - prev_end:
+                original(prev_end, start)
+            elif gap:
+                pieces.append(bytes([PADDING_BYTE]) * gap)
+
+            if index in replacements:
+                data = bytes(replacements[index])
+                if data:
+                    pieces.append(data)
+                size = len(data)
+            else:
+                original(start, end)
+                size = end - start
+            positions[index] = (new_start, new_start + size)
+            out_pos = new_start + size
+            prev_end = end
+
+            # Файл вырос и не помещается до следующего — сдвигаем остальные
+            next_start = self.files[order[i + 1]][0] if i + 1 < len(order) else None
+            if next_start is not None and out_pos > next_start + delta:
+                delta += align(out_pos - (next_start + delta))
+
+        if delta == 0 and out_pos <= prev_end:
+            if out_pos < prev_end:
+                pieces.append(bytes([PADDING_BYTE]) * (prev_end - out_pos))
+            original(prev_end, self.data_size)
+        else:
+            pieces.append(bytes([PADDING_BYTE]) * (align(out_pos) - out_pos))
+        return pieces, positions
+
+    def write(self, out, replacements=None):
+        """
+        Пишет архив в открытый двоичный файл, заменяя файлы {индекс: байты}.
+        Возвращает число сдвинутых файлов
+        """
+        replacements = replacements or {}
+        for index in replacements:
+            if not 0 <= index < len(self.files):
+                raise NARCError(f"В архиве нет файла {index}")
+        pieces, positions = self._layout(replacements)
+        data_size = sum(len(piece) if isinstance(piece, bytes) else piece[1] - piece[0] for piece in pieces)
+
+        sizes = {magic: size for magic, (_, size) in self.sections.items()}
+        sizes[GMIF_MAGIC] = SECTION_HEADER.size + data_size
+        header_size = NARC_HEADER.unpack_from(self.view, 0)[4]
+        file_size = header_size + sum(sizes.values())
+
+        header = bytearray(self.view[0:header_size])
+        struct.pack_into('<I', header, 8, file_size)
+        out.write(header)
+        for magic, (offset, size) in self.sections.items():
+            if magic == BTAF_MAGIC:
+                btaf = bytearray(self.view[offset:offset + size])
+                for index, entry in enumerate(positions):
+                    FAT_ENTRY.pack_into(btaf, BTAF_HEADER_SIZE + index * FAT_ENTRY.size, *entry)
+                out.write(btaf)
+            elif magic == GMIF_MAGIC:
+                out.write(SECTION_HEADER.pack(GMIF_MAGIC, sizes[GMIF_MAGIC]))
+                for piece in pieces:
+                    if isinstance(piece, bytes):
+                        out.write(piece)
+                    else:
+                        _copy(out, self.view[self.data_offset + piece[0]:self.data_offset + piece[1]])
+            else:
+                _copy(out, self.view[offset:offset + size])
+        return sum(1 for old, new in zip(self.files, positions) if old[0] != new[0])
+
+    def build(self, replacements=None):
+        """Новый архив в памяти (например, для замены внутри образа через NDSRom.write)"""
+        out = io.BytesIO()
+        self.write(out, replacements)
+        return out.getvalue()
+
+    def save(self, out_path, replacements=None):
+        """Пишет архив в файл через временный файл. Возвращает число сдвинутых файлов"""
+        tmp_path = f"{out_path}.tmp{os.getpid()}"
+        try:
+            with open(tmp_path, 'wb') as out:
+                moved = self.write(out, replacements)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, out_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return moved
+
+
+def load_narc(path):
+    """Архив из файла, отображённого в память"""
+    handle = open(path, 'rb')
+    try:
+        mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        handle.close()
+        raise NARCError(f"Файл '{path}' пуст")
+    try:
+        narc = NARC(mapping, path)
+    except NARCError:
+        mapping.close()
+        handle.close()
+        raise
+    narc._owner = (mapping, handle)
+    return narc
+
+
+def main():
+    usage = (
+        f"Использование:\n"
+        f"  python {sys.argv[0]} info <архив.narc>\n"
+        f"  python {sys.argv[0]} unpack <архив.narc> <каталог>\n"
+        f"  python {sys.argv[0]} pack <архив.narc> <новый.narc> [--dir <каталог>] [--replace <имя>=<файл>] ...\n"
+        f"\n"
+        f"Имя файла — путь из таблицы имён архива или номер (для архивов без имён)."
+    )
+    if len(sys.argv) < 3 or sys.argv[1] not in ('info', 'unpack', 'pack'):
+        print(usage)
+        sys.exit(1)
+
+    command, narc_path = sys.argv[1], sys.argv[2]
+    if not os.path.exists(narc_path):
+        print(f"ОШИБКА: Файл '{narc_path}' не найден.")
+        sys.exit(1)
+
+    try:
+        with load_narc(narc_path) as narc:
+            if command == 'info':
+                print(f"🗂 {narc_path}: {narc.size} байт, файлов {len(narc)}, с именами {len(narc.paths)}")
+                for index, name in enumerate(narc.names()):
+                    start, end = narc.files[index]
+                    print(f"  {index:4d}  {start:#010x}  {end - start:8d} байт  {name}")
+
+            elif command == 'unpack':
+                if len(sys.argv) < 4:
+                    print(usage)
+                    sys.exit(1)
+                count = narc.unpack(sys.argv[3])
+                print(f"✓ Распаковано файлов: {count} → {sys.argv[3]}")
+
+            else:
+                if len(sys.argv) < 4:
+                    print(usage)
+                    sys.exit(1)
+                out_path = sys.argv[3]
+                replacements = {}
+                args = iter(sys.argv[4:])
+                for arg in args:
+                    if arg == '--dir':
+                        replacements.update(narc.changed_members(next(args, '')))
+                    elif arg == '--replace':
+                        name, _, source = next(args, '').partition('=')
+                        if not source:
+                            print("ОШИБКА: --replace ожидает <имя в архиве>=<файл>.")
+                            sys.exit(1)
+                        with open(source, 'rb') as f:
+                            replacements[narc.member_id(name)] = f.read()
+
+                names = narc.names()
+                for index, data in sorted(replacements.items()):
+                    start, end = narc.files[index]
+                    print(f"  ↻ {names[index]}: {end - start} → {len(data)} байт")
+                moved = narc.save(out_path, replacements)
+                print(f"✓ Записан {out_path}: заменено файлов {len(replacements)}, сдвинуто файлов {moved}")
+    except (OSError, NARCError) as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
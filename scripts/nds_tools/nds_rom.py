@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+Распаковка и сборка NDS образа без ndstool
+
+Образ отображается в память (mmap), заголовок, FNT и FAT разбираются
+при открытии, а файлы отдаются как memoryview поверх отображения без
+копирования. Новый образ пишется одним последовательным проходом:
+неизменённые участки копируются из исходного образа, заменённые файлы
+вставляются на свои места. Заменять можно и участки вне FAT —
+arm9.bin, arm7.bin, y9.bin, y7.bin, banner.bin и header.bin. Если новый
+файл длиннее старого, все следующие данные (включая хвост образа после
+последнего участка) сдвигаются с выравниванием ROM_ALIGN, после чего
+переписываются FAT, указатели и размеры в заголовке и CRC заголовка.
+
+Раскладка распаковки совпадает с `ndstool -x`: arm9.bin, arm7.bin,
+y9.bin, y7.bin, banner.bin, header.bin, data/ и overlay/.
+"""
+
+import mmap
+import os
+import struct
+import sys
+
+HEADER_SIZE = 0x200
+HEADER_CRC_OFFSET = 0x15E
+ROM_ALIGN = 0x200
+PADDING_BYTE = 0xFF
+CHIP_SIZE_BASE = 0x20000
+COPY_CHUNK = 1 << 20
+
+# Метка в конце ARM9, которую ndstool извлекает вместе с бинарником
+NITROCODE = 0xDEC00621
+NITROCODE_FOOTER_SIZE = 12
+
+OVERLAY_ENTRY_SIZE = 32
+FAT_ENTRY = struct.Struct('<II')
+FNT_DIR_ENTRY = struct.Struct('<IHH')
+FNT_DIR_ID_BASE = 0xF000
+
+BANNER_SIZES = {0x0001: 0x840, 0x0002: 0x940, 0x0003: 0xA40, 0x0103: 0x23C0}
+DEFAULT_BANNER_SIZE = 0x840
+
+# Указатели заголовка: (смещение поля, смещение поля размера или None)
+HEADER_REGIONS = {
+    'arm9': (0x20, 0x2C),
+    'arm7': (0x30, 0x3C),
+    'fnt': (0x40, 0x44),
+    'fat': (0x48, 0x4C),
+    'arm9_overlays': (0x50, 0x54),
+    'arm7_overlays': (0x58, 0x5C),
+    'banner': (0x68, None),
+}
+# Файлы распаковки, которые соответствуют участкам образа вне FAT
+REGION_FILES = {
+    'arm9.bin': 'arm9',
+    'arm7.bin': 'arm7',
+    'y9.bin': 'arm9_overlays',
+    'y7.bin': 'arm7_overlays',
+    'banner.bin': 'banner',
+    'header.bin': 'header',
+}
+USED_SIZE_OFFSET = 0x80
+CHIP_SIZE_OFFSET = 0x14
+
+
+class NDSError(Exception):
+    """Ошибка разбора или сборки NDS образа"""
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC-16 заголовка NDS (полином 0xA001, как в BIOS)"""
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def walk_fnt(fnt):
+    """
+    Пары (путь, идентификатор файла) обходом таблицы имён FNT
+    (тот же формат в образе и в секции BTNF архивов NARC)
+    """
+    stack = [(FNT_DIR_ID_BASE, '')]
+    while stack:
+        dir_id, prefix = stack.pop()
+        sub_offset, file_id, _ = FNT_DIR_ENTRY.unpack_from(fnt, (dir_id - FNT_DIR_ID_BASE) * FNT_DIR_ENTRY.size)
+        pos = sub_offset
+        while True:
+            length = fnt[pos]
+            pos += 1
+            if length == 0:
+                break
+            name = bytes(fnt[pos:pos + (length & 0x7F)]).decode('shift_jis', 'replace')
+            pos += length & 0x7F
+            if length & 0x80:
+                child_id = struct.unpack_from('<H', fnt, pos)[0]
+                pos += 2
+                stack.append((child_id, prefix + name + '/'))
+            else:
+                yield prefix + name, file_id
+                file_id += 1
+
+
+def align(value, alignment=ROM_ALIGN):
+    return (value + alignment - 1) // alignment * alignment
+
+
+class NDSRom:
+    """
+    NDS образ, отображённый в память.
+
+    files  — список (начало, конец) из FAT по идентификаторам файлов
+    paths  — путь внутри data/ → идентификатор файла (разбирается при первом обращении)
+    Оверлеи не входят в FNT, их идентификаторы берутся из таблиц оверлеев
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise NDSError(f"Файл '{path}' пуст")
+        self.view = memoryview(self._mmap)
+        self.size = len(self.view)
+        if self.size < HEADER_SIZE:
+            self.close()
+            raise NDSError(f"Файл '{path}' слишком мал для NDS образа")
+
+        self.title = bytes(self.view[0:12]).rstrip(b'\0').decode('ascii', 'replace')
+        self.game_code = bytes(self.view[12:16]).decode('ascii', 'replace')
+        self.regions = {}
+        for name, (offset_field, size_field) in HEADER_REGIONS.items():
+            offset = self._u32(offset_field)
+            size = self._u32(size_field) if size_field is not None else self._banner_size(offset)
+            self.regions[name] = (offset, size)
+        self.used_size = self._u32(USED_SIZE_OFFSET)
+
+        fat_offset, fat_size = self.regions['fat']
+        if fat_offset + fat_size > self.size:
+            self.close()
+            raise NDSError("FAT выходит за границы образа")
+        self.files = [FAT_ENTRY.unpack_from(self.view, fat_offset + i * FAT_ENTRY.size)
+                      for i in range(fat_size // FAT_ENTRY.size)]
+        self._paths = None
+
+    def _u32(self, offset):
+        return struct.unpack_from('<I', self.view, offset)[0]
+
+    def _banner_size(self, offset):
+        if not offset or offset + 2 > self.size:
+            return 0
+        version = struct.unpack_from('<H', self.view, offset)[0]
+        return BANNER_SIZES.get(version, DEFAULT_BANNER_SIZE)
+
+    def close(self):
+        self.view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- FNT ---
+
+    @property
+    def paths(self):
+        if self._paths is None:
+            self._paths = dict(self._walk_fnt())
+        return self._paths
+
+    def _walk_fnt(self):
+        """Пары (путь, идентификатор файла) обходом таблицы имён"""
+        fnt_offset, fnt_size = self.regions['fnt']
+        fnt = self.view[fnt_offset:fnt_offset + fnt_size]
+        yield from walk_fnt(fnt)
+        fnt.release()
+
+    def file_id(self, name):
+        """Идентификатор по пути внутри data/ или по имени файла, если оно уникально"""
+        name = name.replace('\\', '/').lstrip('/')
+        if name.startswith('data/'):
+            name = name[5:]
+        if name in self.paths:
+            return self.paths[name]
+        matches = [file_id for path, file_id in self.paths.items() if path.rsplit('/', 1)[-1] == name]
+        if len(matches) == 1:
+            return matches[0]
+        if matches:
+            raise NDSError(f"Имя '{name}' встречается в образе {len(matches)} раз, укажите полный путь")
+        raise NDSError(f"Файл '{name}' не найден в образе")
+
+    # --- Содержимое ---
+
+    def file(self, file_id):
+        """memoryview содержимого файла (без копирования)"""
+        start, end = self.files[file_id]
+        if start > end or end > self.size:
+            raise NDSError(f"Файл {file_id}: запись FAT {start:#x}..{end:#x} выходит за границы образа")
+        return self.view[start:end]
+
+    def region(self, name):
+        offset, size = self.regions[name]
+        return self.view[offset:offset + size]
+
+    def arm9_with_footer(self):
+        """ARM9 вместе с 12-байтовой меткой nitrocode, если она есть (как извлекает ndstool)"""
+        offset, size = self.regions['arm9']
+        if offset + size + NITROCODE_FOOTER_SIZE <= self.size and self._u32(offset + size) == NITROCODE:
+            size += NITROCODE_FOOTER_SIZE
+        return self.view[offset:offset + size]
+
+    def overlays(self, name='arm9_overlays'):
+        """Идентификаторы файлов оверлеев из таблицы оверлеев"""
+        table = self.region(name)
+        ids = [struct.unpack_from('<I', table, pos + 24)[0]
+               for pos in range(0, len(table) - OVERLAY_ENTRY_SIZE + 1, OVERLAY_ENTRY_SIZE)]
+        table.release()
+        return ids
+
+    # --- Распаковка ---
+
+    def unpack(self, out_dir):
+        """Распаковывает образ в раскладке ndstool -x. Возвращает число записанных файлов"""
+        os.makedirs(out_dir, exist_ok=True)
+        parts = {
+            'header.bin': self.view[0:HEADER_SIZE],
+            'arm9.bin': self.arm9_with_footer(),
+            'arm7.bin': self.region('arm7'),
+            'y9.bin': self.region('arm9_overlays'),
+            'y7.bin': self.region('arm7_overlays'),
+            'banner.bin': self.region('banner'),
+        }
+        for name, data in parts.items():
+            _write_file(os.path.join(out_dir, name), data)
+            data.release()
+        count = len(parts)
+
+        for table in ('arm9_overlays', 'arm7_overlays'):
+            for file_id in self.overlays(table):
+                data = self.file(file_id)
+                _write_file(os.path.join(out_dir, 'overlay', f"overlay_{file_id:04d}.bin"), data)
+                data.release()
+                count += 1
+
+        for path, file_id in self.paths.items():
+            data = self.file(file_id)
+            _write_file(os.path.join(out_dir, 'data', *path.split('/')), data)
+            data.release()
+            count += 1
+        return count
+
+    # --- Сборка ---
+
+    def _segments(self):
+        """Участки образа по возрастанию смещения: ('region', имя) или ('file', id)"""
+        segments = []
+        for name, (offset, size) in self.regions.items():
+            if offset and size:
+                if name == 'arm9':
+                    size = len(self.arm9_with_footer())
+                segments.append((offset, offset + size, ('region', name)))
+        for file_id, (start, end) in enumerate(self.files):
+            if start or end:
+                segments.append((start, end, ('file', file_id)))
+        segments.sort(key=lambda s: (s[0], s[1]))
+        return segments
+
+    def write(self, out_path, replacements=None):
+        """
+        Пишет новый образ, заменяя файлы {идентификатор: байты}. Ключом может быть
+        и имя участка из REGION_FILES ('arm9', 'banner', ..., 'header' — новый заголовок,
+        в котором указатели, размеры и CRC всё равно пересчитываются).
+
+        Участки между неизменёнными файлами копируются из исходного образа как есть,
+        поэтому образ без замен совпадает с исходным побайтно.
+        Возвращает число сдвинутых участков
+        """
+        replacements = replacements or {}
+        header = replacements.get('header')
+        if header is not None and len(header) != HEADER_SIZE:
+            raise NDSError(f"header.bin: {len(header)} байт вместо {HEADER_SIZE}")
+        segments = self._segments()
+        if not segments:
+            raise NDSError("В образе нет ни одного участка")
+
+        new_positions = {}
+        delta = 0
+        moved = 0
+        tmp_path = f"{out_path}.tmp{os.getpid()}"
+        try:
+            with open(tmp_path, 'wb') as out:
+                header_end = segments[0][0]
+                _copy(out, self.view[0:header_end])
+                out_pos = header_end
+                prev_end = header_end
+
+                for i, (start, end, key) in enumerate(segments):
+                    new_start = start + delta
+                    if new_start < out_pos:
+                        raise NDSError(f"Участки образа перекрываются около {start:#x}")
+                    # Промежуток: исходные байты, если он не изменился, иначе заполнитель
+                    gap = new_start - out_pos
+                    if gap == start - prev_end:
+                        _copy(out, self.view[prev_end:start])
+                    else:
+                        out.write(bytes([PADDING_BYTE]) * gap)
+
+                    if key[1] in replacements and key != ('region', 'fat'):
+                        data = replacements[key[1]]
+                    elif key == ('region', 'fat'):
+                        data = None  # Записывается после расчёта новых смещений
+                    else:
+                        data = self.view[start:end]
+                    size = end - start if data is None else len(data)
+                    if data is None:
+                        out.write(bytes(size))
+                    else:
+                        _copy(out, data)
+                    new_positions[key] = (new_start, new_start + size)
+                    if new_start != start:
+                        moved += 1
+                    out_pos = new_start + size
+                    prev_end = end
+
+                    # Файл вырос и не помещается до следующего участка — сдвигаем остальные
+                    next_start = segments[i + 1][0] if i + 1 < len(segments) else None
+                    if next_start is not None and out_pos > next_start + delta:
+                        delta += align(out_pos - (next_start + delta))
+
+                # Хвост образа после последнего участка переносится со сдвигом
+                if out_pos > prev_end + delta:
+                    delta += align(out_pos - (prev_end + delta))
+                out.write(bytes([PADDING_BYTE]) * (prev_end + delta - out_pos))
+                _copy(out, self.view[prev_end:self.size])
+                used_size = self.used_size + delta if self.used_size >= prev_end else max(out_pos, self.used_size)
+
+                header = self._new_header(new_positions, used_size, header, replacements)
+                fat = b''.join(FAT_ENTRY.pack(*new_positions.get(('file', file_id), entry))
+                               for file_id, entry in enumerate(self.files))
+                out.seek(new_positions[('region', 'fat')][0])
+                out.write(fat)
+                out.seek(0)
+                out.write(header)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, out_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return moved
+
+    def _new_header(self, new_positions, used_size, base=None, replacements=()):
+        header = bytearray(self.view[0:HEADER_SIZE] if base is None else base)
+        for name, (offset_field, size_field) in HEADER_REGIONS.items():
+            position = new_positions.get(('region', name))
+            if position is not None:
+                struct.pack_into('<I', header, offset_field, position[0])
+            if position is not None and size_field is not None:
+                size = position[1] - position[0]
+                if name not in replacements:
+                    size = self.regions[name][1]
+                elif name == 'arm9' and size >= NITROCODE_FOOTER_SIZE and \
+                        struct.unpack_from('<I', replacements[name], size - NITROCODE_FOOTER_SIZE)[0] == NITROCODE:
+                    size -= NITROCODE_FOOTER_SIZE  # Метка nitrocode в размер ARM9 не входит
+                struct.pack_into('<I', header, size_field, size)
+        struct.pack_into('<I', header, USED_SIZE_OFFSET, used_size)
+        chip_size = header[CHIP_SIZE_OFFSET]
+        while (CHIP_SIZE_BASE << chip_size) < used_size:
+            chip_size += 1
+        header[CHIP_SIZE_OFFSET] = chip_size
+        struct.pack_into('<H', header, HEADER_CRC_OFFSET, crc16(header[:HEADER_CRC_OFFSET]))
+        return bytes(header)
+
+    def region_file(self, name):
+        """memoryview участка в том виде, в каком его извлекает unpack() (ключ — значение REGION_FILES)"""
+        if name == 'header':
+            return self.view[0:HEADER_SIZE]
+        if name == 'arm9':
+            return self.arm9_with_footer()
+        return self.region(name)
+
+    def changed_files(self, extracted_dir):
+        """
+        Замены по распакованному каталогу: файлы data/ и overlay/, а также arm9.bin, arm7.bin,
+        y9.bin, y7.bin, banner.bin и header.bin, отличающиеся от образа.
+        Возвращает {идентификатор или имя участка: байты}
+        """
+        candidates = [(os.path.join(extracted_dir, 'data', *path.split('/')), file_id)
+                      for path, file_id in self.paths.items()]
+        for table in ('arm9_overlays', 'arm7_overlays'):
+            candidates += [(os.path.join(extracted_dir, 'overlay', f"overlay_{file_id:04d}.bin"), file_id)
+                           for file_id in self.overlays(table)]
+        candidates += [(os.path.join(extracted_dir, name), region) for name, region in REGION_FILES.items()]
+
+        changed = {}
+        for path, file_id in candidates:
+            if not os.path.exists(path):
+                continue
+            original = self.region_file(file_id) if isinstance(file_id, str) else self.file(file_id)
+            # Сначала сравнивается размер, содержимое читается только при совпадении
+            if os.path.getsize(path) != len(original):
+                with open(path, 'rb') as f:
+                    changed[file_id] = f.read()
+            else:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                if data != original:
+                    changed[file_id] = data
+            original.release()
+        return changed
+
+
+def _copy(out, view):
+    """Потоковое копирование memoryview в файл кусками COPY_CHUNK"""
+    for pos in range(0, len(view), COPY_CHUNK):
+        out.write(view[pos:pos + COPY_CHUNK])
+
+
+def _write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        _copy(f, data)
+
+
+def load_rom(path):
+    return NDSRom(path)
+
+
+def main():
+    usage = (
+        f"Использование:\n"
+        f"  python {sys.argv[0]} info <образ.nds>\n"
+        f"  python {sys.argv[0]} unpack <образ.nds> <каталог>\n"
+        f"  python {sys.argv[0]} pack <образ.nds> <новый.nds> [--dir <каталог>] [--replace <путь>=<файл>] ...\n"
+        f"  (<путь> — файл из data/ или arm9.bin, arm7.bin, y9.bin, y7.bin, banner.bin, header.bin)\n"
+        f"\n"
+        f"Пример: python {sys.argv[0]} pack data/0558.nds data/0558-rus.nds "
+        f"--replace tumefont.nftr=data/tumefont.fsize-12.nftr"
+    )
+    if len(sys.argv) < 3 or sys.argv[1] not in ('info', 'unpack', 'pack'):
+        print(usage)
+        sys.exit(1)
+
+    command, rom_path = sys.argv[1], sys.argv[2]
+    if not os.path.exists(rom_path):
+        print(f"ОШИБКА: Файл '{rom_path}' не найден.")
+        sys.exit(1)
+
+    try:
+        with load_rom(rom_path) as rom:
+            if command == 'info':
+                print(f"📀 {rom.title} ({rom.game_code}), {rom.size} байт, занято {rom.used_size}")
+                for name, (offset, size) in rom.regions.items():
+                    print(f"  {name:<14} {offset:#010x}  {size} байт")
+                print(f"  файлов в FAT: {len(rom.files)}, в data/: {len(rom.paths)}")
+
+            elif command == 'unpack':
+                if len(sys.argv) < 4:
+                    print(usage)
+                    sys.exit(1)
+                count = rom.unpack(sys.argv[3])
+                print(f"✓ Распаковано файлов: {count} → {sys.argv[3]}")
+
+            else:
+                if len(sys.argv) < 4:
+                    print(usage)
+                    sys.exit(1)
+                out_path = sys.argv[3]
+                replacements = {}
+                args = iter(sys.argv[4:])
+                for arg in args:
+                    if arg == '--dir':
+                        replacements.update(rom.changed_files(next(args, '')))
+                    elif arg == '--replace':
+                        name, _, source = next(args, '').partition('=')
+                        if not source:
+                            print("ОШИБКА: --replace ожидает <путь в образе>=<файл>.")
+                            sys.exit(1)
+                        key = REGION_FILES.get(name) or rom.file_id(name)
+                        with open(source, 'rb') as f:
+                            replacements[key] = f.read()
+
+                names = {file_id: path for path, file_id in rom.paths.items()}
+                names.update({region: name for name, region in REGION_FILES.items()})
+                for key, data in sorted(replacements.items(), key=lambda item: str(item[0])):
+                    original = rom.region_file(key) if isinstance(key, str) else rom.file(key)
+                    name = names[key] if key in names else f"overlay_{key:04d}.bin"
+                    print(f"  ↻ {name}: {len(original)} → {len(data)} байт")
+                    original.release()
+                moved = rom.write(out_path, replacements)
+                print(f"✓ Записан {out_path}: заменено файлов {len(replacements)}, сдвинуто участков {moved}")
+    except (OSError, NDSError) as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Пакетный экспорт графики игры (NCGR + NCLR/NSCR) в PNG
+
+Источник — распакованный каталог (data/full_extracted) или сам образ
+.nds: файлы читаются из него напрямую через nds_rom без распаковки.
+Для каждого *.NCGR подбирается палитра из того же каталога (самый
+длинный префикс имени, как при кодировании) и карта экрана с тем же
+именем. Декодирование и запись PNG выполняются в пуле процессов.
+
+PNG пишутся в раскладке data/translated_assets: <путь>.NCGR.png
+"""
+
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from nds_rom import NDSError, load_rom
+from nitro_gfx import NitroError, decode_image, indices_to_image, match_palette, parse_palette
+
+# Образы, открытые в этом процессе (отображение в память дешевле повторного открытия)
+_open_roms = {}
+
+
+def read_source(source, path):
+    """Байты файла path (через '/') из каталога source или из образа source (path — data/<путь в FNT>)"""
+    if os.path.isdir(source):
+        with open(os.path.join(source, *path.split('/')), 'rb') as f:
+            return f.read()
+    rom = _open_roms.get(source)
+    if rom is None:
+        rom = _open_roms[source] = load_rom(source)
+    data = rom.file(rom.paths[path[len('data/'):]])
+    try:
+        return bytes(data)
+    finally:
+        data.release()
+
+
+def collect_tasks(files, source):
+    """
+    Задания экспорта по списку путей (через '/') внутри source — каталога или образа.
+    Задание: (source, путь NCGR, путь NCLR или None, путь NSCR или None); файлы читают
+    процессы пула, так что в главном процессе содержимое не накапливается
+    """
+    by_dir = {}
+    for path in files:
+        by_dir.setdefault(os.path.dirname(path), []).append(path)
+
+    tasks = []
+    for path in sorted(files):
+        if not path.endswith('.NCGR'):
+            continue
+        siblings = by_dir[os.path.dirname(path)]
+        screen = path[:-len('.NCGR')] + '.NSCR'
+        tasks.append((source, path, match_palette(path, siblings), screen if screen in siblings else None))
+    return tasks
+
+
+def export_one(task, out_dir):
+    """Декодирует один ресурс и пишет PNG. Возвращает (путь, описание ошибки или None)"""
+    source, path, palette_path, screen_path = task
+    try:
+        ncgr = read_source(source, path)
+        nclr = read_source(source, palette_path) if palette_path else None
+        nscr = read_source(source, screen_path) if screen_path else None
+        palette = parse_palette(nclr) if nclr else None
+        image = indices_to_image(decode_image(ncgr, nscr), palette)
+    except (NitroError, NDSError, OSError, ValueError, KeyError, IndexError, struct.error) as e:
+        # Обрезанный или повреждённый файл не должен останавливать весь экспорт
+        return path, str(e) or type(e).__name__
+    target = os.path.join(out_dir, *path.split('/')) + '.png'
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    image.save(target)
+    return path, None
+
+
+def _export_worker(args):
+    return export_one(*args)
+
+
+def export_all(tasks, out_dir, workers=None):
+    """Экспортирует задания в пуле процессов. Возвращает список (путь, ошибка или None)"""
+    if workers == 1 or len(tasks) < 2:
+        return [export_one(task, out_dir) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_export_worker, [(task, out_dir) for task in tasks], chunksize=4))
+
+
+def tasks_from_dir(root):
+    files = []
+    for directory, _, names in os.walk(root):
+        files += [os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/') for name in names]
+    return collect_tasks(files, root)
+
+
+def tasks_from_rom(rom):
+    # Пути образа даются в раскладке распаковки: data/<путь в FNT>
+    return collect_tasks(['data/' + path for path in rom.paths], rom.path)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(f"Использование: python {sys.argv[0]} <каталог или образ.nds> <выходной каталог> [--jobs N]")
+        print(f"")
+        print(f"Примеры:")
+        print(f"  python {sys.argv[0]} data/full_extracted data/reference_assets")
+        print(f"  python {sys.argv[0]} data/0558.nds data/reference_assets --jobs 8")
+        sys.exit(1)
+
+    source, out_dir = sys.argv[1], sys.argv[2]
+    workers = None
+    args = iter(sys.argv[3:])
+    for arg in args:
+        if arg == '--jobs':
+            try:
+                workers = int(next(args, ''))
+            except ValueError:
+                print("ОШИБКА: Параметр --jobs требует целое число.")
+                sys.exit(1)
+            if workers < 1:
+                print("ОШИБКА: Параметр --jobs должен быть не меньше 1.")
+                sys.exit(1)
+
+    if not os.path.exists(source):
+        print(f"ОШИБКА: '{source}' не найден.")
+        sys.exit(1)
+
+    try:
+        if os.path.isdir(source):
+            tasks = tasks_from_dir(source)
+        else:
+            with load_rom(source) as rom:
+                tasks = tasks_from_rom(rom)
+    except (OSError, NDSError) as e:
+        print(f"ОШИБКА: {e}")
+        sys.exit(1)
+
+    if not tasks:
+        print(f"ОШИБКА: В '{source}' нет файлов *.NCGR.")
+        sys.exit(1)
+
+    print(f"🖼  Экспорт {len(tasks)} изображений из {source} → {out_dir}")
+    failed = 0
+    for path, error in export_all(tasks, out_dir, workers):
+        if error:
+            failed += 1
+            print(f"✗ {path}: {error}")
+    print(f"✅ Экспортировано {len(tasks) - failed} из {len(tasks)}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""
+Кодирование PNG в графику Nitro (NCGR, NSCR) по палитре NCLR и обратно
+
+Изображение квантуется в заданную палитру через таблицу ближайших цветов
+по всему пространству BGR555 (32768 записей, строится NumPy один раз на
+палитру), режется на тайлы 8x8 и записывается в NCGR 4bpp или 8bpp.
+В 4bpp каждый тайл квантуется в один 16-цветный банк без его нулевой
+(прозрачной) записи: банк с картой экрана выбирается по тайлу, без неё —
+один на всё изображение.
+Если у ресурса есть карта экрана (NSCR), одинаковые тайлы, в том числе
+отражённые по горизонтали и вертикали, хранятся один раз: индекс по
+байтам тайла ищет совпадение среди уже записанных.
+
+Формат (глубина, режим отображения, линейная или тайловая раскладка,
+наличие NSCR) по возможности берётся из оригинального файла игры.
+Декодирование (decode_image) распаковывает полубайты и собирает тайлы
+по карте экрана векторно; пакетный экспорт — nitro_export.py.
+"""
+
+import os
+import struct
+import sys
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+TILE = 8
+NITRO_BOM = 0xFEFF
+NITRO_VERSION = 0x0101
+NITRO_HEADER = struct.Struct('<4sHHIHH')
+SECTION_HEADER = struct.Struct('<4sI')
+
+# Глубина цвета в терминах NitroSDK (GXTexFmt)
+FMT_4BPP = 3
+FMT_8BPP = 4
+BPP_BY_FMT = {FMT_4BPP: 4, FMT_8BPP: 8}
+
+CHAR_HEADER = struct.Struct('<HHIIIII')
+PLTT_HEADER = struct.Struct('<IIII')
+SCRN_HEADER = struct.Struct('<HHHHI')
+CHAR_FMT_BMP = 1  # Линейная раскладка вместо тайлов
+
+NSCR_HFLIP = 1 << 10
+NSCR_VFLIP = 1 << 11
+NSCR_TILE_LIMIT = 1 << 10
+NSCR_WIDTH_TILES = 32
+
+ALPHA_THRESHOLD = 128
+
+# Варианты отражения тайла: (флаги NSCR, функция)
+FLIPS = (
+    (0, lambda t: t),
+    (NSCR_HFLIP, lambda t: t[:, ::-1]),
+    (NSCR_VFLIP, lambda t: t[::-1, :]),
+    (NSCR_HFLIP | NSCR_VFLIP, lambda t: t[::-1, ::-1]),
+)
+
+
+class NitroError(Exception):
+    """Ошибка разбора или кодирования графики Nitro"""
+
+
+# --- Контейнер Nitro ---
+
+def read_nitro(data, magic):
+    """Секции файла Nitro: {магия секции: memoryview данных секции без заголовка}"""
+    data = memoryview(data)
+    if len(data) < NITRO_HEADER.size:
+        raise NitroError("Файл слишком мал")
+    file_magic, bom, _, _, header_size, count = NITRO_HEADER.unpack_from(data, 0)
+    if file_magic != magic or bom != NITRO_BOM:
+        raise NitroError(f"Ожидался файл {magic[::-1].decode()}, получено {bytes(file_magic)!r}")
+    sections = {}
+    pos = header_size
+    for _ in range(count):
+        section_magic, size = SECTION_HEADER.unpack_from(data, pos)
+        if size < SECTION_HEADER.size or pos + size > len(data):
+            raise NitroError(f"Секция {section_magic!r} выходит за границы файла")
+        sections[section_magic] = data[pos + SECTION_HEADER.size:pos + size]
+        pos += size
+    return sections
+
+
+def write_nitro(magic, sections):
+    """Собирает файл Nitro из списка (магия секции, байты данных)"""
+    body = b''.join(SECTION_HEADER.pack(section_magic, SECTION_HEADER.size + len(payload)) + payload
+                    for section_magic, payload in sections)
+    header = NITRO_HEADER.pack(magic, NITRO_BOM, NITRO_VERSION, NITRO_HEADER.size + len(body),
+                               NITRO_HEADER.size, len(sections))
+    return header + body
+
+
+# --- Палитры ---
+
+def bgr555_to_rgb(colors):
+    """Массив BGR555 → (N, 3) uint8 RGB (5 бит расширяются до 8)"""
+    colors = np.asarray(colors, dtype=np.uint16)
+    rgb = np.stack([colors & 0x1F, (colors >> 5) & 0x1F, (colors >> 10) & 0x1F], axis=-1).astype(np.uint8)
+    return (rgb << 3) | (rgb >> 2)
+
+
+def rgb_to_bgr555(rgb):
+    rgb = np.asarray(rgb, dtype=np.uint16) >> 3
+    return (rgb[..., 0] | (rgb[..., 1] << 5) | (rgb[..., 2] << 10)).astype(np.uint16)
+
+
+def read_nclr(data):
+    """Палитра NCLR → (массив BGR555, формат)"""
+    pltt = read_nitro(data, b'RLCN')[b'TTLP']
+    fmt, _, size, offset = PLTT_HEADER.unpack_from(pltt, 0)
+    raw = pltt[offset:offset + size]
+    return np.frombuffer(raw, dtype='<u2').copy(), fmt
+
+
+def write_nclr(colors, fmt=FMT_8BPP):
+    raw = np.asarray(colors, dtype='<u2').tobytes()
+    pltt = PLTT_HEADER.pack(fmt, 0, len(raw), PLTT_HEADER.size) + raw
+    return write_nitro(b'RLCN', [(b'TTLP', pltt)])
+
+
+def read_riff_palette(data):
+    """Палитра RIFF PAL (экспорт Tinke, *.NCLR.pal) → массив BGR555"""
+    if data[:4] != b'RIFF' or data[8:16] != b'PAL data':
+        raise NitroError("Файл не является палитрой RIFF PAL")
+    count = struct.unpack_from('<H', data, 22)[0]
+    entries = np.frombuffer(data, dtype=np.uint8, count=count * 4, offset=24).reshape(count, 4)
+    return rgb_to_bgr555(entries[:, :3])
+
+
+def load_palette(path):
+    """Палитра из .NCLR, RIFF .pal или палитры индексированного PNG → массив BGR555"""
+    if path.lower().endswith('.png'):
+        image = Image.open(path)
+        if image.mode != 'P':
+            raise NitroError(f"В '{path}' нет палитры")
+        return rgb_to_bgr555(np.array(image.getpalette(), dtype=np.uint8).reshape(-1, 3))
+    with open(path, 'rb') as f:
+        return parse_palette(f.read())
+
+
+def parse_palette(data):
+    """Байты NCLR или RIFF PAL → массив BGR555"""
+    if data[:4] == b'RIFF':
+        return read_riff_palette(data)
+    return read_nclr(data)[0]
+
+
+@lru_cache(maxsize=1)
+def _bgr555_colors():
+    """Все 32768 цветов BGR555 в RGB (float32)"""
+    return bgr555_to_rgb(np.arange(1 << 15, dtype=np.uint16)).astype(np.float32)
+
+
+def _nearest(candidates):
+    """Для всех цветов BGR555: номер ближайшего из candidates (RGB) и квадрат расстояния до него"""
+    colors = _bgr555_colors()
+    candidates = candidates.astype(np.float32)
+    dist = ((colors ** 2).sum(1)[:, None] - 2 * colors @ candidates.T + (candidates ** 2).sum(1)[None, :])
+    best = dist.argmin(axis=1)
+    return best, dist[np.arange(len(colors)), best]
+
+
+@lru_cache(maxsize=16)
+def _palette_lut(palette_bytes):
+    palette = np.frombuffer(palette_bytes, dtype='<u2')
+
+    # Все 32768 цветов BGR555 → ближайший цвет палитры (кроме нулевого, он прозрачный)
+    lut = np.zeros(1 << 15, dtype=np.uint8)
+    if len(palette) > 1:
+        lut[:] = _nearest(bgr555_to_rgb(palette[1:]))[0] + 1
+    # Цвет нулевой записи даёт индекс 0, если больше нигде в палитре точно не встречается
+    if not (palette[1:] == palette[0]).any():
+        lut[palette[0]] = 0
+    return lut
+
+
+@lru_cache(maxsize=16)
+def _bank_luts(palette_bytes):
+    """
+    Таблицы ближайших цветов для 4bpp: отдельно по каждому 16-цветному банку.
+    Нулевая запись банка (полубайт 0) прозрачна и кандидатом не бывает.
+    Возвращает (индексы палитры (банков, 32768) uint8, квадраты расстояний (банков, 32768))
+    """
+    palette = np.frombuffer(palette_bytes, dtype='<u2')[:256]
+    count = max(1, -(-len(palette) // 16))
+    lut = np.empty((count, 1 << 15), dtype=np.uint8)
+    dist = np.full((count, 1 << 15), np.inf, dtype=np.float32)
+    for bank in range(count):
+        entries = palette[bank * 16:(bank + 1) * 16]
+        lut[bank] = bank << 4
+        if len(entries) > 1:
+            best, best_dist = _nearest(bgr555_to_rgb(entries[1:]))
+            lut[bank] = (bank << 4) + best + 1
+            dist[bank] = best_dist
+        # Как и в 8bpp: точный цвет нулевой записи прозрачен, если в банке он больше не встречается
+        if len(entries) and not (entries[1:] == entries[0]).any():
+            lut[bank, entries[0]] = bank << 4
+            dist[bank, entries[0]] = 0
+    return lut, dist
+
+
+def quantize(image, palette, bpp=8, per_tile=True):
+    """
+    Изображение → массив индексов палитры (h, w) uint8.
+    Прозрачные пиксели получают индекс 0 (в 4bpp — нулевую запись банка).
+
+    При bpp=4 каждый тайл квантуется в один 16-цветный банк — тот, где сумма
+    расстояний до ближайших цветов меньше; при per_tile=False (нет карты
+    экрана, банк задать негде) один банк выбирается на всё изображение
+    """
+    rgba = np.asarray(image.convert('RGBA'))
+    keys = rgb_to_bgr555(rgba[..., :3])
+    transparent = rgba[..., 3] < ALPHA_THRESHOLD
+    palette_bytes = np.asarray(palette, dtype='<u2').tobytes()
+    if bpp != 4:
+        indices = _palette_lut(palette_bytes)[keys]
+        indices[transparent] = 0
+        return indices
+
+    lut, dist = _bank_luts(palette_bytes)
+    cost = np.where(transparent, 0, dist[:, keys])
+    h, w = keys.shape
+    if per_tile:
+        if h % TILE or w % TILE:
+            raise NitroError(f"Размер изображения {w}x{h} не кратен {TILE}")
+        tile_cost = cost.reshape(len(lut), h // TILE, TILE, w // TILE, TILE).sum(axis=(2, 4))
+        banks = tile_cost.argmin(axis=0).repeat(TILE, axis=0).repeat(TILE, axis=1)
+    else:
+        banks = np.full((h, w), cost.reshape(len(lut), -1).sum(axis=1).argmin())
+    indices = lut[banks, keys]
+    indices[transparent] = (banks[transparent] << 4).astype(np.uint8)
+    return indices
+
+
+# --- Тайлы ---
+
+def split_tiles(indices):
+    """(h, w) → (число тайлов, 8, 8) по строкам тайлов"""
+    h, w = indices.shape
+    if h % TILE or w % TILE:
+        raise NitroError(f"Размер изображения {w}x{h} не кратен {TILE}")
+    return indices.reshape(h // TILE, TILE, w // TILE, TILE).swapaxes(1, 2).reshape(-1, TILE, TILE)
+
+
+def pack_tiles(tiles, bpp):
+    """Тайлы индексов → байты NCGR (4bpp: левый пиксель в младшем полубайте)"""
+    flat = np.ascontiguousarray(tiles, dtype=np.uint8).reshape(-1)
+    if bpp == 8:
+        return flat.tobytes()
+    return (flat[0::2] & 0x0F | (flat[1::2] & 0x0F) << 4).astype(np.uint8).tobytes()
+
+
+def tile_banks(tiles):
+    """Банк 16-цветной палитры каждого тайла или None, если тайл смешивает банки"""
+    banks = tiles.reshape(len(tiles), -1) >> 4
+    if (banks.min(axis=1) != banks.max(axis=1)).any():
+        return None
+    return banks[:, 0]
+
+
+def dedup_tiles(tiles):
+    """
+    Уникальные тайлы с учётом отражений.
+    Возвращает (список уникальных тайлов, [(индекс уникального, флаги NSCR), ...])
+    """
+    index = {}
+    unique = []
+    refs = []
+    for tile in tiles:
+        for flags, flip in FLIPS:
+            found = index.get(flip(tile).tobytes())
+            if found is not None:
+                refs.append((found, flags))
+                break
+        else:
+            index[tile.tobytes()] = len(unique)
+            unique.append(tile)
+            refs.append((len(unique) - 1, 0))
+    return unique, refs
+
+
+# --- Чтение оригиналов ---
+
+def read_ncgr_header(data):
+    """Параметры NCGR: {'height', 'width', 'fmt', 'mapping', 'char_fmt', 'cpos'}"""
+    sections = read_nitro(data, b'RGCN')
+    height, width, fmt, mapping, char_fmt, size, offset = CHAR_HEADER.unpack_from(sections[b'RAHC'], 0)
+    cpos = sections.get(b'SOPC')
+    return {
+        'height': height, 'width': width, 'fmt': fmt, 'mapping': mapping, 'char_fmt': char_fmt,
+        'size': size, 'offset': offset, 'cpos': bytes(cpos) if cpos is not None else None,
+    }
+
+
+def read_nscr_header(data):
+    """Параметры NSCR: {'width', 'height', 'color_mode', 'format', 'size'}"""
+    width, height, color_mode, screen_format, size = SCRN_HEADER.unpack_from(read_nitro(data, b'RCSN')[b'NRCS'], 0)
+    return {'width': width, 'height': height, 'color_mode': color_mode, 'format': screen_format, 'size': size}
+
+
+# --- Декодирование ---
+
+SCREEN_BLOCK = 32  # Текстовый фон шире 256 точек хранится блоками 32x32 записи
+
+
+def unpack_pixels(raw, bpp):
+    """Байты NCGR → плоский массив индексов (4bpp: левый пиксель в младшем полубайте)"""
+    raw = np.frombuffer(raw, dtype=np.uint8)
+    if bpp == 8:
+        return raw
+    return np.stack([raw & 0x0F, raw >> 4], axis=-1).reshape(-1)
+
+
+def read_tiles(data):
+    """NCGR → (параметры, массив индексов): тайлы (N, 8, 8) или строки (h, w) для линейной раскладки"""
+    header = read_ncgr_header(data)
+    bpp = BPP_BY_FMT.get(header['fmt'])
+    if bpp is None:
+        raise NitroError(f"Неизвестный формат NCGR {header['fmt']}")
+    char = read_nitro(data, b'RGCN')[b'RAHC']
+    pixels = unpack_pixels(char[header['offset']:header['offset'] + header['size']], bpp)
+
+    width_tiles = header['width'] if header['width'] not in (0, 0xFFFF) else NSCR_WIDTH_TILES
+    if header['char_fmt'] & CHAR_FMT_BMP:
+        width = width_tiles * TILE
+        return header, pixels[:len(pixels) // width * width].reshape(-1, width)
+    return header, pixels[:len(pixels) // (TILE * TILE) * TILE * TILE].reshape(-1, TILE, TILE)
+
+
+def read_screen(data):
+    """NSCR → (параметры, записи карты (h, w) в тайлах)"""
+    header = read_nscr_header(data)
+    scrn = read_nitro(data, b'RCSN')[b'NRCS']
+    entries = np.frombuffer(scrn[SCRN_HEADER.size:SCRN_HEADER.size + header['size']], dtype='<u2')
+    w, h = header['width'] // TILE, header['height'] // TILE
+    entries = entries[:w * h]
+    if header['format'] == 0 and w > SCREEN_BLOCK and w % SCREEN_BLOCK == 0 and h % SCREEN_BLOCK == 0:
+        entries = entries.reshape(h // SCREEN_BLOCK, w // SCREEN_BLOCK, SCREEN_BLOCK, SCREEN_BLOCK)
+        entries = entries.transpose(0, 2, 1, 3)
+    return header, entries.reshape(h, w)
+
+
+def join_tiles(tiles, width_tiles):
+    """(N, 8, 8) → изображение (h, w) из строк по width_tiles тайлов; неполная строка дополняется нулями"""
+    rows = -(-len(tiles) // width_tiles)
+    padded = np.zeros((rows * width_tiles, TILE, TILE), dtype=np.uint8)
+    padded[:len(tiles)] = tiles
+    return padded.reshape(rows, width_tiles, TILE, TILE).swapaxes(1, 2).reshape(rows * TILE, width_tiles * TILE)
+
+
+def decode_image(ncgr_data, nscr_data=None):
+    """
+    NCGR (и NSCR) → массив индексов палитры (h, w) uint8.
+    Для 4bpp с картой экрана к индексам добавляется банк палитры записи
+    """
+    header, tiles = read_tiles(ncgr_data)
+    if tiles.ndim == 2:
+        return tiles
+    if nscr_data is None:
+        width_tiles = header['width'] if header['width'] not in (0, 0xFFFF) else NSCR_WIDTH_TILES
+        return join_tiles(tiles, min(width_tiles, max(len(tiles), 1)))
+
+    screen_header, entries = read_screen(nscr_data)
+    flat = entries.reshape(-1)
+    ids = (flat & (NSCR_TILE_LIMIT - 1)).astype(np.intp)
+    valid = ids < len(tiles)
+    picked = np.zeros((len(flat), TILE, TILE), dtype=np.uint8)
+    picked[valid] = tiles[ids[valid]]
+    hflip = (flat & NSCR_HFLIP).astype(bool)
+    vflip = (flat & NSCR_VFLIP).astype(bool)
+    picked[hflip] = picked[hflip][:, :, ::-1]
+    picked[vflip] = picked[vflip][:, ::-1, :]
+    if BPP_BY_FMT[header['fmt']] == 4:
+        picked |= ((flat >> 12).astype(np.uint8) << 4)[:, None, None]
+    return join_tiles(picked, entries.shape[1])
+
+
+def indices_to_image(indices, palette=None):
+    """Индексы → PNG с палитрой; без палитры — оттенки серого"""
+    image = Image.fromarray(np.ascontiguousarray(indices, dtype=np.uint8), 'P')
+    if palette is None:
+        rgb = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+    else:
+        rgb = np.zeros((256, 3), dtype=np.uint8)
+        colors = bgr555_to_rgb(palette[:256])
+        rgb[:len(colors)] = colors
+    image.putpalette(rgb.tobytes())
+    return image
+
+
+# --- Кодирование ---
+
+def encode_image(image, palette, template=None, screen=False):
+    """
+    Кодирует изображение в NCGR (и NSCR при screen=True).
+
+    template — параметры оригинального NCGR (read_ncgr_header) или None.
+    Без карты экрана тайлы пишутся в порядке изображения, с картой —
+    только уникальные с учётом отражений.
+    Возвращает (байты NCGR, байты NSCR или None)
+    """
+    linear = template is not None and template['char_fmt'] & CHAR_FMT_BMP
+    if template is not None:
+        fmt = template['fmt']
+    else:
+        # 4bpp возможен, если каждый тайл в одном банке и банк можно указать (в NSCR или он общий)
+        banks = tile_banks(split_tiles(quantize(image, palette)))
+        single_bank = banks is not None and (screen or len(np.unique(banks)) == 1)
+        fmt = FMT_4BPP if single_bank else FMT_8BPP
+    bpp = BPP_BY_FMT.get(fmt)
+    if bpp is None:
+        raise NitroError(f"Неизвестный формат NCGR {fmt}")
+
+    # В 4bpp банк подбирается по тайлу (если есть карта экрана) или один на всё изображение
+    indices = quantize(image, palette, bpp, per_tile=screen and not linear)
+    h, w = indices.shape
+    tiles = split_tiles(indices)
+    banks = tile_banks(tiles)
+
+    nscr = None
+    if screen:
+        if linear:
+            raise NitroError("Линейный NCGR не может использоваться с картой экрана")
+        unique, refs = dedup_tiles(tiles & 0x0F if bpp == 4 else tiles)
+        if len(unique) > NSCR_TILE_LIMIT:
+            raise NitroError(f"Уникальных тайлов {len(unique)}, карта экрана адресует не больше {NSCR_TILE_LIMIT}")
+        bank_bits = (banks.astype(np.uint16) << 12) if bpp == 4 else np.zeros(len(tiles), dtype=np.uint16)
+        entries = np.array([tile | flags for tile, flags in refs], dtype=np.uint16) | bank_bits
+        scrn = SCRN_HEADER.pack(w, h, 0 if bpp == 4 else 1, 0, entries.nbytes) + entries.astype('<u2').tobytes()
+        nscr = write_nitro(b'RCSN', [(b'NRCS', scrn)])
+
+        # Уникальные тайлы раскладываются строками по NSCR_WIDTH_TILES, остаток заполняется пустыми
+        width_tiles = min(len(unique), NSCR_WIDTH_TILES)
+        height_tiles = -(-len(unique) // width_tiles)
+        padding = [np.zeros((TILE, TILE), dtype=np.uint8)] * (width_tiles * height_tiles - len(unique))
+        raw = pack_tiles(np.stack(unique + padding), bpp)
+    else:
+        width_tiles, height_tiles = w // TILE, h // TILE
+        raw = pack_tiles(indices if linear else tiles, bpp)
+
+    mapping = template['mapping'] if template is not None else 0
+    char_fmt = template['char_fmt'] if template is not None else 0
+    char = CHAR_HEADER.pack(height_tiles, width_tiles, fmt, mapping, char_fmt, len(raw), CHAR_HEADER.size) + raw
+    sections = [(b'RAHC', char)]
+    if template is not None and template['cpos'] is not None:
+        sections.append((b'SOPC', template['cpos']))
+    return write_nitro(b'RGCN', sections), nscr
+
+
+# --- Пакетная обработка ---
+
+def match_palette(name, candidates):
+    """
+    Палитра для ресурса name среди путей candidates (*.NCLR, *.NCLR.pal): та, чьё имя —
+    самый длинный префикс имени ресурса (ban.NCLR для ban.NCGR и ban_b.NCGR). None, если нет
+    """
+    best = None
+    for path in candidates:
+        entry = os.path.basename(path)
+        if not entry.endswith(('.NCLR', '.NCLR.pal')):
+            continue
+        stem = entry.split('.NCLR')[0]
+        if os.path.basename(name).startswith(stem) and (best is None or len(stem) > len(best[0])):
+            best = (stem, path)
+    return best[1] if best else None
+
+
+def find_palette(png_path, search_dirs):
+    """Палитра изображения в каталогах поиска (по match_palette), первый найденный каталог выигрывает"""
+    for directory in search_dirs:
+        if os.path.isdir(directory):
+            found = match_palette(png_path, [os.path.join(directory, entry) for entry in sorted(os.listdir(directory))])
+            if found:
+                return found
+    return None
+
+
+def asset_sources(png_path, assets_root, originals_root=None, palettes_root=None):
+    """
+    Файлы, от которых зависит кодирование ресурса:
+    {'rel': путь NCGR относительно корня, 'palette', 'ncgr', 'nscr'} (отсутствующие — None)
+    """
+    rel = os.path.relpath(png_path, assets_root)
+    if rel.endswith('.png'):
+        rel = rel[:-4]
+    rel_dir = os.path.dirname(rel)
+    stem = rel[:-len('.NCGR')] if rel.endswith('.NCGR') else rel
+
+    search = [os.path.dirname(png_path)]
+    if palettes_root:
+        search.append(os.path.join(palettes_root, rel_dir))
+    if originals_root:
+        search.append(os.path.join(originals_root, rel_dir))
+
+    sources = {'rel': rel.replace(os.sep, '/'), 'palette': find_palette(png_path, search), 'ncgr': None, 'nscr': None}
+    if originals_root:
+        for key, path in (('ncgr', os.path.join(originals_root, rel)),
+                          ('nscr', os.path.join(originals_root, stem + '.NSCR'))):
+            if os.path.exists(path):
+                sources[key] = path
+    return sources
+
+
+def encode_asset(png_path, sources, screen=None):
+    """Кодирует один ресурс по его источникам. Возвращает (NCGR, NSCR или None)"""
+    palette = load_palette(sources['palette'] or png_path)
+    template = None
+    if sources['ncgr']:
+        with open(sources['ncgr'], 'rb') as f:
+            template = read_ncgr_header(f.read())
+    if screen is None:
+        screen = sources['nscr'] is not None
+    return encode_image(Image.open(png_path), palette, template, screen)
+
+
+def list_assets(root):
+    """Все *.NCGR.png в каталоге (рекурсивно), в постоянном порядке"""
+    found = []
+    for directory, _, files in os.walk(root):
+        found += [os.path.join(directory, name) for name in files if name.endswith('.NCGR.png')]
+    return sorted(found)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(f"Использование: python {sys.argv[0]} <каталог или файл .png> <выходной каталог> "
+              f"[--originals DIR] [--palettes DIR] [--palette FILE] [--screen]")
+        print(f"")
+        print(f"Пример: python {sys.argv[0]} data/translated_assets build/graphics "
+              f"--originals data/full_extracted --palettes data/source_images")
+        print(f"")
+        print(f"  --originals DIR  Распакованный образ: формат NCGR и наличие NSCR берутся из оригиналов")
+        print(f"  --palettes DIR   Где искать *.NCLR / *.NCLR.pal (раскладка как у ресурсов)")
+        print(f"  --palette FILE   Одна палитра для всех изображений")
+        print(f"  --screen         Всегда создавать NSCR (с удалением повторяющихся тайлов)")
+        print(f"Без найденной палитры используется палитра самого PNG.")
+        sys.exit(1)
+
+    source, out_dir = sys.argv[1], sys.argv[2]
+    originals = palettes = palette = None
+    screen = None
+    args = iter(sys.argv[3:])
+    for arg in args:
+        if arg == '--originals':
+            originals = next(args, None)
+        elif arg == '--palettes':
+            palettes = next(args, None)
+        elif arg == '--palette':
+            palette = next(args, None)
+        elif arg == '--screen':
+            screen = True
+
+    if os.path.isdir(source):
+        root, images = source, list_assets(source)
+    elif os.path.exists(source):
+        root, images = os.path.dirname(source), [source]
+    else:
+        print(f"ОШИБКА: '{source}' не найден.")
+        sys.exit(1)
+    if not images:
+        print(f"ОШИБКА: В '{source}' нет файлов *.NCGR.png.")
+        sys.exit(1)
+
+    failed = 0
+    for png_path in images:
+        sources = asset_sources(png_path, root, originals, palettes)
+        if palette:
+            sources['palette'] = palette
+        try:
+            ncgr, nscr = encode_asset(png_path, sources, screen)
+        except (OSError, ValueError, NitroError) as e:
+            print(f"✗ {sources['rel']}: {e}")
+            failed += 1
+            continue
+        target = os.path.join(out_dir, *sources['rel'].split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(ncgr)
+        note = f"NCGR {len(ncgr)} байт"
+        if nscr is not None:
+            with open(target[:-len('.NCGR')] + '.NSCR', 'wb') as f:
+                f.write(nscr)
+            note += f", NSCR {len(nscr)} байт"
+        palette_name = os.path.basename(sources['palette']) if sources['palette'] else 'палитра PNG'
+        print(f"✓ {sources['rel']}: {note} ({palette_name})")
+
+    print(f"✅ Закодировано {len(images) - failed} из {len(images)}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Чтение файлов GIMP (.xcf) и сведение видимых слоёв без GIMP
+
+Поддерживаются версии формата до v011 (GIMP 2.10; начиная с v011 указатели
+64-битные), 8 бит на канал, слои RGB / оттенки серого / индексированные
+с альфа-каналом и без, маски слоёв. Пиксели слоя хранятся в иерархии:
+слой → иерархия → уровень → тайлы 64x64. Тайлы без сжатия, со сжатием RLE
+(каждый канал тайла кодируется отдельно) или zlib распаковываются прямо
+в буфер NumPy слоя.
+
+Сведение повторяет режим «Обычный» GIMP: слои накладываются снизу вверх
+с учётом непрозрачности, видимости и смещений. Для индексированного
+изображения результат переводится обратно в его палитру.
+"""
+
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+XCF_MAGIC = b'gimp xcf '
+TILE_SIZE = 64
+
+# --- Базовые типы изображения и типы слоёв ---
+BASE_RGB = 0
+BASE_GRAY = 1
+BASE_INDEXED = 2
+LAYER_CHANNELS = {0: 3, 1: 4, 2: 1, 3: 2, 4: 1, 5: 2}  # RGB, RGBA, GRAY, GRAYA, INDEXED, INDEXEDA
+
+# --- Сжатие тайлов ---
+COMPRESS_NONE = 0
+COMPRESS_RLE = 1
+COMPRESS_ZLIB = 2
+
+# --- Свойства (PROP_*) ---
+PROP_END = 0
+PROP_COLORMAP = 1
+PROP_OPACITY = 6
+PROP_MODE = 7
+PROP_VISIBLE = 8
+PROP_APPLY_MASK = 11
+PROP_OFFSETS = 15
+PROP_COMPRESSION = 17
+PROP_GROUP_ITEM = 29
+PROP_FLOAT_OPACITY = 33
+
+# Режимы наложения «Обычный»: устаревший (GIMP 2.8) и новый (GIMP 2.10)
+NORMAL_MODES = (0, 28)
+# Точность: 8 бит на канал (линейная, нелинейная, перцептивная); в v4–v6 — 0
+PRECISIONS_U8 = (0, 100, 150, 175)
+
+Layer = namedtuple('Layer', 'name width height type x y opacity visible mode hierarchy mask apply_mask group')
+
+
+class XCFError(Exception):
+    """Ошибка разбора файла XCF"""
+
+
+class XCFImage:
+    """
+    Разобранный файл XCF: заголовок, палитра и слои (сверху вниз).
+    Пиксели слоёв читаются по запросу методом layer_pixels()
+    """
+
+    def __init__(self, data):
+        self.data = data
+        if not data.startswith(XCF_MAGIC) or len(data) < 26:
+            raise XCFError("Файл не является изображением GIMP (нет сигнатуры 'gimp xcf')")
+        tag = data[9:13]
+        if tag == b'file':
+            self.version = 0
+        elif tag[:1] == b'v' and tag[1:].isdigit():
+            self.version = int(tag[1:])
+        else:
+            raise XCFError(f"Неизвестная версия XCF: {tag!r}")
+        self.pointer = struct.Struct('>Q' if self.version >= 11 else '>I')
+
+        offset = 14
+        self.width, self.height, self.base_type = struct.unpack_from('>III', data, offset)
+        offset += 12
+        self.precision = 0
+        if self.version >= 4:
+            self.precision = struct.unpack_from('>I', data, offset)[0]
+            offset += 4
+        if self.precision not in PRECISIONS_U8:
+            raise XCFError(f"Поддерживается только 8 бит на канал (точность {self.precision})")
+
+        self.colormap = None
+        self.compression = COMPRESS_NONE
+        props, offset = self._read_props(offset)
+        for prop, start, size in props:
+            if prop == PROP_COLORMAP:
+                count = struct.unpack_from('>I', data, start)[0]
+                self.colormap = np.frombuffer(data, dtype=np.uint8, count=count * 3, offset=start + 4).reshape(-1, 3)
+            elif prop == PROP_COMPRESSION:
+                self.compression = data[start]
+        if self.compression not in (COMPRESS_NONE, COMPRESS_RLE, COMPRESS_ZLIB):
+            raise XCFError(f"Неподдерживаемое сжатие тайлов: {self.compression}")
+
+        layer_offsets, offset = self._read_pointers(offset)
+        self.layers = [self._read_layer(pointer) for pointer in layer_offsets]
+
+    # --- Низкоуровневое чтение ---
+
+    def _read_pointers(self, offset):
+        """Список указателей до нулевого"""
+        pointers = []
+        while True:
+            if offset + self.pointer.size > len(self.data):
+                raise XCFError("Список указателей выходит за границы файла")
+            value = self.pointer.unpack_from(self.data, offset)[0]
+            offset += self.pointer.size
+            if not value:
+                return pointers, offset
+            pointers.append(value)
+
+    def _read_props(self, offset):
+        """Список свойств [(тип, начало данных, размер)] до PROP_END"""
+        props = []
+        while True:
+            if offset + 8 > len(self.data):
+                raise XCFError("Список свойств выходит за границы файла")
+            prop, size = struct.unpack_from('>II', self.data, offset)
+            offset += 8
+            if prop == PROP_END:
+                return props, offset
+            props.append((prop, offset, size))
+            offset += size
+
+    def _read_string(self, offset):
+        size = struct.unpack_from('>I', self.data, offset)[0]
+        raw = self.data[offset + 4:offset + 4 + size]
+        return raw.rstrip(b'\x00').decode('utf-8', 'replace'), offset + 4 + size
+
+    def _read_layer(self, offset):
+        width, height, layer_type = struct.unpack_from('>III', self.data, offset)
+        if layer_type not in LAYER_CHANNELS:
+            raise XCFError(f"Неизвестный тип слоя {layer_type}")
+        name, offset = self._read_string(offset + 12)
+        props, offset = self._read_props(offset)
+
+        values = {'opacity': 255, 'visible': True, 'mode': 0, 'x': 0, 'y': 0, 'apply_mask': False, 'group': False}
+        for prop, start, size in props:
+            if prop == PROP_OPACITY:
+                values['opacity'] = struct.unpack_from('>I', self.data, start)[0]
+            elif prop == PROP_FLOAT_OPACITY:
+                values['opacity'] = round(struct.unpack_from('>f', self.data, start)[0] * 255)
+            elif prop == PROP_VISIBLE:
+                values['visible'] = bool(struct.unpack_from('>I', self.data, start)[0])
+            elif prop == PROP_MODE:
+                values['mode'] = struct.unpack_from('>I', self.data, start)[0]
+            elif prop == PROP_OFFSETS:
+                values['x'], values['y'] = struct.unpack_from('>ii', self.data, start)
+            elif prop == PROP_APPLY_MASK:
+                values['apply_mask'] = bool(struct.unpack_from('>I', self.data, start)[0])
+            elif prop == PROP_GROUP_ITEM:
+                values['group'] = True
+
+        hierarchy = self.pointer.unpack_from(self.data, offset)[0]
+        mask = self.pointer.unpack_from(self.data, offset + self.pointer.size)[0]
+        return Layer(name, width, height, layer_type, hierarchy=hierarchy, mask=mask or None, **values)
+
+    # --- Пиксели ---
+
+    def _decode_tile(self, start, end, tile_w, tile_h, bpp):
+        """Тайл → массив (tile_h, tile_w, bpp) uint8"""
+        raw = self.data[start:end]
+        count = tile_w * tile_h
+        if self.compression == COMPRESS_NONE:
+            planes = np.frombuffer(raw, dtype=np.uint8, count=count * bpp)
+            return planes.reshape(tile_h, tile_w, bpp)
+        if self.compression == COMPRESS_ZLIB:
+            try:
+                planes = np.frombuffer(zlib.decompress(raw), dtype=np.uint8, count=count * bpp)
+            except (zlib.error, ValueError) as e:
+                raise XCFError(f"Повреждённый тайл zlib по смещению {start}: {e}")
+            return planes.reshape(tile_h, tile_w, bpp)
+
+        # RLE: каналы тайла записаны один за другим, каждый — серия операций
+        tile = np.empty((bpp, count), dtype=np.uint8)
+        pos = 0
+        try:
+            for channel in range(bpp):
+                plane = tile[channel]
+                filled = 0
+                while filled < count:
+                    op = raw[pos]
+                    pos += 1
+                    if op >= 128:
+                        # Неповторяющиеся байты
+                        if op == 128:
+                            length = raw[pos] << 8 | raw[pos + 1]
+                            pos += 2
+                        else:
+                            length = 256 - op
+                        plane[filled:filled + length] = np.frombuffer(raw, dtype=np.uint8, count=length, offset=pos)
+                        pos += length
+                    else:
+                        # Повтор одного байта
+                        if op == 127:
+                            length = raw[pos] << 8 | raw[pos + 1]
+                            pos += 2
+                        else:
+                            length = op + 1
+                        plane[filled:filled + length] = raw[pos]
+                        pos += 1
+                    filled += length
+                if filled != count:
+                    raise XCFError(f"Серия RLE выходит за границы тайла по смещению {start}")
+        except (IndexError, ValueError):
+            raise XCFError(f"Повреждённый тайл RLE по смещению {start}")
+        return tile.T.reshape(tile_h, tile_w, bpp)
+
+    def read_hierarchy(self, offset):
+        """Пиксели иерархии (первый уровень) как массив (height, width, bpp) uint8"""
+        width, height, bpp = struct.unpack_from('>III', self.data, offset)
+        level = self.pointer.unpack_from(self.data, offset + 12)[0]
+        level_w, level_h = struct.unpack_from('>II', self.data, level)
+        if (level_w, level_h) != (width, height):
+            raise XCFError(f"Размер уровня {level_w}x{level_h} не совпадает с иерархией {width}x{height}")
+        tiles, _ = self._read_pointers(level + 8)
+        columns = -(-width // TILE_SIZE)
+        rows = -(-height // TILE_SIZE)
+        if len(tiles) != columns * rows:
+            raise XCFError(f"Ожидается {columns * rows} тайлов, в файле {len(tiles)}")
+
+        pixels = np.empty((height, width, bpp), dtype=np.uint8)
+        # Конец тайла — начало следующего (последний ограничен запасом на худший случай RLE)
+        ends = tiles[1:] + [min(len(self.data), tiles[-1] + TILE_SIZE * TILE_SIZE * bpp * 2 + 1024)]
+        for i, (start, end) in enumerate(zip(tiles, ends)):
+            row, column = divmod(i, columns)
+            y, x = row * TILE_SIZE, column * TILE_SIZE
+            tile_w, tile_h = min(TILE_SIZE, width - x), min(TILE_SIZE, height - y)
+            pixels[y:y + tile_h, x:x + tile_w] = self._decode_tile(start, end, tile_w, tile_h, bpp)
+        return pixels
+
+    def layer_pixels(self, layer):
+        """Пиксели слоя как массив (height, width, каналы) uint8"""
+        pixels = self.read_hierarchy(layer.hierarchy)
+        if pixels.shape[2] != LAYER_CHANNELS[layer.type]:
+            raise XCFError(f"Слой '{layer.name}': {pixels.shape[2]} байт на пиксель для типа {layer.type}")
+        return pixels
+
+    def mask_pixels(self, layer):
+        """Маска слоя (height, width) uint8 или None"""
+        if layer.mask is None:
+            return None
+        _, offset = self._read_string(layer.mask + 8)
+        _, offset = self._read_props(offset)
+        hierarchy = self.pointer.unpack_from(self.data, offset)[0]
+        return self.read_hierarchy(hierarchy)[..., 0]
+
+    def layer_rgba(self, layer):
+        """Слой в RGBA float32 (0..1) с учётом маски"""
+        pixels = self.layer_pixels(layer)
+        channels = pixels.shape[2]
+        has_alpha = channels in (2, 4)
+        alpha = pixels[..., -1] if has_alpha else np.full(pixels.shape[:2], 255, dtype=np.uint8)
+        if layer.type in (4, 5):
+            if self.colormap is None:
+                raise XCFError(f"Индексированный слой '{layer.name}' в изображении без палитры")
+            rgb = self.colormap[np.minimum(pixels[..., 0], len(self.colormap) - 1)]
+        elif layer.type in (2, 3):
+            rgb = np.repeat(pixels[..., :1], 3, axis=2)
+        else:
+            rgb = pixels[..., :3]
+
+        rgba = np.empty(pixels.shape[:2] + (4,), dtype=np.float32)
+        rgba[..., :3] = rgb / np.float32(255)
+        rgba[..., 3] = alpha / np.float32(255)
+        if layer.apply_mask:
+            mask = self.mask_pixels(layer)
+            if mask is not None:
+                rgba[..., 3] *= mask / np.float32(255)
+        return rgba
+
+    # --- Сведение ---
+
+    def composite(self):
+        """Сводит видимые слои в массив RGBA float32 (height, width, 4)"""
+        canvas = np.zeros((self.height, self.width, 4), dtype=np.float32)
+        for layer in reversed(self.layers):
+            if not layer.visible or layer.opacity == 0:
+                continue
+            if layer.group:
+                raise XCFError(f"Группы слоёв не поддерживаются: '{layer.name}'")
+            if layer.mode not in NORMAL_MODES:
+                raise XCFError(f"Слой '{layer.name}': поддерживается только режим «Обычный» (режим {layer.mode})")
+
+            # Пересечение слоя с холстом
+            x0, y0 = max(layer.x, 0), max(layer.y, 0)
+            x1, y1 = min(layer.x + layer.width, self.width), min(layer.y + layer.height, self.height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            src = self.layer_rgba(layer)[y0 - layer.y:y1 - layer.y, x0 - layer.x:x1 - layer.x]
+            dst = canvas[y0:y1, x0:x1]
+
+            src_alpha = src[..., 3:] * np.float32(layer.opacity / 255)
+            dst_alpha = dst[..., 3:]
+            out_alpha = src_alpha + dst_alpha * (1 - src_alpha)
+            safe = np.where(out_alpha > 0, out_alpha, 1)
+            dst[..., :3] = (src[..., :3] * src_alpha + dst[..., :3] * dst_alpha * (1 - src_alpha)) / safe
+            dst[..., 3:] = out_alpha
+        return canvas
+
+    def flatten(self):
+        """
+        Сведённое изображение PIL: для индексированного XCF — режим P с палитрой
+        файла (цвета переводятся в ближайшие цвета палитры, прозрачные пиксели —
+        в индекс 0), иначе RGB или RGBA, если остались прозрачные пиксели
+        """
+        rgba = np.rint(self.composite() * 255).astype(np.uint8)
+        if self.base_type == BASE_INDEXED and self.colormap is not None:
+            indices = nearest_colors(rgba[..., :3], self.colormap)
+            indices[rgba[..., 3] < 128] = 0
+            image = Image.fromarray(indices, 'P')
+            image.putpalette(self.colormap.tobytes())
+            return image
+        if (rgba[..., 3] == 255).all():
+            return Image.fromarray(np.ascontiguousarray(rgba[..., :3]), 'RGB')
+        return Image.fromarray(rgba, 'RGBA')
+
+
+def nearest_colors(rgb, colormap):
+    """Индексы ближайших цветов палитры для массива (h, w, 3); точные совпадения — первым индексом"""
+    colors, inverse = np.unique(rgb.reshape(-1, 3), axis=0, return_inverse=True)
+    diff = colors[:, None, :].astype(np.int32) - colormap[None, :, :].astype(np.int32)
+    best = (diff * diff).sum(axis=2).argmin(axis=1).astype(np.uint8)
+    return best[inverse.reshape(-1)].reshape(rgb.shape[:2])
+
+
+def read_xcf(path):
+    """Читает и разбирает файл XCF"""
+    with open(path, 'rb') as f:
+        return XCFImage(f.read())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Пакетный экспорт исходников GIMP (.xcf) в PNG для translated_assets
+
+Каждый data/source_images/<путь>.NCGR.xcf сводится (видимые слои, режим
+«Обычный») и сохраняется как <выход>/<путь>.NCGR.png — то же, что ручной
+экспорт в GIMP, но без GUI и для всех файлов сразу. Файлы обрабатываются
+в пуле процессов.
+
+По умолчанию выход — build/translated_assets, а не закоммиченный
+data/translated_assets: RGB-исходники без палитры сводятся к 256 цветам и
+не совпадают с ручным экспортом. Если выходной каталог указан явно,
+существующие PNG, которых этот скрипт не создавал (их нет в хэшах),
+не перезаписываются и перечисляются в выводе; --force перезаписывает их.
+
+Индексированные XCF сохраняются с собственной палитрой. RGB-исходники
+приводятся к палитре ресурса (*.NCLR / *.NCLR.pal рядом с исходником или
+в --originals), а если её нет — к 256 цветам средствами Pillow.
+
+Хэши XCF (и палитры) запоминаются в .cache/xcf_export/hashes.json: файл,
+который не менялся с прошлого экспорта и чей PNG на месте, пропускается.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from nitro_gfx import NitroError, bgr555_to_rgb, find_palette, load_palette, quantize
+from xcf import XCFError, read_xcf
+
+# Меняется при изменении правил сведения — все файлы экспортируются заново
+EXPORT_VERSION = 1
+
+SOURCE_ROOT = os.path.join("data", "source_images")
+OUTPUT_ROOT = os.path.join("build", "translated_assets")
+CACHE_PATH = os.path.join(".cache", "xcf_export", "hashes.json")
+
+
+def list_sources(root):
+    """Все *.xcf в каталоге (рекурсивно), в постоянном порядке"""
+    found = []
+    for directory, _, files in os.walk(root):
+        found += [os.path.join(directory, name) for name in files if name.lower().endswith('.xcf')]
+    return sorted(found)
+
+
+def output_path(xcf_path, source_root, output_root):
+    """data/source_images/<путь>.NCGR.xcf → data/translated_assets/<путь>.NCGR.png"""
+    rel = os.path.relpath(xcf_path, source_root)
+    return os.path.join(output_root, os.path.splitext(rel)[0] + '.png')
+
+
+def file_hash(path):
+    if path is None:
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def palette_for(xcf_path, source_root, originals_root=None):
+    """Палитра ресурса для RGB-исходника: рядом с XCF или в каталоге оригиналов"""
+    png_name = os.path.splitext(xcf_path)[0] + '.png'
+    search = [os.path.dirname(xcf_path)]
+    if originals_root:
+        rel_dir = os.path.relpath(os.path.dirname(xcf_path), source_root)
+        search.append(os.path.join(originals_root, rel_dir))
+    return find_palette(png_name, search)
+
+
+def to_indexed(image, palette_path=None):
+    """RGB(A) → режим P: по палитре ресурса, если она есть, иначе 256 цветов Pillow"""
+    if palette_path is None:
+        return image.convert('RGB').quantize(256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    palette = load_palette(palette_path)
+    indexed = Image.fromarray(quantize(image, palette), 'P')
+    colors = np.zeros((256, 3), dtype=np.uint8)
+    colors[:len(palette)] = bgr555_to_rgb(palette)[:256]
+    indexed.putpalette(colors.tobytes())
+    return indexed
+
+
+def export_one(xcf_path, png_path, palette_path=None):
+    """Сводит один XCF и сохраняет PNG. Возвращает (путь, ошибка или None)"""
+    try:
+        image = read_xcf(xcf_path).flatten()
+        if image.mode != 'P':
+            image = to_indexed(image, palette_path)
+        os.makedirs(os.path.dirname(png_path) or '.', exist_ok=True)
+        image.save(png_path)
+        return xcf_path, None
+    except (OSError, XCFError, NitroError) as e:
+        return xcf_path, str(e)
+
+
+def _export_worker(args):
+    return export_one(*args)
+
+
+def export_all(tasks, workers=None):
+    """Экспортирует задания (xcf, png, палитра) в пуле процессов. Возвращает список (путь, ошибка или None)"""
+    if workers == 1 or len(tasks) < 2:
+        return [export_one(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_export_worker, tasks))
+
+
+def load_hashes(path=CACHE_PATH):
+    """
+    Хэши исходников {png: хэш} прошлого экспорта. После смены EXPORT_VERSION
+    хэши сбрасываются в None: файлы экспортируются заново, но остаются своими
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            hashes = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    version = hashes.pop('version', None)
+    return hashes if version == EXPORT_VERSION else dict.fromkeys(hashes)
+
+
+def save_hashes(hashes, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(hashes, version=EXPORT_VERSION), f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def plan_exports(source_root, output_root, originals_root=None, hashes=None, force=False):
+    """
+    Задания экспорта для изменённых исходников. Существующий PNG, которого нет
+    в hashes (его создал не этот скрипт), без force не перезаписывается.
+    Возвращает (задания [(xcf, png, палитра)], новые хэши {png: хэш исходников},
+    число пропущенных, список чужих PNG)
+    """
+    hashes = hashes or {}
+    tasks, digests, skipped, foreign = [], {}, 0, []
+    for xcf_path in list_sources(source_root):
+        png_path = output_path(xcf_path, source_root, output_root)
+        key = png_path.replace(os.sep, '/')
+        exists = os.path.exists(png_path)
+        if not force and exists and key not in hashes:
+            foreign.append(png_path)
+            continue
+        palette_path = palette_for(xcf_path, source_root, originals_root)
+        digests[key] = f"{file_hash(xcf_path)}:{file_hash(palette_path)}"
+        if not force and hashes.get(key) == digests[key] and exists:
+            skipped += 1
+            continue
+        tasks.append((xcf_path, png_path, palette_path))
+    return tasks, digests, skipped, foreign
+
+
+def main():
+    source_root, output_root = SOURCE_ROOT, OUTPUT_ROOT
+    originals_root = None
+    workers = None
+    force = False
+    positional = []
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg == '--force':
+            force = True
+        elif arg == '--originals':
+            originals_root = next(args, None)
+        elif arg == '--jobs':
+            try:
+                workers = int(next(args, ''))
+            except ValueError:
+                print("ОШИБКА: Параметр --jobs требует целое число.")
+                sys.exit(1)
+            if workers < 1:
+                print("ОШИБКА: Параметр --jobs должен быть не меньше 1.")
+                sys.exit(1)
+        elif arg in ('-h', '--help'):
+            print(f"Использование: python {sys.argv[0]} [исходники] [выходной каталог] "
+                  f"[--originals DIR] [--jobs N] [--force]")
+            print(f"")
+            print(f"По умолчанию: {SOURCE_ROOT} → {OUTPUT_ROOT}")
+            print(f"")
+            print(f"Параметры:")
+            print(f"  --originals DIR  Каталог оригиналов для поиска палитр RGB-исходников")
+            print(f"  --jobs N         Число процессов")
+            print(f"  --force          Экспортировать все файлы, даже неизменённые, и перезаписывать")
+            print(f"                   PNG, созданные не этим скриптом (например, ручной экспорт)")
+            sys.exit(1)
+        else:
+            positional.append(arg)
+    if positional:
+        source_root = positional[0]
+    if len(positional) > 1:
+        output_root = positional[1]
+
+    if not os.path.isdir(source_root):
+        print(f"ОШИБКА: Каталог '{source_root}' не найден.")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    hashes = load_hashes()
+    tasks, digests, skipped, foreign = plan_exports(source_root, output_root, originals_root, hashes, force)
+    # Хэши других выходных каталогов сохраняются, чтобы их PNG оставались своими
+    digests = dict(hashes, **digests)
+    if foreign:
+        print(f"⚠️  Не перезаписаны {len(foreign)} PNG, созданных не этим скриптом (--force перезаписывает):")
+        for png_path in foreign:
+            print(f"  {png_path}")
+    if not tasks:
+        print(f"✓ Изменённых исходников нет (без изменений: {skipped}), экспорт не нужен")
+        return
+
+    print(f"🖼  Сведение {len(tasks)} XCF из {source_root} → {output_root} (пропущено без изменений: {skipped})")
+    failed = 0
+    for (path, error), (_, png_path, _) in zip(export_all(tasks, workers), tasks):
+        if error:
+            failed += 1
+            digests[png_path.replace(os.sep, '/')] = None
+            print(f"✗ {path}: {error}")
+        else:
+            print(f"✓ {path}")
+    # Хэш неудачных файлов не запоминается — при следующем запуске они экспортируются снова
+    save_hashes(digests)
+    print(f"✅ Экспортировано {len(tasks) - failed} из {len(tasks)} за {time.perf_counter() - started:.2f} с")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
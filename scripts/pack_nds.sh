@@ -1 +1 @@
-docker run --rm -v $(pwd)/data:/work ndstool-builder ndstool -c /work/0558-rus.nds -9 /work/full_extracted/arm9.bin -7 /work/full_extracted/arm7.bin -y9 /work/full_extracted/y9.bin -y7 /work/full_extracted/y7.bin -d /work/full_extracted/data -y /work/full_extracted/overlay -t /work/full_extracted/banner.bin -h /work/full_extracted/header.bin
+python3 scripts/nds_tools/nds_rom.py pack data/0558.nds data/0558-rus.nds --dir data/full_extracted "$@"